@@ -0,0 +1,33 @@
+"""Compares per-file `git diff` calls against a single streamed `git diff`.
+
+Usage: python benchmarks/bench_git_diff.py [changed_files]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_repo import make_repo  # noqa:E402
+from reviewer.system_utils.diff import get_git_diff_files  # noqa:E402
+
+
+def main():
+    changed = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+
+    with tempfile.TemporaryDirectory() as repo:
+        make_repo(repo, files=changed * 2, changed=changed)
+        os.chdir(repo)
+
+        for single_diff, workers in ((False, 1), (False, 8), (True, 1), (True, 8)):
+            start = time.perf_counter()
+            diffs = get_git_diff_files("master", "feature", single_diff=single_diff, workers=workers)
+            elapsed = time.perf_counter() - start
+            mode = "single diff" if single_diff else "per-file diff"
+            print(f"{mode:>14}, {workers} workers: {len(diffs)} files in {elapsed:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
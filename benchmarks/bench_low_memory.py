@@ -0,0 +1,58 @@
+"""Compares peak Python memory of the eager diff list against the streamed content store (--low_memory).
+
+Usage: python benchmarks/bench_low_memory.py [changed_files] [lines_per_file]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_repo import make_repo  # noqa:E402
+from reviewer.system_utils.diff import get_git_diff_files  # noqa:E402
+from reviewer.system_utils.diff_store import DiffContentStore  # noqa:E402
+
+
+def eager() -> int:
+    diffs = get_git_diff_files("master", "feature", single_diff=True, content_ref="master")
+    return sum(len(d.original_content) + len(d.diff) for d in diffs)
+
+
+def streamed() -> int:
+    store = DiffContentStore("master", "feature", content_ref="master")
+    by_directory = defaultdict(list)
+    for diff_file in store.collect():
+        by_directory[os.path.dirname(diff_file.full_name)].append(diff_file)
+
+    total = 0
+    for files in by_directory.values():
+        with store.loaded(files):
+            total += sum(len(d.original_content) + len(d.diff) for d in files)
+    store.close()
+    return total
+
+
+def main():
+    changed = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    lines = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+
+    with tempfile.TemporaryDirectory() as repo:
+        make_repo(repo, files=changed, changed=changed, lines=lines)
+        os.chdir(repo)
+
+        for name, run in (("eager", eager), ("streamed", streamed)):
+            tracemalloc.start()
+            start = time.perf_counter()
+            size = run()
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{name:>9}: {size / 2**20:.1f} MiB of text, peak {peak / 2**20:.1f} MiB in {elapsed:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
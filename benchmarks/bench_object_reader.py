@@ -0,0 +1,45 @@
+"""Compares the in-process packfile reader with `git cat-file --batch` for loading master blobs.
+
+Usage: python benchmarks/bench_object_reader.py [files]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_repo import git, make_repo  # noqa:E402
+from reviewer.system_utils.cat_file import CatFileBatch  # noqa:E402
+from reviewer.system_utils.git_objects import ObjectStore  # noqa:E402
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+
+    with tempfile.TemporaryDirectory() as repo:
+        make_repo(repo, files=files, changed=files, lines=50)
+        git(repo, "gc", "-q")
+        paths = git(repo, "ls-tree", "-r", "--name-only", "master").splitlines()
+
+        start = time.perf_counter()
+        cat_file = CatFileBatch(repo)
+        from_cat_file = cat_file.read_blobs("master", paths)
+        cat_file.close()
+        cat_file_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        store = ObjectStore(repo)
+        from_store = store.read_blobs("master", paths)
+        store.close()
+        store_time = time.perf_counter() - start
+
+        assert from_store == from_cat_file
+        print(f"{len(paths)} blobs at master")
+        print(f"git cat-file --batch: {cat_file_time:.3f}s")
+        print(f"   packfile reader: {store_time:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Times end-to-end runs of cli.py against local stand-in servers for the big and the local model.
+
+Both servers are started in-process with the latency profile below and the
+canned answers of reviewer.fake_llm, so runs are reproducible without a GPU.
+The same servers can be run on their own with fake_llm.py and used through
+REVIEWER_MODEL_BASE_URL and REVIEWER_FALLBACK_MODEL_BASE_URL.
+
+Usage: python benchmarks/bench_offline_review.py [changed_files] [lines_per_file]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic_repo import make_repo  # noqa:E402
+from reviewer.config.reviewer_config import FakeLLMConfiguration  # noqa:E402
+from reviewer.fake_llm.server import FakeLLM, make_server  # noqa:E402
+
+PRIMARY = FakeLLMConfiguration(
+    port=0, model="big-model", ttft=1.0, prefill_tokens_per_second=4000, decode_tokens_per_second=30, parallel=8
+)
+FALLBACK = FakeLLMConfiguration(
+    port=0, ttft=0.1, prefill_tokens_per_second=1000, decode_tokens_per_second=20, parallel=1, prefix_cache=True
+)
+ANSWERS = [(r"<TASK>\nDo the review task", "module.py: consider handling the error returned by the call")]
+
+RUNS = [
+    ("file_by_file", 1),
+    ("file_by_file", 4),
+    ("package_by_package", 4),
+    ("auto", 4),
+]
+
+
+def start(config: FakeLLMConfiguration) -> tuple[FakeLLM, str]:
+    fake = FakeLLM(config, ANSWERS)
+    server = make_server(fake)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return fake, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    changed = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    lines = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    primary, primary_url = start(PRIMARY)
+    fallback, fallback_url = start(FALLBACK)
+    env = {**os.environ, "REVIEWER_MODEL_BASE_URL": primary_url, "REVIEWER_FALLBACK_MODEL_BASE_URL": fallback_url}
+
+    with tempfile.TemporaryDirectory() as repo:
+        make_repo(repo, files=changed * 2, changed=changed, lines=lines)
+
+        for mode, concurrency in RUNS:
+            before = primary.stats()
+            start_time = time.perf_counter()
+            result = subprocess.run(  # noqa:S603
+                [
+                    sys.executable,
+                    os.path.join(ROOT, "cli.py"),
+                    repo,
+                    "feature",
+                    f"--review_mode={mode}",
+                    f"--llm_concurrency={concurrency}",
+                    "--no-ref_only",
+                    "--no-translate",
+                    "--no-llm_cache",
+                    "--no-stream",
+                ],
+                env=env,
+                capture_output=True,
+                text=True,
+            )
+            if result.returncode:
+                sys.exit(f"{mode} failed:\n{result.stderr}")
+            elapsed = time.perf_counter() - start_time
+            requests = primary.stats()["requests"] - before["requests"]
+            print(f"{mode:>18} x{concurrency}: {elapsed:.2f}s, {requests} requests to the big model")
+
+    print(f"local model: {fallback.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Compares the prefill work of the old prompt layout (instructions last) against the prefix-stable layout.
+
+A stand-in server with prefix caching (as vLLM, or llama.cpp with enough slots)
+only prefills a prompt from the first character that differs from every prompt
+it has seen. The run sanitizes every file of a directory, with the sanitizer
+removing the tail of each file, then reviews the directory as one group (auto
+mode) and every file on its own (file_by_file mode).
+
+Usage: python benchmarks/bench_prompt_prefix.py [files] [lines_per_file] [prefill_tokens_per_second]
+"""
+
+import os
+import sys
+from dataclasses import replace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reviewer.agents.prompt_layout import (  # noqa:E402
+    FILE_CONTEXT,
+    REVIEW_INSTRUCTIONS,
+    SANITIZE_INSTRUCTIONS,
+    build_prompt,
+)
+from reviewer.agents.review import Reviewer  # noqa:E402
+from reviewer.agents.sanitizer import SANITIZE_TASK  # noqa:E402
+from reviewer.system_utils.diff import DiffFile  # noqa:E402
+
+# rough number of characters per token of code
+CHARS_PER_TOKEN = 4
+
+
+class PrefixCacheServer:
+    def __init__(self):
+        self.__prompts: list[str] = []
+        self.total = 0
+        self.prefilled = 0
+
+    def complete(self, prompt: str) -> None:
+        cached = max((len(os.path.commonprefix([prompt, seen])) for seen in self.__prompts), default=0)
+        self.__prompts.append(prompt)
+        self.total += len(prompt)
+        self.prefilled += len(prompt) - cached
+
+
+def old_sanitize_prompt(file: DiffFile, diffs: list[DiffFile]) -> str:
+    diff = "\n".join(d.diff for d in diffs)
+    context = f"\n<FILE_NAME>{file.full_name}</FILE_NAME>\n<MASTER_VERSION>\n{file.original_content}\n</MASTER_VERSION>"
+    return f"{context}\n<DIFF>\n{diff}\n</DIFF>\n\nInstructions:\n{SANITIZE_INSTRUCTIONS}\n"
+
+
+def old_review_prompt(diffs: list[DiffFile]) -> str:
+    context = "".join(FILE_CONTEXT.format(d.full_name, "python", d.original_content) for d in diffs)
+    diff = "".join(d.diff + "\n" for d in diffs)
+    return f"{context}\n<DIFF>\n{diff}</DIFF>\nInstructions:\n{REVIEW_INSTRUCTIONS}\nBegin your review now."
+
+
+def new_sanitize_prompt(file: DiffFile, diffs: list[DiffFile]) -> str:
+    return build_prompt(SANITIZE_INSTRUCTIONS, SANITIZE_TASK.format(file.full_name), [file], diffs)
+
+
+def new_review_prompt(diffs: list[DiffFile]) -> str:
+    return build_prompt(REVIEW_INSTRUCTIONS, Reviewer.TASK, diffs, diffs)
+
+
+def make_files(files: int, lines: int) -> list[DiffFile]:
+    result = []
+    for i in range(files):
+        content = "\n".join(
+            f"def function_{i}_{line}(value):\n    return value + {line}\n" for line in range(lines // 3)
+        )
+        diff = f"@@ -1,2 +1,2 @@\n-def function_{i}_0(value):\n+def function_{i}_0(value, extra=None):"
+        result.append(
+            DiffFile(name=f"module_{i}.py", full_name=f"pkg/module_{i}.py", original_content=content, diff=diff)
+        )
+    return result
+
+
+def sanitized(file: DiffFile) -> DiffFile:
+    # the sanitizer removes definitions; here the last third of the file
+    return replace(file, original_content=file.original_content[: len(file.original_content) * 2 // 3])
+
+
+def run(files: list[DiffFile], sanitize_prompt, review_prompt) -> PrefixCacheServer:
+    server = PrefixCacheServer()
+    for file in files:
+        server.complete(sanitize_prompt(file, files))
+    server.complete(review_prompt([sanitized(file) for file in files]))
+    for file in files:
+        server.complete(review_prompt([sanitized(file)]))
+    return server
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    lines = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    rate = float(sys.argv[3]) if len(sys.argv) > 3 else 1000.0
+
+    changed = make_files(files, lines)
+    for name, sanitize_prompt, review_prompt in (
+        ("old layout", old_sanitize_prompt, old_review_prompt),
+        ("prefix-stable", new_sanitize_prompt, new_review_prompt),
+    ):
+        server = run(changed, sanitize_prompt, review_prompt)
+        total = server.total // CHARS_PER_TOKEN
+        prefilled = server.prefilled // CHARS_PER_TOKEN
+        print(
+            f"{name:>13}: {total} prompt tokens, {prefilled} prefilled ({prefilled / total:.0%}), "
+            f"~{prefilled / rate:.1f}s of prefill at {rate:.0f} tok/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Times a cold start of the token counter: the import, loading the tokenizer and counting one file.
+
+Every run is a fresh interpreter, as a CLI run is. The standalone `tokenizers`
+backend needs the tokenizer.json of the model in the Hugging Face cache or a
+local path; the transformers backend is what every run paid before.
+
+Usage: python benchmarks/bench_tokenizer_startup.py [model_or_path] [runs]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from reviewer.config.reviewer_config import TOKENIZER  # noqa:E402
+
+SCRIPT = """
+import sys
+from reviewer.tokenization.token_counter import TokenCounter
+counter = TokenCounter({model!r}, fast={fast})
+counter.count_tokens("def main():\\n    return 0\\n" * 200)
+print(type(counter.tokenizer).__name__, "transformers" in sys.modules)
+"""
+
+
+def cold_start(model: str, fast: bool) -> tuple[float, str]:
+    start = time.perf_counter()
+    result = subprocess.run(  # noqa:S603
+        [sys.executable, "-c", SCRIPT.format(model=model, fast=fast)],
+        cwd=ROOT,
+        env={**os.environ, "HF_HUB_OFFLINE": "1"},
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
+        sys.exit(f"loading {model} failed:\n{result.stderr}")
+    return time.perf_counter() - start, result.stdout.strip()
+
+
+def main():
+    model = sys.argv[1] if len(sys.argv) > 1 else TOKENIZER
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    for name, fast in [("tokenizers", True), ("transformers", False)]:
+        times, backend = [], ""
+        for _ in range(runs):
+            seconds, backend = cold_start(model, fast)
+            times.append(seconds)
+        print(f"{name:>12}: median {statistics.median(times):.2f}s, min {min(times):.2f}s ({backend})")
+
+
+if __name__ == "__main__":
+    main()
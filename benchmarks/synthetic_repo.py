@@ -0,0 +1,41 @@
+import os
+import subprocess
+
+
+def git(repo: str, *args: str) -> str:
+    result = subprocess.run(  # noqa:S603
+        ["git", *args],  # noqa:S607
+        cwd=repo,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return result.stdout
+
+
+def make_repo(repo: str, files: int, changed: int, lines: int = 200, branch: str = "feature") -> None:
+    """Creates a repository with `files` python files on master and a branch changing `changed` of them."""
+    git(repo, "init", "-q", "-b", "master")
+    git(repo, "config", "user.email", "bench@example.com")
+    git(repo, "config", "user.name", "bench")
+
+    for i in range(files):
+        write_file(repo, i, lines, revision=0)
+    git(repo, "add", "-A")
+    git(repo, "commit", "-q", "-m", "init")
+
+    git(repo, "checkout", "-q", "-b", branch)
+    for i in range(changed):
+        write_file(repo, i, lines, revision=1)
+    git(repo, "add", "-A")
+    git(repo, "commit", "-q", "-m", "change")
+    git(repo, "checkout", "-q", "master")
+
+
+def write_file(repo: str, index: int, lines: int, revision: int) -> None:
+    directory = os.path.join(repo, f"pkg{index % 50}")
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"module_{index}.py"), "w") as f:
+        for line in range(lines):
+            value = line * revision if line % 20 == 0 else line
+            f.write(f"def function_{index}_{line}():\n    return {value}\n")
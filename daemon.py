@@ -0,0 +1,21 @@
+import logging
+
+from reviewer.config.reviewer_config import get_daemon_configuration
+from reviewer.daemon.daemon import serve
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(message)s",
+    handlers=[
+        logging.StreamHandler(),
+    ],
+)
+
+
+def main():
+    configuration, daemon_configuration = get_daemon_configuration()
+    serve(configuration, daemon_configuration)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+import logging
+
+from reviewer.config.reviewer_config import get_fake_llm_configuration
+from reviewer.fake_llm.server import serve
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(message)s",
+    handlers=[
+        logging.StreamHandler(),
+    ],
+)
+
+
+def main():
+    serve(get_fake_llm_configuration())
+
+
+if __name__ == "__main__":
+    main()
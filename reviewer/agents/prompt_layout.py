@@ -0,0 +1,108 @@
+from reviewer.system_utils.diff import DiffFile
+
+REVIEW_INSTRUCTIONS = """Review task:
+You need to perform code review.
+Point out poor practices or needed improvements.
+Highlight any obvious bugs or mistakes.
+Review only the code in the diff block, but use all context i gave you if you need it.
+If you have a comment, please specify the file name.
+If the code is correct and contains no errors, reply only: no comments.
+Do not mention the lack of comments or documentation.
+Do not be overly critical of naming choices.
+Do not explain the code.
+All this code has already been compiled successfully and has no compilation and linting errors.
+Tests have been compiled and passed, but the project lacks 100% coverage, offering no guarantees.
+Keep your feedback direct and concise.
+Focus exclusively on significant issues and errors.
+The master file might have been sanitized and some unnecessary code removed.
+I assure you that all the code provided to you is correct, formatted, and free of compilation or linting errors.
+Respond without using any Markdown formatting, code blocks, or special highlighting—just plain text."""
+
+SANITIZE_INSTRUCTIONS = """Sanitize task:
+You are provided with the following:
+1.  The content of an original source code file (hereinafter referred to as "the Original File").
+2.  A diff. This diff represents the changes made to the Original File (and potentially other related files) to create a new version.
+Your goal is to identify code definitions (e.g., functions, classes, methods, significant standalone code blocks) present in the Original File that are not meaningful for the purpose of a subsequent code review aimed at assessing the quality, correctness, and impact of the primary changes.
+Crucial Consideration: If any definition, even if it seems like boilerplate or a utility, contains or is the primary site of significant algorithmic or logical changes* introduced by the diff, it IS meaningful and SHOULD NOT be listed. The focus is on excluding code that is noise relative to the core changes.
+Output Requirements:
+*   You MUST list only the identifiers (names) of these code definitions deemed not meaningful for code review.
+*   Each identifier MUST be on a new line.
+*   There MUST be no other symbols, text, explanations, or formatting (like bullet points or numbering) in your output.
+*   Your entire output MUST consist ONLY of these identifiers, each on its own line.
+Example:
+```python
+@my_decorator
+def func_to_remove(a):
+    pass
+
+def func_to_keep():
+    print("hello")
+
+class ClassToRemove:
+    def method(self):
+        pass
+
+class ClassToKeep:
+    pass
+
+dict_to_remove = {"a": 1, "b": 2}
+dict_to_keep = {"c": 3}
+```
+answer:
+func_to_remove
+ClassToRemove
+dict_to_remove"""  # noqa
+
+# The layout is described first; it is the same for every task, so all the calls of a run share it.
+SYSTEM_PROMPT = """Instructions:
+You will be given source files and a diff.
+Every file comes as its <FILE_NAME> followed by its <MASTER_VERSION>, the version before the changes.
+The <DIFF> block contains the changes.
+The instructions of the task to do follow the diff, and the <TASK> block at the very end says what to do.
+
+"""
+
+FILE_CONTEXT = """<FILE_NAME>
+{}
+</FILE_NAME>
+<MASTER_VERSION>
+```{}
+{}
+```
+</MASTER_VERSION>
+"""
+
+DIFF_CONTEXT = """<DIFF>
+{}</DIFF>
+"""
+
+TASK_CONTEXT = """<TASK>
+{}
+</TASK>"""
+
+
+def build_prompt(instructions: str, task: str, files: list[DiffFile], diffs: list[DiffFile]) -> str:
+    """Lays out a prompt from the most to the least stable segment.
+
+    Servers with prefix caching (llama.cpp `cache_prompt`, vLLM) only reuse the
+    work of an earlier prompt up to the first differing token. The description of
+    the layout is the same for every call, the master version of a file is the same
+    for its sanitize and review calls (up to the first removed definition), while
+    the diff, the instructions of the task and the task come last.
+    """
+    context = "".join(
+        FILE_CONTEXT.format(f.full_name, language_from_extension(f.name), f.original_content) for f in files
+    )
+    diff = "".join(d.diff + "\n" for d in diffs)
+    return f"{SYSTEM_PROMPT}{context}\n{DIFF_CONTEXT.format(diff)}{instructions}\n\n{TASK_CONTEXT.format(task)}"
+
+
+def language_from_extension(file_name: str) -> str:
+    extension = file_name.split(".")[-1]
+    return {
+        "py": "python",
+        "go": "go",
+        "proto": "proto",
+        "js": "javascript",
+        "ts": "javascript",
+    }.get(extension, extension)
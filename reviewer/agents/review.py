@@ -1,86 +1,109 @@
+import asyncio
 import logging
-from typing import List
+from typing import Coroutine, List, Optional, TypeVar
 
-from reviewer.llm.llm import LLM
+from reviewer.agents.prompt_layout import REVIEW_INSTRUCTIONS, build_prompt
+from reviewer.llm.async_llm import AsyncLLM
+from reviewer.llm.llm import LLM, FallbackSplit
+from reviewer.llm.streaming import TextSink
 from reviewer.system_utils.diff import DiffFile
 
+T = TypeVar("T")
+
 
 class Reviewer:
-    PROMPT = """Instructions:
-You need to perform code review.
-Point out poor practices or needed improvements.
-Highlight any obvious bugs or mistakes.
-Review only the code in the diff block, but use all context i gave you if you need it.
-If you have a comment, please specify the file name.
-If the code is correct and contains no errors, reply only: no comments.
-Do not mention the lack of comments or documentation.
-Do not be overly critical of naming choices.
-Do not explain the code.
-All this code has already been compiled successfully and has no compilation and linting errors.
-Tests have been compiled and passed, but the project lacks 100% coverage, offering no guarantees.
-Keep your feedback direct and concise.
-Focus exclusively on significant issues and errors.
-The master file might have been sanitized and some unnecessary code removed.
-I assure you that all the code provided to you is correct, formatted, and free of compilation or linting errors.
-Respond without using any Markdown formatting, code blocks, or special highlighting—just plain text.
+    TASK = """Do the review task for the changes in the diff.
 Begin your review now."""
 
-    CONTEXT = """<FILE_NAME>
-{}
-</FILE_NAME>
-<MASTER_VERSION>
-```{}
-{}
-```
-</MASTER_VERSION>
-"""
-
-    def __init__(self, llm: LLM):
+    def __init__(self, llm: LLM, async_llm: Optional[AsyncLLM] = None):
         self.llm = llm
+        self.async_llm = async_llm
 
-    def review_file(self, diff: DiffFile) -> str:
+    def review_file(self, diff: DiffFile, on_text: Optional[TextSink] = None) -> str:
         logging.debug(f"review file: {diff.name}")
 
-        context = self.CONTEXT.format(
-            diff.full_name,
-            self.__language_from_extension(diff.name),
-            diff.original_content,
-            diff.diff,
-        )
-        prompt = f"{context}{self.PROMPT}"
-
-        result = self.llm.generate(f"review: {diff.name}", prompt)
-        formatted = f"\n{diff.name}:{result}"
+        header = self.__header(diff.name, on_text)
+        result = self.llm.generate(f"review: {diff.name}", self._make_file_prompt(diff), on_text)
+        formatted = f"{header}{result}"
         return formatted
 
-    def review_files(self, diffs: List[DiffFile], name: str = "all files") -> str:
+    def review_files(
+        self,
+        diffs: List[DiffFile],
+        name: str = "all files",
+        on_text: Optional[TextSink] = None,
+        fallback_groups: Optional[List[List[DiffFile]]] = None,
+    ) -> str:
+        """Reviews the files in one call; fallback_groups split them for llama.cpp when they do not fit it."""
         prompt = self._make_files_prompt(diffs)
-        result = self.llm.generate(f"review: {name}", prompt)
-        formatted = f"\n{name}:{result}"
+        header = self.__header(name, on_text)
+        result = self.llm.generate(self.__call_name(diffs), prompt, on_text, self.__split(fallback_groups))
+        formatted = f"{header}{result}"
         return formatted
 
-    def _make_files_prompt(self, diffs: list[DiffFile]) -> str:
-        context = ""
-        diff = ""
-        for f in diffs:
-            context += self.CONTEXT.format(
-                f.full_name,
-                self.__language_from_extension(f.name),
-                f.original_content,
-            )
-            diff += f.diff + "\n"
+    async def review_file_async(self, diff: DiffFile, on_text: Optional[TextSink] = None) -> str:
+        logging.debug(f"review file: {diff.name}")
+
+        header = self.__header(diff.name, on_text)
+        result = await self.__generate_async(f"review: {diff.name}", self._make_file_prompt(diff), on_text)
+        return f"{header}{result}"
+
+    async def review_files_async(
+        self,
+        diffs: List[DiffFile],
+        name: str = "all files",
+        on_text: Optional[TextSink] = None,
+        fallback_groups: Optional[List[List[DiffFile]]] = None,
+    ) -> str:
+        header = self.__header(name, on_text)
+        result = await self.__generate_async(
+            self.__call_name(diffs), self._make_files_prompt(diffs), on_text, self.__split(fallback_groups)
+        )
+        return f"{header}{result}"
+
+    def context_budget(self) -> int:
+        return self.llm.context_budget()
 
-        diff = f"<DIFF>\n{diff}</DIFF>"
+    def fallback_budget(self) -> int:
+        return self.llm.fallback_budget()
 
-        return f"{context}\n{diff}\n{self.PROMPT}"
+    def prompt_overhead(self) -> str:
+        """The prompt without files and diffs, the part of the context that every review takes."""
+        return build_prompt(REVIEW_INSTRUCTIONS, self.TASK, [], [])
+
+    def run(self, coroutine: Coroutine[None, None, T]) -> T:
+        """Runs concurrent reviews to completion from synchronous code."""
+        if self.async_llm:
+            return self.async_llm.run(coroutine)
+        return asyncio.run(coroutine)
+
+    async def __generate_async(
+        self, name: str, prompt: str, on_text: Optional[TextSink], split: Optional[FallbackSplit] = None
+    ) -> str:
+        if self.async_llm:
+            return await self.async_llm.generate(name, prompt, on_text, split)
+        return await asyncio.to_thread(self.llm.generate, name, prompt, on_text, split)
+
+    def __split(self, groups: Optional[List[List[DiffFile]]]) -> Optional[FallbackSplit]:
+        if not groups:
+            return None
+        # the prompts are built only when a call falls back
+        return lambda: [(self.__call_name(group), self._make_files_prompt(group)) for group in groups]
+
+    @staticmethod
+    def __call_name(diffs: List[DiffFile]) -> str:
+        # the call names its files, so that its usage is split between them
+        return f"review: {', '.join(diff.name for diff in diffs)}"
 
     @staticmethod
-    def __language_from_extension(file_name: str) -> str:
-        extension = file_name.split(".")[-1]
-        return {
-            "py": "python",
-            "go": "go",
-            "proto": "proto",
-            "js": "javascript",
-            "ts": "javascript",
-        }.get(extension, extension)
+    def __header(name: str, on_text: Optional[TextSink]) -> str:
+        header = f"\n{name}:"
+        if on_text:
+            on_text(header)
+        return header
+
+    def _make_file_prompt(self, diff: DiffFile) -> str:
+        return build_prompt(REVIEW_INSTRUCTIONS, self.TASK, [diff], [diff])
+
+    def _make_files_prompt(self, diffs: list[DiffFile]) -> str:
+        return build_prompt(REVIEW_INSTRUCTIONS, self.TASK, diffs, diffs)
@@ -1,56 +1,21 @@
+import json
 import logging
+import os
 import re
 
-from reviewer.ast_parser.ast_parser import ASTParser
+from reviewer.agents.prompt_layout import SANITIZE_INSTRUCTIONS, build_prompt
+from reviewer.ast_parser.ast_parser import ASTParser, ParsedFile
 from reviewer.llm.llm import LLM
 from reviewer.system_utils.diff import DiffFile
 
-SANITIZE_PROMPT = """
-Instructions:
-You are provided with the following:
-1.  The content of an original source code file (hereinafter referred to as "the Original File").
-2.  A diff. This diff represents the changes made to the Original File (and potentially other related files) to create a new version.
-Your goal is to identify code definitions (e.g., functions, classes, methods, significant standalone code blocks) present in the Original File that are not meaningful for the purpose of a subsequent code review aimed at assessing the quality, correctness, and impact of the primary changes.
-Crucial Consideration: If any definition, even if it seems like boilerplate or a utility, contains or is the primary site of significant algorithmic or logical changes* introduced by the diff, it IS meaningful and SHOULD NOT be listed. The focus is on excluding code that is noise relative to the core changes.
-Output Requirements:
-*   You MUST list only the identifiers (names) of these code definitions deemed not meaningful for code review.
-*   Each identifier MUST be on a new line.
-*   There MUST be no other symbols, text, explanations, or formatting (like bullet points or numbering) in your output.
-*   Your entire output MUST consist ONLY of these identifiers, each on its own line.
-Example:
-```python
-@my_decorator
-def func_to_remove(a):
-    pass
-
-def func_to_keep():
-    print("hello")
-
-class ClassToRemove:
-    def method(self):
-        pass
-
-class ClassToKeep:
-    pass
-
-dict_to_remove = {"a": 1, "b": 2}
-dict_to_keep = {"c": 3}
-```
-answer:
-func_to_remove
-ClassToRemove
-dict_to_remove
-"""  # noqa
-
-CONTEXT = """
-<FILE_NAME>{}</FILE_NAME>
-<MASTER_VERSION>
-{}
-</MASTER_VERSION>
-<DIFF>
-{}
-</DIFF>
-"""
+SANITIZE_TASK = """Do the sanitize task for the file {}.
+List the identifiers now."""
+
+SANITIZE_BATCH_TASK = """Do the sanitize task for each of the files {}.
+Instead of the output requirements above, answer only with a JSON object without Markdown formatting.
+The keys of the object MUST be the exact file names, the value of each key MUST be the list of its identifiers.
+A file with nothing to remove MUST have an empty list, for example: {{"a/b.py": ["func_to_remove"], "a/c.py": []}}
+Write the JSON object now."""
 
 
 class Sanitizer:
@@ -65,19 +30,54 @@ class Sanitizer:
         if not original_file:
             return
 
-        git_diff = "\n".join([d.diff for d in diffs])
+        self.__sanitize_one(file, original_file, diffs)
+
+    def prompt_overhead(self) -> str:
+        """The prompt of a batch without files and diffs, the part of the context that every batch takes."""
+        return build_prompt(SANITIZE_INSTRUCTIONS, SANITIZE_BATCH_TASK.format(""), [], [])
+
+    def sanitize_batch(self, files: list[DiffFile], diffs: list[DiffFile]) -> None:
+        """Sanitizes several files with one call; the answer lists the identifiers to remove per file."""
+        parsed = {}
+        for file in files:
+            original_file = self.__ast_parser.parse(file.full_name, bytes(file.original_content, "utf-8"))
+            if original_file:
+                parsed[file.full_name] = (file, original_file)
+
+        if len(parsed) == 1:
+            file, original_file = next(iter(parsed.values()))
+            self.__sanitize_one(file, original_file, diffs)
+            return
+        if not parsed:
+            return
+
+        batch = [file for file, _ in parsed.values()]
+        logging.debug(f"sanitize sources: {', '.join(file.name for file in batch)}")
 
-        prompt = CONTEXT.format(file.full_name, file.original_content, git_diff) + SANITIZE_PROMPT
+        names = ", ".join(file.full_name for file in batch)
+        prompt = build_prompt(SANITIZE_INSTRUCTIONS, SANITIZE_BATCH_TASK.format(names), batch, diffs)
+
+        # the call names its files, the usage report splits the call between them
+        llm_response = self.__llm.generate(f"sanitize: {', '.join(file.name for file in batch)}", prompt)
+        for name, declarations_to_delete in self.__parse_batch_response(llm_response, list(parsed)).items():
+            file, original_file = parsed[name]
+            self.__remove(file, original_file, declarations_to_delete)
+
+    def __sanitize_one(self, file: DiffFile, original_file: ParsedFile, diffs: list[DiffFile]) -> None:
+        # the prompt starts as the review prompt of this file does, with SYSTEM_PROMPT and then the master version
+        prompt = build_prompt(SANITIZE_INSTRUCTIONS, SANITIZE_TASK.format(file.full_name), [file], diffs)
 
         llm_response = self.__llm.generate(f"sanitize:{file.name}", prompt)
-        declarations_to_delete = self.__parse_llm_response(llm_response)
+        self.__remove(file, original_file, self.__parse_llm_response(llm_response))
+
+    @staticmethod
+    def __remove(file: DiffFile, original_file: ParsedFile, declarations_to_delete: list[str]) -> None:
         if not declarations_to_delete:
             return
 
         for definition in declarations_to_delete:
             original_file.remove_declaration(definition)
 
-        
         file.original_content = original_file.content.decode("utf-8")
 
     @staticmethod
@@ -95,4 +95,29 @@ class Sanitizer:
 
         return identifiers
 
+    @staticmethod
+    def __parse_batch_response(response: str, names: list[str]) -> dict[str, list[str]]:
+        """Maps the answer to the sanitized files; a key may also be the base name of a file if it is unique."""
+        start, end = response.find("{"), response.rfind("}")
+        try:
+            answer = json.loads(response[start : end + 1]) if 0 <= start < end else None
+        except json.JSONDecodeError:
+            answer = None
+        if not isinstance(answer, dict):
+            logging.warning("sanitize: the answer is not a JSON object, files are kept as they are")
+            return {}
+
+        by_base_name: dict[str, list[str]] = {}
+        for name in names:
+            by_base_name.setdefault(os.path.basename(name), []).append(name)
+
+        result = {}
+        for key, identifiers in answer.items():
+            candidates = [key] if key in names else by_base_name.get(os.path.basename(key), [])
+            if len(candidates) != 1 or not isinstance(identifiers, list):
+                logging.warning(f"sanitize: unexpected entry in the answer: {key}")
+                continue
+            result[candidates[0]] = [str(i).strip() for i in identifiers if str(i).strip()]
+        return result
+
     
\ No newline at end of file
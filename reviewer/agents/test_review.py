@@ -1,6 +1,18 @@
 # Assuming Reviewer and DiffFile are accessible via this path structure
 # (e.g., PYTHONPATH set to the project root or the directory containing the first 'reviewer' directory)
+import os
+
+from reviewer.agents.prompt_layout import (
+    DIFF_CONTEXT,
+    FILE_CONTEXT,
+    REVIEW_INSTRUCTIONS,
+    SANITIZE_INSTRUCTIONS,
+    SYSTEM_PROMPT,
+    TASK_CONTEXT,
+    build_prompt,
+)
 from reviewer.agents.review import Reviewer
+from reviewer.agents.sanitizer import SANITIZE_TASK
 from reviewer.system_utils.diff import DiffFile
 
 
@@ -35,21 +47,19 @@ def test_make_files_prompt():
     # --- Test case 1: Multiple diff files ---
     diffs_multiple = [df1, df2]
 
-    # Expected prompt construction for multiple files
-    context_template = Reviewer.CONTEXT  # Accessing via class name for clarity
+    # Expected prompt construction for multiple files:
+    # the layout, then master versions, then the diff, then the review instructions and the task
+    context_template = FILE_CONTEXT
 
-    # Language determination relies on the private method __language_from_extension
-    lang_py = reviewer_instance._Reviewer__language_from_extension(df1.name)
-    lang_js = reviewer_instance._Reviewer__language_from_extension(df2.name)
-
-    context_df1_str = context_template.format(df1.full_name, lang_py, df1.original_content)
-    context_df2_str = context_template.format(df2.full_name, lang_js, df2.original_content)
+    context_df1_str = context_template.format(df1.full_name, "python", df1.original_content)
+    context_df2_str = context_template.format(df2.full_name, "javascript", df2.original_content)
 
     expected_combined_context_multiple = context_df1_str + context_df2_str
 
-    expected_diff_section_multiple = f"<DIFF>\n{df1.diff}\n{df2.diff}\n</DIFF>"
+    expected_diff_section_multiple = DIFF_CONTEXT.format(f"{df1.diff}\n{df2.diff}\n")
+    expected_task = f"{REVIEW_INSTRUCTIONS}\n\n{TASK_CONTEXT.format(Reviewer.TASK)}"
     expected_prompt_multiple = (
-        f"{expected_combined_context_multiple}\n{expected_diff_section_multiple}\n{Reviewer.PROMPT}"
+        f"{SYSTEM_PROMPT}{expected_combined_context_multiple}\n{expected_diff_section_multiple}{expected_task}"
     )
 
     actual_prompt_multiple = reviewer_instance._make_files_prompt(diffs_multiple)
@@ -57,19 +67,49 @@ def test_make_files_prompt():
 
     # --- Test case 2: Empty list of diffs ---
     diffs_empty = []
-    expected_context_empty = ""  # context starts as "" and loop is not entered
-    expected_diff_section_empty = "<DIFF>\n</DIFF>"  # diff starts as "" and loop is not entered, then formatted
-    expected_prompt_empty = f"{expected_context_empty}\n{expected_diff_section_empty}\n{Reviewer.PROMPT}"
+    expected_diff_section_empty = "<DIFF>\n</DIFF>\n"  # diff starts as "" and loop is not entered, then formatted
+    expected_prompt_empty = f"{SYSTEM_PROMPT}\n{expected_diff_section_empty}{expected_task}"
 
     actual_prompt_empty = reviewer_instance._make_files_prompt(diffs_empty)
     assert actual_prompt_empty == expected_prompt_empty
 
     # --- Test case 3: Single diff file ---
     diffs_single = [df1]
-    # Context for a single file: context = "" (initial) + "" (initial) + context_df1_str
-    expected_context_single = context_df1_str
-    expected_diff_section_single = f"<DIFF>\n{df1.diff}\n</DIFF>"
-    expected_prompt_single = f"{expected_context_single}\n{expected_diff_section_single}\n{Reviewer.PROMPT}"
+    expected_diff_section_single = f"<DIFF>\n{df1.diff}\n</DIFF>\n"
+    expected_prompt_single = f"{SYSTEM_PROMPT}{context_df1_str}\n{expected_diff_section_single}{expected_task}"
 
     actual_prompt_single = reviewer_instance._make_files_prompt(diffs_single)
     assert actual_prompt_single == expected_prompt_single
+    assert reviewer_instance._make_file_prompt(df1) == expected_prompt_single
+
+
+def test_sanitize_and_review_prompts_share_prefix():
+    reviewer_instance = Reviewer(llm=PlaceholderLLM())
+    changed = DiffFile(
+        name="service.py",
+        full_name="app/service.py",
+        original_content="import os\n\n\ndef handler():\n    return 1\n",
+        diff="-    return 1\n+    return 2",
+    )
+    neighbour = DiffFile(name="util.py", full_name="app/util.py", original_content="", diff="+x = 1")
+
+    sanitize_prompt = build_prompt(
+        SANITIZE_INSTRUCTIONS, SANITIZE_TASK.format(changed.full_name), [changed], [changed, neighbour]
+    )
+    review_prompt = reviewer_instance._make_file_prompt(changed)
+
+    shared = os.path.commonprefix([sanitize_prompt, review_prompt])
+    assert shared.startswith(SYSTEM_PROMPT)
+    assert changed.original_content in shared
+    assert changed.diff in shared
+
+
+def test_prompts_carry_only_the_instructions_of_their_task():
+    review_prompt = Reviewer(llm=PlaceholderLLM())._make_file_prompt(
+        DiffFile(name="a.py", full_name="a.py", original_content="", diff="+x = 1")
+    )
+
+    assert REVIEW_INSTRUCTIONS in review_prompt
+    assert SANITIZE_INSTRUCTIONS not in review_prompt
+    assert REVIEW_INSTRUCTIONS not in SYSTEM_PROMPT
+    assert SANITIZE_INSTRUCTIONS not in SYSTEM_PROMPT
@@ -0,0 +1,66 @@
+from reviewer.agents.sanitizer import Sanitizer
+from reviewer.system_utils.diff import DiffFile
+
+
+class FakeParsedFile:
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def remove_declaration(self, name_to_remove: str) -> bool:
+        lines = self.content.split(b"\n")
+        self.content = b"\n".join(line for line in lines if line != name_to_remove.encode("utf-8"))
+        return len(lines) != self.content.count(b"\n") + 1
+
+
+class FakeASTParser:
+    def parse(self, path_to_file: str, content: bytes):
+        return FakeParsedFile(content) if path_to_file.endswith(".py") else None
+
+
+class FakeLLM:
+    def __init__(self, answer: str):
+        self.answer = answer
+        self.calls: list[tuple[str, str]] = []
+
+    def generate(self, name: str, prompt: str, on_text=None) -> str:
+        self.calls.append((name, prompt))
+        return self.answer
+
+
+def _files() -> list[DiffFile]:
+    return [
+        DiffFile(name="a.py", full_name="pkg/a.py", diff="", original_content="keep_a\nremove_a"),
+        DiffFile(name="b.py", full_name="pkg/b.py", diff="", original_content="keep_b\nremove_b"),
+        DiffFile(name="c.py", full_name="pkg/c.py", diff="", original_content="keep_c"),
+    ]
+
+
+def test_sanitize_batch_routes_identifiers_to_files():
+    files = _files()
+    llm = FakeLLM('Here it is:\n{"pkg/a.py": ["remove_a"], "b.py": ["remove_b"], "pkg/c.py": []}')
+
+    Sanitizer(llm, FakeASTParser()).sanitize_batch(files, files)
+
+    assert len(llm.calls) == 1
+    assert llm.calls[0][0] == "sanitize: a.py, b.py, c.py"
+    assert "Do the sanitize task for each of the files pkg/a.py, pkg/b.py, pkg/c.py." in llm.calls[0][1]
+    assert [f.original_content for f in files] == ["keep_a", "keep_b", "keep_c"]
+
+
+def test_sanitize_batch_keeps_files_on_invalid_answer():
+    files = _files()
+    llm = FakeLLM("remove_a\nremove_b")
+
+    Sanitizer(llm, FakeASTParser()).sanitize_batch(files, files)
+
+    assert [f.original_content for f in files] == ["keep_a\nremove_a", "keep_b\nremove_b", "keep_c"]
+
+
+def test_sanitize_batch_of_one_parsed_file_uses_single_prompt():
+    files = [_files()[0], DiffFile(name="a.txt", full_name="pkg/a.txt", diff="", original_content="remove_a")]
+    llm = FakeLLM("remove_a\n")
+
+    Sanitizer(llm, FakeASTParser()).sanitize_batch(files, files)
+
+    assert llm.calls[0][0] == "sanitize:a.py"
+    assert [f.original_content for f in files] == ["keep_a", "remove_a"]
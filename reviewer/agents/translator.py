@@ -1,5 +1,8 @@
+from typing import Optional
+
 from reviewer.config.reviewer_config import Configuration
 from reviewer.llm.llm import LLM
+from reviewer.llm.streaming import TextSink
 
 
 class Translator:
@@ -18,8 +21,8 @@ class Translator:
         self.llm = llm
         self.__config = config
 
-    def translate(self, src: str) -> str:
+    def translate(self, src: str, on_text: Optional[TextSink] = None) -> str:
         if not self.__config.translate_enabled:
             return src
 
-        return self.llm.generate("translate", self.PROMPT.format(src))
+        return self.llm.generate("translate", self.PROMPT.format(src), on_text)
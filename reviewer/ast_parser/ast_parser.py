@@ -255,6 +255,15 @@ class ASTParser:
     def __init__(self):
         pass
 
+    def warm_up(self) -> None:
+        """Builds the parsers and languages of every supported language, so the first parse does not pay for it."""
+        for lang in _LANG_SPECIFIC_QUERIES:
+            try:
+                get_parser(lang)  # type: ignore
+                get_language(cast(SupportedLanguage, lang))
+            except Exception as e:
+                logging.warning(f"Failed to load tree-sitter parser for {lang}: {e}")
+
     def parse(self, path_to_file: str, content: bytes) -> Optional[ParsedFile]:
         lang = filename_to_lang(path_to_file)
         if not lang or lang not in _LANG_SPECIFIC_QUERIES:
@@ -1,5 +1,7 @@
 import argparse
-from dataclasses import dataclass
+import os
+from dataclasses import dataclass, field
+from typing import Optional
 
 
 class ReviewMode:
@@ -9,14 +11,29 @@ class ReviewMode:
     PackageByPackage = "package_by_package"
 
 
-MODEL_BASE_URL = "https://some-url/"
+# the base URLs can be pointed at a local stand-in server (fake_llm.py) for offline runs
+MODEL_BASE_URL = os.environ.get("REVIEWER_MODEL_BASE_URL", "https://some-url/")
 MODEL_API_KEY = "1"
 MODEL_NAME = "DeepSeek-R1-671B-AWQ"
 
-FALLBACK_MODEL_BASE_URL = "http://192.168.3.9:8080/v1"
+FALLBACK_MODEL_BASE_URL = os.environ.get("REVIEWER_FALLBACK_MODEL_BASE_URL", "http://192.168.3.9:8080/v1")
+# several llama.cpp servers of the same model, comma separated; calls are spread over them
+FALLBACK_MODEL_BASE_URLS = [
+    url.strip()
+    for url in os.environ.get("REVIEWER_FALLBACK_MODEL_BASE_URLS", FALLBACK_MODEL_BASE_URL).split(",")
+    if url.strip()
+]
 FALLBACK_MODEL_API_KEY = "1"
 FALLBACK_MODEL_NAME = "llama-model"
 
+# token counts approximate the review models with this tokenizer: a model id or a local tokenizer.json
+TOKENIZER = os.environ.get("REVIEWER_TOKENIZER", "Qwen/Qwen3-8B")
+
+
+class ObjectReader:
+    CatFile = "cat_file"
+    Packfile = "packfile"
+
 
 class InferenceProvider:
     BigModel = "big"
@@ -30,6 +47,52 @@ DEFAULT_REVIEW_MODE = ReviewMode.Auto
 
 # Other global settings that will be part of the Configuration object
 DEFAULT_TRANSLATE_ENABLED = True
+DEFAULT_SINGLE_GIT_DIFF = True
+DEFAULT_GIT_OBJECT_CONTENT = True
+DEFAULT_REF_ONLY = True
+DEFAULT_ALLOW_STALE_REFS = False
+DEFAULT_OBJECT_READER = ObjectReader.CatFile
+DEFAULT_GIT_WORKERS = 8
+DEFAULT_INCREMENTAL = False
+DEFAULT_CLASSIFY_FILES = True
+DEFAULT_DEDUPE_HUNKS = False
+DEFAULT_DEDUPE_MIN_CHANGED_LINES = 3
+DEFAULT_LOW_MEMORY = False
+DEFAULT_PIPELINE = False
+DEFAULT_LLM_CONCURRENCY = 4
+DEFAULT_FALLBACK_CONCURRENCY = 1
+DEFAULT_FALLBACK_HEALTH_INTERVAL = 15.0
+DEFAULT_LLM_CACHE = True
+DEFAULT_STREAM = True
+DEFAULT_PRIMARY_RETRIES = 2
+DEFAULT_PRIMARY_RETRY_BUDGET = 10
+DEFAULT_PRIMARY_RETRY_DELAY = 1.0
+DEFAULT_PRIMARY_CALL_TIMEOUT = 600.0
+DEFAULT_PRIMARY_RUN_DEADLINE = 0.0
+DEFAULT_PRIMARY_FAILURE_THRESHOLD = 3
+DEFAULT_PRIMARY_COOLDOWN = 120.0
+DEFAULT_HEDGE = False
+DEFAULT_HEDGE_PERCENTILE = 90.0
+DEFAULT_HEDGE_DELAY = 10.0
+DEFAULT_SANITIZE_BATCH_TOKENS = 24000
+DEFAULT_HTTP2 = True
+DEFAULT_HTTP_CONNECT_TIMEOUT = 10.0
+# prompt tokens of a review group when the context length of the endpoint is unknown
+DEFAULT_CONTEXT_WINDOW = 13824
+DEFAULT_COMPLETION_RESERVE = 2560
+DEFAULT_LLM_CACHE_MAX_MB = 256
+DEFAULT_LLM_CACHE_MAX_AGE_DAYS = 30
+
+DEFAULT_DAEMON_HOST = "127.0.0.1"
+DEFAULT_DAEMON_PORT = 8765
+DEFAULT_DAEMON_JOBS = 4
+
+DEFAULT_FAKE_LLM_PORT = 8080
+DEFAULT_FAKE_LLM_TTFT = 0.2
+DEFAULT_FAKE_LLM_PREFILL = 2000.0
+DEFAULT_FAKE_LLM_DECODE = 40.0
+DEFAULT_FAKE_LLM_CONTEXT_LENGTH = 32768
+DEFAULT_FAKE_LLM_PARALLEL = 4
 
 
 @dataclass
@@ -40,13 +103,229 @@ class Configuration:
     review_mode: str = DEFAULT_REVIEW_MODE
     inference_provider: str = DEFAULT_INFERENCE_PROVIDER
     translate_enabled: bool = DEFAULT_TRANSLATE_ENABLED
-    context_window: int = 13824
+    # 0 sizes review groups from the context length of the endpoint
+    context_window: int = 0
+    completion_reserve: int = DEFAULT_COMPLETION_RESERVE
+    # context lengths of models whose endpoint does not tell it
+    model_context_lengths: dict[str, int] = field(default_factory=dict)
+    tokenizer: str = TOKENIZER
+    single_git_diff: bool = DEFAULT_SINGLE_GIT_DIFF
+    git_object_content: bool = DEFAULT_GIT_OBJECT_CONTENT
+    ref_only: bool = DEFAULT_REF_ONLY
+    allow_stale_refs: bool = DEFAULT_ALLOW_STALE_REFS
+    object_reader: str = DEFAULT_OBJECT_READER
+    git_workers: int = DEFAULT_GIT_WORKERS
+    incremental: bool = DEFAULT_INCREMENTAL
+    classify_files: bool = DEFAULT_CLASSIFY_FILES
+    dedupe_hunks: bool = DEFAULT_DEDUPE_HUNKS
+    dedupe_min_changed_lines: int = DEFAULT_DEDUPE_MIN_CHANGED_LINES
+    low_memory: bool = DEFAULT_LOW_MEMORY
+    pipeline: bool = DEFAULT_PIPELINE
+    llm_concurrency: int = DEFAULT_LLM_CONCURRENCY
+    fallback_concurrency: int = DEFAULT_FALLBACK_CONCURRENCY
+    fallback_urls: list[str] = field(default_factory=lambda: list(FALLBACK_MODEL_BASE_URLS))
+    fallback_health_interval: float = DEFAULT_FALLBACK_HEALTH_INTERVAL
+    llm_cache: bool = DEFAULT_LLM_CACHE
+    stream: bool = DEFAULT_STREAM
+    primary_retries: int = DEFAULT_PRIMARY_RETRIES
+    primary_retry_budget: int = DEFAULT_PRIMARY_RETRY_BUDGET
+    primary_retry_delay: float = DEFAULT_PRIMARY_RETRY_DELAY
+    primary_call_timeout: float = DEFAULT_PRIMARY_CALL_TIMEOUT
+    primary_run_deadline: float = DEFAULT_PRIMARY_RUN_DEADLINE
+    primary_failure_threshold: int = DEFAULT_PRIMARY_FAILURE_THRESHOLD
+    primary_cooldown: float = DEFAULT_PRIMARY_COOLDOWN
+    hedge: bool = DEFAULT_HEDGE
+    hedge_percentile: float = DEFAULT_HEDGE_PERCENTILE
+    hedge_delay: float = DEFAULT_HEDGE_DELAY
+    sanitize_batch_tokens: int = DEFAULT_SANITIZE_BATCH_TOKENS
+    usage_report: Optional[str] = None
+    http2: bool = DEFAULT_HTTP2
+    http_connect_timeout: float = DEFAULT_HTTP_CONNECT_TIMEOUT
+    llm_cache_max_mb: int = DEFAULT_LLM_CACHE_MAX_MB
+    llm_cache_max_age_days: float = DEFAULT_LLM_CACHE_MAX_AGE_DAYS
+
+
+@dataclass
+class DaemonConfiguration:
+    host: str = DEFAULT_DAEMON_HOST
+    port: int = DEFAULT_DAEMON_PORT
+    socket_path: Optional[str] = None
+    jobs: int = DEFAULT_DAEMON_JOBS
+
+
+@dataclass
+class FakeLLMConfiguration:
+    host: str = DEFAULT_DAEMON_HOST
+    port: int = DEFAULT_FAKE_LLM_PORT
+    model: str = FALLBACK_MODEL_NAME
+    # seconds before the prefill starts, then prompt tokens at prefill tokens/s, then answer tokens at decode tokens/s
+    ttft: float = DEFAULT_FAKE_LLM_TTFT
+    prefill_tokens_per_second: float = DEFAULT_FAKE_LLM_PREFILL
+    decode_tokens_per_second: float = DEFAULT_FAKE_LLM_DECODE
+    context_length: int = DEFAULT_FAKE_LLM_CONTEXT_LENGTH
+    parallel: int = DEFAULT_FAKE_LLM_PARALLEL
+    prefix_cache: bool = False
+    error_rate: float = 0.0
+    error_status: int = 503
+    disconnect_rate: float = 0.0
+    answers_path: Optional[str] = None
+    seed: int = 0
 
 
 def get_configuration() -> Configuration:
     parser = argparse.ArgumentParser(description="Code reviewer using LLM")
     parser.add_argument("repo", type=str, help="Path to the repository to review")
     parser.add_argument("target_branch", type=str, help="Target branch to compare against master")
+    _add_review_arguments(parser)
+
+    args = parser.parse_args()
+
+    return _configuration_from_args(args, args.repo, args.target_branch)
+
+
+def get_daemon_configuration() -> tuple[Configuration, DaemonConfiguration]:
+    """Parses the daemon flags; review flags become the defaults of every job."""
+    parser = argparse.ArgumentParser(description="Code reviewer daemon serving review jobs")
+    parser.add_argument(
+        "--host",
+        type=str,
+        default=DEFAULT_DAEMON_HOST,
+        help=f"Address to listen on (default: {DEFAULT_DAEMON_HOST})",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=DEFAULT_DAEMON_PORT,
+        help=f"Port to listen on (default: {DEFAULT_DAEMON_PORT})",
+    )
+    parser.add_argument(
+        "--socket",
+        type=str,
+        default=None,
+        help="Listen on this Unix socket instead of host:port",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=DEFAULT_DAEMON_JOBS,
+        help=f"Number of review jobs running concurrently, each in its own warm worker process (default: {DEFAULT_DAEMON_JOBS})",  # noqa
+    )
+    _add_review_arguments(parser)
+
+    args = parser.parse_args()
+
+    daemon = DaemonConfiguration(host=args.host, port=args.port, socket_path=args.socket, jobs=args.jobs)
+    return _configuration_from_args(args, repo="", target_branch=""), daemon
+
+
+def get_fake_llm_configuration() -> FakeLLMConfiguration:
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stand-in server for offline runs and benchmarks")
+    parser.add_argument(
+        "--host",
+        type=str,
+        default=DEFAULT_DAEMON_HOST,
+        help=f"Address to listen on (default: {DEFAULT_DAEMON_HOST})",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=DEFAULT_FAKE_LLM_PORT,
+        help=f"Port to listen on (default: {DEFAULT_FAKE_LLM_PORT})",
+    )
+    parser.add_argument(
+        "--model",
+        type=str,
+        default=FALLBACK_MODEL_NAME,
+        help=f"Model name reported by /v1/models (default: {FALLBACK_MODEL_NAME})",
+    )
+    parser.add_argument(
+        "--ttft",
+        type=float,
+        default=DEFAULT_FAKE_LLM_TTFT,
+        help=f"Seconds before the prefill of a request starts (default: {DEFAULT_FAKE_LLM_TTFT})",
+    )
+    parser.add_argument(
+        "--prefill",
+        type=float,
+        default=DEFAULT_FAKE_LLM_PREFILL,
+        help=f"Prompt tokens processed per second (default: {DEFAULT_FAKE_LLM_PREFILL})",
+    )
+    parser.add_argument(
+        "--decode",
+        type=float,
+        default=DEFAULT_FAKE_LLM_DECODE,
+        help=f"Answer tokens generated per second (default: {DEFAULT_FAKE_LLM_DECODE})",
+    )
+    parser.add_argument(
+        "--context_length",
+        type=int,
+        default=DEFAULT_FAKE_LLM_CONTEXT_LENGTH,
+        help=f"Longer prompts are rejected like llama.cpp does (default: {DEFAULT_FAKE_LLM_CONTEXT_LENGTH})",
+    )
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        default=DEFAULT_FAKE_LLM_PARALLEL,
+        help=f"Requests processed at a time, the others wait (default: {DEFAULT_FAKE_LLM_PARALLEL})",
+    )
+    parser.add_argument(
+        "--prefix_cache",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Skip the prefill of the prompt prefix shared with recent requests (default: disabled)",
+    )
+    parser.add_argument(
+        "--error_rate",
+        type=float,
+        default=0.0,
+        help="Share of requests answered with --error_status (default: 0)",
+    )
+    parser.add_argument(
+        "--error_status",
+        type=int,
+        default=503,
+        help="HTTP status of injected errors (default: 503)",
+    )
+    parser.add_argument(
+        "--disconnect_rate",
+        type=float,
+        default=0.0,
+        help="Share of streamed answers cut off halfway (default: 0)",
+    )
+    parser.add_argument(
+        "--answers",
+        type=str,
+        default=None,
+        help='JSON file with a list of {"match": regex, "answer": template} tried before the built-in answers',
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed of the error injection (default: 0)",
+    )
+
+    args = parser.parse_args()
+
+    return FakeLLMConfiguration(
+        host=args.host,
+        port=args.port,
+        model=args.model,
+        ttft=args.ttft,
+        prefill_tokens_per_second=args.prefill,
+        decode_tokens_per_second=args.decode,
+        context_length=args.context_length,
+        parallel=args.parallel,
+        prefix_cache=args.prefix_cache,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        disconnect_rate=args.disconnect_rate,
+        answers_path=args.answers,
+        seed=args.seed,
+    )
+
+
+def _add_review_arguments(parser: argparse.ArgumentParser) -> None:
     parser.add_argument(
         "--review_test_files",
         action=argparse.BooleanOptionalAction,
@@ -78,14 +357,288 @@ def get_configuration() -> Configuration:
         default=DEFAULT_TRANSLATE_ENABLED,
         help=f"Enable/disable translation of review results (default: {'enabled' if DEFAULT_TRANSLATE_ENABLED else 'disabled'})",  # noqa
     )
+    parser.add_argument(
+        "--single_git_diff",
+        action=argparse.BooleanOptionalAction,
+        default=DEFAULT_SINGLE_GIT_DIFF,
+        help=f"Collect all file diffs with one git diff call instead of one call per file (default: {'enabled' if DEFAULT_SINGLE_GIT_DIFF else 'disabled'})",  # noqa
+    )
+    parser.add_argument(
+        "--git_object_content",
+        action=argparse.BooleanOptionalAction,
+        default=DEFAULT_GIT_OBJECT_CONTENT,
+        help=f"Read master file contents from the git object store instead of the working tree (default: {'enabled' if DEFAULT_GIT_OBJECT_CONTENT else 'disabled'})",  # noqa
+    )
+    parser.add_argument(
+        "--ref_only",
+        action=argparse.BooleanOptionalAction,
+        default=DEFAULT_REF_ONLY,
+        help=f"Fetch the two branches once and review origin refs without any checkout (default: {'enabled' if DEFAULT_REF_ONLY else 'disabled'})",  # noqa
+    )
+    parser.add_argument(
+        "--allow_stale_refs",
+        action=argparse.BooleanOptionalAction,
+        default=DEFAULT_ALLOW_STALE_REFS,
+        help=f"Review the local refs when the fetch of --ref_only fails instead of stopping (default: {'enabled' if DEFAULT_ALLOW_STALE_REFS else 'disabled'})",  # noqa
+    )
+    parser.add_argument(
+        "--object_reader",
+        type=str,
+        default=DEFAULT_OBJECT_READER,
+        choices=[ObjectReader.CatFile, ObjectReader.Packfile],
+        help=f"How master blobs are read from the object store (default: {DEFAULT_OBJECT_READER})",
+    )
+    parser.add_argument(
+        "--git_workers",
+        type=_positive_int,
+        default=DEFAULT_GIT_WORKERS,
+        help=f"Number of threads loading file contents and diffs concurrently (default: {DEFAULT_GIT_WORKERS})",
+    )
+    parser.add_argument(
+        "--incremental",
+        action=argparse.BooleanOptionalAction,
+        default=DEFAULT_INCREMENTAL,
+        help=f"Review only commits pushed since the last reviewed head of the branch (default: {'enabled' if DEFAULT_INCREMENTAL else 'disabled'})",  # noqa
+    )
+    parser.add_argument(
+        "--classify_files",
+        action=argparse.BooleanOptionalAction,
+        default=DEFAULT_CLASSIFY_FILES,
+        help=f"Skip generated, vendored, binary, minified, lock and oversized files before reading them (default: {'enabled' if DEFAULT_CLASSIFY_FILES else 'disabled'})",  # noqa
+    )
+    parser.add_argument(
+        "--dedupe_hunks",
+        action=argparse.BooleanOptionalAction,
+        default=DEFAULT_DEDUPE_HUNKS,
+        help=f"Review byte-identical hunks repeated across files only once (default: {'enabled' if DEFAULT_DEDUPE_HUNKS else 'disabled'})",  # noqa
+    )
+    parser.add_argument(
+        "--dedupe_min_changed_lines",
+        type=_positive_int,
+        default=DEFAULT_DEDUPE_MIN_CHANGED_LINES,
+        help=f"Added and removed lines a hunk needs before --dedupe_hunks drops its copies (default: {DEFAULT_DEDUPE_MIN_CHANGED_LINES})",  # noqa
+    )
+    parser.add_argument(
+        "--low_memory",
+        action=argparse.BooleanOptionalAction,
+        default=DEFAULT_LOW_MEMORY,
+        help=f"Stream the diff and load file contents only for the group under review (default: {'enabled' if DEFAULT_LOW_MEMORY else 'disabled'})",  # noqa
+    )
+    parser.add_argument(
+        "--pipeline",
+        action=argparse.BooleanOptionalAction,
+        default=DEFAULT_PIPELINE,
+        help=f"Overlap loading, token counting, sanitizing and reviewing in auto mode; groups are packed in the order of the diff (default: {'enabled' if DEFAULT_PIPELINE else 'disabled'})",  # noqa
+    )
+    parser.add_argument(
+        "--llm_concurrency",
+        type=_positive_int,
+        default=DEFAULT_LLM_CONCURRENCY,
+        help=f"Maximum number of review requests in flight to the big model (default: {DEFAULT_LLM_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--fallback_concurrency",
+        type=_positive_int,
+        default=DEFAULT_FALLBACK_CONCURRENCY,
+        help=f"Maximum number of requests in flight to each llama.cpp server (default: {DEFAULT_FALLBACK_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--tokenizer",
+        type=str,
+        default=TOKENIZER,
+        help="Tokenizer for token counts: a Hugging Face model id, a directory or a tokenizer.json (default: REVIEWER_TOKENIZER or Qwen/Qwen3-8B)",  # noqa
+    )
+    parser.add_argument(
+        "--fallback_url",
+        action="append",
+        default=None,
+        help="Base URL of a llama.cpp server of the local model; can be repeated to spread calls over several servers (default: REVIEWER_FALLBACK_MODEL_BASE_URLS or REVIEWER_FALLBACK_MODEL_BASE_URL)",  # noqa
+    )
+    parser.add_argument(
+        "--fallback_health_interval",
+        type=float,
+        default=DEFAULT_FALLBACK_HEALTH_INTERVAL,
+        help=f"Seconds between health checks of a failed llama.cpp server (default: {DEFAULT_FALLBACK_HEALTH_INTERVAL})",  # noqa
+    )
+    parser.add_argument(
+        "--llm_cache",
+        action=argparse.BooleanOptionalAction,
+        default=DEFAULT_LLM_CACHE,
+        help=f"Reuse stored LLM answers for unchanged prompts, --no-llm_cache bypasses the cache (default: {'enabled' if DEFAULT_LLM_CACHE else 'disabled'})",  # noqa
+    )
+    parser.add_argument(
+        "--llm_cache_max_mb",
+        type=int,
+        default=DEFAULT_LLM_CACHE_MAX_MB,
+        help=f"Size of stored LLM answers above which the least recently used are evicted (default: {DEFAULT_LLM_CACHE_MAX_MB})",  # noqa
+    )
+    parser.add_argument(
+        "--llm_cache_max_age_days",
+        type=float,
+        default=DEFAULT_LLM_CACHE_MAX_AGE_DAYS,
+        help=f"Age after which stored LLM answers are evicted (default: {DEFAULT_LLM_CACHE_MAX_AGE_DAYS})",
+    )
+    parser.add_argument(
+        "--stream",
+        action=argparse.BooleanOptionalAction,
+        default=DEFAULT_STREAM,
+        help=f"Stream completions and print the review while it is generated (default: {'enabled' if DEFAULT_STREAM else 'disabled'})",  # noqa
+    )
+    parser.add_argument(
+        "--primary_retries",
+        type=int,
+        default=DEFAULT_PRIMARY_RETRIES,
+        help=f"Retries of a big model call after a transient error (default: {DEFAULT_PRIMARY_RETRIES})",
+    )
+    parser.add_argument(
+        "--primary_retry_budget",
+        type=int,
+        default=DEFAULT_PRIMARY_RETRY_BUDGET,
+        help=f"Retries of big model calls allowed in one run (default: {DEFAULT_PRIMARY_RETRY_BUDGET})",
+    )
+    parser.add_argument(
+        "--primary_call_timeout",
+        type=float,
+        default=DEFAULT_PRIMARY_CALL_TIMEOUT,
+        help=f"Seconds a big model call may take before the local model is used (default: {DEFAULT_PRIMARY_CALL_TIMEOUT})",  # noqa
+    )
+    parser.add_argument(
+        "--primary_run_deadline",
+        type=float,
+        default=DEFAULT_PRIMARY_RUN_DEADLINE,
+        help="Seconds after the start of the run past which only the local model is used, 0 for no deadline (default: 0)",  # noqa
+    )
+    parser.add_argument(
+        "--primary_failure_threshold",
+        type=int,
+        default=DEFAULT_PRIMARY_FAILURE_THRESHOLD,
+        help=f"Consecutive big model failures that open the circuit breaker (default: {DEFAULT_PRIMARY_FAILURE_THRESHOLD})",  # noqa
+    )
+    parser.add_argument(
+        "--primary_cooldown",
+        type=float,
+        default=DEFAULT_PRIMARY_COOLDOWN,
+        help=f"Seconds the big model is skipped once the circuit breaker opens (default: {DEFAULT_PRIMARY_COOLDOWN})",
+    )
+    parser.add_argument(
+        "--hedge",
+        action=argparse.BooleanOptionalAction,
+        default=DEFAULT_HEDGE,
+        help=f"Also ask the local model when the big model is slow to start answering; the first answer wins (default: {'enabled' if DEFAULT_HEDGE else 'disabled'})",  # noqa
+    )
+    parser.add_argument(
+        "--hedge_percentile",
+        type=float,
+        default=DEFAULT_HEDGE_PERCENTILE,
+        help=f"Percentile of recent first-token latencies of the big model after which a call is hedged (default: {DEFAULT_HEDGE_PERCENTILE})",  # noqa
+    )
+    parser.add_argument(
+        "--hedge_delay",
+        type=float,
+        default=DEFAULT_HEDGE_DELAY,
+        help=f"Seconds to wait for the first token before hedging, until enough latencies are measured (default: {DEFAULT_HEDGE_DELAY})",  # noqa
+    )
+    parser.add_argument(
+        "--sanitize_batch_tokens",
+        type=int,
+        default=DEFAULT_SANITIZE_BATCH_TOKENS,
+        help=f"Tokens of files sanitized together in one call of auto mode, 0 for one call per file (default: {DEFAULT_SANITIZE_BATCH_TOKENS})",  # noqa
+    )
+    parser.add_argument(
+        "--usage_report",
+        default=None,
+        help="Also write the JSON summary of LLM tokens and seconds by stage, endpoint and file to this path",
+    )
+    parser.add_argument(
+        "--http2",
+        action=argparse.BooleanOptionalAction,
+        default=DEFAULT_HTTP2,
+        help=f"Talk HTTP/2 to the LLM endpoints when the h2 package is installed (default: {'enabled' if DEFAULT_HTTP2 else 'disabled'})",  # noqa
+    )
+    parser.add_argument(
+        "--http_connect_timeout",
+        type=float,
+        default=DEFAULT_HTTP_CONNECT_TIMEOUT,
+        help=f"Seconds to wait for a connection to an LLM endpoint (default: {DEFAULT_HTTP_CONNECT_TIMEOUT})",
+    )
+    parser.add_argument(
+        "--context_window",
+        type=int,
+        default=0,
+        help=f"Prompt tokens of a review group; 0 to take the context length of the endpoint less the completion reserve, or {DEFAULT_CONTEXT_WINDOW} when it is unknown (default: 0)",  # noqa
+    )
+    parser.add_argument(
+        "--completion_reserve",
+        type=int,
+        default=DEFAULT_COMPLETION_RESERVE,
+        help=f"Tokens of the context length kept for the answer (default: {DEFAULT_COMPLETION_RESERVE})",
+    )
+    parser.add_argument(
+        "--model_context_length",
+        type=_model_context_length,
+        action="append",
+        default=[],
+        metavar="MODEL=TOKENS",
+        help="Context length of a model whose endpoint does not report it; can be repeated",
+    )
 
-    args = parser.parse_args()
 
+def _configuration_from_args(args: argparse.Namespace, repo: str, target_branch: str) -> Configuration:
     return Configuration(
-        repo=args.repo,
-        target_branch=args.target_branch,
+        repo=repo,
+        target_branch=target_branch,
         review_test_files=args.review_test_files,
         review_mode=args.review_mode,
         inference_provider=args.inference_provider,
         translate_enabled=args.translate,
+        single_git_diff=args.single_git_diff,
+        git_object_content=args.git_object_content,
+        ref_only=args.ref_only,
+        allow_stale_refs=args.allow_stale_refs,
+        object_reader=args.object_reader,
+        git_workers=args.git_workers,
+        incremental=args.incremental,
+        classify_files=args.classify_files,
+        dedupe_hunks=args.dedupe_hunks,
+        dedupe_min_changed_lines=args.dedupe_min_changed_lines,
+        low_memory=args.low_memory,
+        pipeline=args.pipeline,
+        llm_concurrency=args.llm_concurrency,
+        fallback_concurrency=args.fallback_concurrency,
+        llm_cache=args.llm_cache,
+        llm_cache_max_mb=args.llm_cache_max_mb,
+        llm_cache_max_age_days=args.llm_cache_max_age_days,
+        stream=args.stream,
+        primary_retries=args.primary_retries,
+        primary_retry_budget=args.primary_retry_budget,
+        primary_call_timeout=args.primary_call_timeout,
+        primary_run_deadline=args.primary_run_deadline,
+        primary_failure_threshold=args.primary_failure_threshold,
+        primary_cooldown=args.primary_cooldown,
+        hedge=args.hedge,
+        hedge_percentile=args.hedge_percentile,
+        hedge_delay=args.hedge_delay,
+        sanitize_batch_tokens=args.sanitize_batch_tokens,
+        usage_report=args.usage_report,
+        http2=args.http2,
+        http_connect_timeout=args.http_connect_timeout,
+        context_window=args.context_window,
+        completion_reserve=args.completion_reserve,
+        model_context_lengths=dict(args.model_context_length),
+        tokenizer=args.tokenizer,
+        fallback_urls=args.fallback_url or list(FALLBACK_MODEL_BASE_URLS),
+        fallback_health_interval=args.fallback_health_interval,
     )
+
+
+def _positive_int(value: str) -> int:
+    if not value.isdigit() or int(value) < 1:
+        raise argparse.ArgumentTypeError(f"expected a number of at least 1, got {value}")
+    return int(value)
+
+
+def _model_context_length(value: str) -> tuple[str, int]:
+    model, _, tokens = value.rpartition("=")
+    if not model or not tokens.isdigit():
+        raise argparse.ArgumentTypeError(f"expected MODEL=TOKENS, got {value}")
+    return model, int(tokens)
@@ -0,0 +1,38 @@
+import contextlib
+import io
+import sys
+import unittest
+from unittest.mock import patch
+
+from reviewer.config.reviewer_config import get_configuration
+
+
+def _parse(*args: str):
+    with patch.object(sys, "argv", ["cli.py", "repo", "feature", *args]):
+        return get_configuration()
+
+
+class TestGitWorkers(unittest.TestCase):
+    def test_positive_value(self):
+        self.assertEqual(3, _parse("--git_workers=3").git_workers)
+
+    def test_values_below_one_are_rejected(self):
+        for value in ["0", "-2", "x"]:
+            with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+                _parse(f"--git_workers={value}")
+
+
+class TestConcurrency(unittest.TestCase):
+    def test_positive_values(self):
+        configuration = _parse("--llm_concurrency=2", "--fallback_concurrency=1")
+        self.assertEqual((2, 1), (configuration.llm_concurrency, configuration.fallback_concurrency))
+
+    def test_values_below_one_are_rejected(self):
+        for flag in ["--llm_concurrency", "--fallback_concurrency"]:
+            for value in ["0", "-1"]:
+                with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+                    _parse(f"{flag}={value}")
+
+
+if __name__ == "__main__":
+    unittest.main()
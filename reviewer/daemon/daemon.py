@@ -0,0 +1,270 @@
+import io
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext, redirect_stdout
+from dataclasses import dataclass, field, replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingUnixStreamServer
+from typing import Any, Callable, Optional
+from urllib.parse import parse_qs, urlparse
+
+from reviewer.config.reviewer_config import Configuration, DaemonConfiguration, ReviewMode
+from reviewer.locator.service_locator import ServiceLocator
+
+
+class JobStatus:
+    Queued = "queued"
+    Running = "running"
+    Done = "done"
+    Failed = "failed"
+
+
+@dataclass
+class ReviewJob:
+    id: str
+    configuration: Configuration
+    status: str = JobStatus.Queued
+    output: str = ""
+    error: str = ""
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "repo": self.configuration.repo,
+            "branch": self.configuration.target_branch,
+            "mode": self.configuration.review_mode,
+            "status": self.status,
+            "output": self.output,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+# Warm services of a worker process, set up once by _init_worker.
+_worker_locator: Optional[ServiceLocator] = None
+
+
+def _init_worker(configuration: Configuration) -> None:
+    global _worker_locator
+
+    logging.basicConfig(level=logging.INFO, format=f"[worker {os.getpid()}] %(message)s")
+    started = time.perf_counter()
+    _worker_locator = ServiceLocator(configuration)
+    _worker_locator.warm_up()
+    logging.info(f"warmed up in {time.perf_counter() - started:.2f}s")
+
+
+def run_review_job(configuration: Configuration) -> str:
+    """Runs one review in a worker process and returns what the review printed."""
+    locator = _worker_locator.for_job(configuration) if _worker_locator else ServiceLocator(configuration)
+    output = io.StringIO()
+    try:
+        with redirect_stdout(output):
+            locator.get_reviewer_processor().process_review()
+    finally:
+        locator.close()
+    return output.getvalue()
+
+
+class ReviewDaemon:
+    """Runs review jobs on a pool of warm worker processes.
+
+    Every worker loads the tokenizer and the tree-sitter parsers once at start
+    and then serves jobs one at a time, so a job only pays for its own git and LLM
+    work. Jobs run in separate processes because a review changes the working
+    directory of the process it runs in. Jobs that check out branches (without
+    --ref_only) are serialized per repository; ref-only jobs run in parallel and
+    only take turns on their `git fetch` (see `git.fetch_branches`).
+    """
+
+    def __init__(
+        self,
+        configuration: Configuration,
+        jobs: int,
+        executor: Optional[Executor] = None,
+        runner: Callable[[Configuration], str] = run_review_job,
+    ):
+        self.__configuration = configuration
+        self.__workers = jobs
+        self.__executor = executor or ProcessPoolExecutor(
+            max_workers=jobs,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(configuration,),
+        )
+        self.__dispatcher = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="review-job")
+        self.__runner = runner
+        self.__jobs: dict[str, ReviewJob] = {}
+        self.__futures: dict[str, Future] = {}
+        self.__repo_locks: dict[str, threading.Lock] = {}
+        self.__lock = threading.Lock()
+
+    def submit(self, request: dict[str, Any]) -> ReviewJob:
+        """Queues a job from a request with repo, branch and an optional mode; raises ValueError on a bad request."""
+        repo = request.get("repo")
+        branch = request.get("branch")
+        mode = request.get("mode", self.__configuration.review_mode)
+        if not isinstance(repo, str) or not os.path.isdir(repo):
+            raise ValueError(f"repo {repo!r} is not a directory")
+        if not isinstance(branch, str) or not branch:
+            raise ValueError("branch is required")
+        if mode not in (ReviewMode.Auto, ReviewMode.FileByFile, ReviewMode.AllFilesAtOnce, ReviewMode.PackageByPackage):
+            raise ValueError(f"unknown review mode {mode!r}")
+
+        configuration = replace(
+            self.__configuration,
+            repo=os.path.realpath(repo),
+            target_branch=branch,
+            review_mode=mode,
+        )
+        job = ReviewJob(id=uuid.uuid4().hex[:12], configuration=configuration)
+        with self.__lock:
+            self.__jobs[job.id] = job
+            self.__futures[job.id] = self.__dispatcher.submit(self.__run, job)
+        logging.info(f"job {job.id}: {configuration.repo} {branch} ({mode})")
+        return job
+
+    def get(self, job_id: str) -> Optional[ReviewJob]:
+        return self.__jobs.get(job_id)
+
+    def jobs(self) -> list[ReviewJob]:
+        return list(self.__jobs.values())
+
+    def wait(self, job_id: str) -> ReviewJob:
+        self.__futures[job_id].result()
+        return self.__jobs[job_id]
+
+    def warm_up(self) -> None:
+        """Starts the worker processes up front instead of on the first jobs."""
+        futures = [self.__executor.submit(time.sleep, 0) for _ in range(self.__workers)]
+        for future in futures:
+            future.result()
+
+    def close(self) -> None:
+        self.__dispatcher.shutdown(wait=False, cancel_futures=True)
+        self.__executor.shutdown(wait=False, cancel_futures=True)
+
+    def __run(self, job: ReviewJob) -> None:
+        repo_lock = nullcontext() if job.configuration.ref_only else self.__repo_lock(job.configuration.repo)
+        with repo_lock:
+            job.status = JobStatus.Running
+            job.started_at = time.time()
+            try:
+                job.output = self.__executor.submit(self.__runner, job.configuration).result()
+                job.status = JobStatus.Done
+            except Exception as e:
+                logging.error(f"job {job.id} failed: {e}")
+                job.error = str(e)
+                job.status = JobStatus.Failed
+            job.finished_at = time.time()
+        logging.info(f"job {job.id}: {job.status} in {job.finished_at - job.started_at:.2f}s")
+
+    def __repo_lock(self, repo: str) -> threading.Lock:
+        with self.__lock:
+            return self.__repo_locks.setdefault(repo, threading.Lock())
+
+
+def make_handler(daemon: ReviewDaemon) -> type[BaseHTTPRequestHandler]:
+    """HTTP API of the daemon.
+
+    POST /jobs        {"repo": ..., "branch": ..., "mode": ...}, `?wait=1` blocks until the review is done
+    GET  /jobs        all jobs
+    GET  /jobs/<id>   one job with its status and output
+    GET  /health
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):  # noqa:N802
+            path = urlparse(self.path).path.rstrip("/")
+            if path == "/health":
+                self.__respond(200, {"status": "ok"})
+            elif path == "/jobs":
+                self.__respond(200, [job.to_dict() for job in daemon.jobs()])
+            elif path.startswith("/jobs/"):
+                job = daemon.get(path.removeprefix("/jobs/"))
+                if job:
+                    self.__respond(200, job.to_dict())
+                else:
+                    self.__respond(404, {"error": "no such job"})
+            else:
+                self.__respond(404, {"error": "not found"})
+
+        def do_POST(self):  # noqa:N802
+            url = urlparse(self.path)
+            if url.path.rstrip("/") != "/jobs":
+                self.__respond(404, {"error": "not found"})
+                return
+
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                job = daemon.submit(json.loads(self.rfile.read(length) or b"{}"))
+            except (ValueError, AttributeError) as e:
+                self.__respond(400, {"error": str(e)})
+                return
+
+            if parse_qs(url.query).get("wait", ["0"])[0] not in ("0", "false"):
+                job = daemon.wait(job.id)
+                self.__respond(200, job.to_dict())
+            else:
+                self.__respond(202, job.to_dict())
+
+        def log_message(self, format, *args):  # noqa:A002
+            logging.debug(format % args)
+
+        def __respond(self, status: int, body: Any) -> None:
+            payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return Handler
+
+
+class _UnixHTTPServer(ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        return request, ("unix", 0)
+
+
+def make_server(daemon: ReviewDaemon, config: DaemonConfiguration) -> ThreadingUnixStreamServer | ThreadingHTTPServer:
+    handler = make_handler(daemon)
+    if config.socket_path:
+        if os.path.exists(config.socket_path):
+            os.unlink(config.socket_path)
+        return _UnixHTTPServer(config.socket_path, handler)
+    return ThreadingHTTPServer((config.host, config.port), handler)
+
+
+def serve(configuration: Configuration, config: DaemonConfiguration) -> None:
+    daemon = ReviewDaemon(configuration, config.jobs)
+    started = time.perf_counter()
+    daemon.warm_up()
+    logging.info(f"{config.jobs} workers ready in {time.perf_counter() - started:.2f}s")
+
+    server = make_server(daemon, config)
+    logging.info(f"listening on {config.socket_path or f'http://{config.host}:{config.port}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        daemon.close()
+        if config.socket_path and os.path.exists(config.socket_path):
+            os.unlink(config.socket_path)
@@ -0,0 +1,168 @@
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+from reviewer.config.reviewer_config import Configuration, DaemonConfiguration, ReviewMode
+from reviewer.daemon.daemon import JobStatus, ReviewDaemon, make_server
+from reviewer.system_utils.conftest import run_git
+from reviewer.system_utils.diff import fetch_review_refs
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path: str):
+        super().__init__("localhost")
+        self.__path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.__path)
+
+
+def _request(connection: http.client.HTTPConnection, method: str, path: str, body=None) -> tuple[int, object]:
+    connection.request(method, path, body=json.dumps(body) if body is not None else None)
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+@pytest.fixture
+def daemon():
+    def runner(configuration: Configuration) -> str:
+        if configuration.target_branch == "broken":
+            raise RuntimeError("no such branch")
+        return f"{configuration.target_branch} {configuration.review_mode}"
+
+    daemon = ReviewDaemon(
+        Configuration(repo="", target_branch="", ref_only=True),
+        jobs=2,
+        executor=ThreadPoolExecutor(max_workers=2),
+        runner=runner,
+    )
+    yield daemon
+    daemon.close()
+
+
+def test_submit_and_wait(daemon, tmp_path):
+    job = daemon.wait(daemon.submit({"repo": str(tmp_path), "branch": "feature"}).id)
+
+    assert job.status == JobStatus.Done
+    assert job.output == f"feature {ReviewMode.Auto}"
+
+    failed = daemon.wait(daemon.submit({"repo": str(tmp_path), "branch": "broken"}).id)
+    assert failed.status == JobStatus.Failed
+    assert failed.error == "no such branch"
+
+
+def test_submit_rejects_bad_requests(daemon, tmp_path):
+    with pytest.raises(ValueError):
+        daemon.submit({"repo": str(tmp_path / "missing"), "branch": "feature"})
+    with pytest.raises(ValueError):
+        daemon.submit({"repo": str(tmp_path)})
+    with pytest.raises(ValueError):
+        daemon.submit({"repo": str(tmp_path), "branch": "feature", "mode": "everything"})
+
+
+def test_checkout_jobs_are_serialized_per_repo(tmp_path):
+    running = 0
+    max_running = 0
+    lock = threading.Lock()
+
+    def runner(configuration: Configuration) -> str:
+        nonlocal running, max_running
+        with lock:
+            running += 1
+            max_running = max(max_running, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+        return ""
+
+    daemon = ReviewDaemon(
+        Configuration(repo="", target_branch="", ref_only=False),
+        jobs=3,
+        executor=ThreadPoolExecutor(max_workers=3),
+        runner=runner,
+    )
+    jobs = [daemon.submit({"repo": str(tmp_path), "branch": f"b{i}"}) for i in range(3)]
+    for job in jobs:
+        daemon.wait(job.id)
+    daemon.close()
+
+    assert max_running == 1
+
+
+def _fetch_refs(configuration: Configuration) -> str:
+    os.chdir(configuration.repo)
+    return " ".join(fetch_review_refs(configuration.target_branch))
+
+
+def test_ref_only_jobs_fetch_into_one_clone(tmp_path):
+    origin, clone = tmp_path / "origin", tmp_path / "clone"
+    run_git("init", "-q", "-b", "master", str(origin))
+
+    def commit(message: str) -> None:
+        author = ["-c", "user.email=test@example.com", "-c", "user.name=test"]
+        run_git("-C", str(origin), *author, "commit", "-q", "--allow-empty", "-m", message)
+
+    commit("init")
+    for i in range(4):
+        run_git("-C", str(origin), "branch", f"b{i}")
+    run_git("clone", "-q", str(origin), str(clone))
+
+    daemon = ReviewDaemon(
+        Configuration(repo="", target_branch="", ref_only=True),
+        jobs=4,
+        executor=ProcessPoolExecutor(max_workers=4, mp_context=multiprocessing.get_context("spawn")),
+        runner=_fetch_refs,
+    )
+    try:
+        daemon.warm_up()
+        for attempt in range(5):
+            # every job of the round updates origin/master, which has moved
+            commit(f"master {attempt}")
+            jobs = [daemon.submit({"repo": str(clone), "branch": f"b{i}"}) for i in range(4)]
+            assert [(daemon.wait(job.id).status, job.error) for job in jobs] == [(JobStatus.Done, "")] * 4
+    finally:
+        daemon.close()
+
+
+@pytest.mark.parametrize("unix_socket", [False, True])
+def test_http_api(daemon, tmp_path, unix_socket):
+    config = DaemonConfiguration(port=0, socket_path=str(tmp_path / "reviewer.sock") if unix_socket else None)
+    server = make_server(daemon, config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def connect() -> http.client.HTTPConnection:
+        if unix_socket:
+            return _UnixConnection(config.socket_path)
+        return http.client.HTTPConnection(*server.server_address)
+
+    try:
+        status, body = _request(connect(), "GET", "/health")
+        assert status == 200
+
+        status, body = _request(
+            connect(), "POST", "/jobs?wait=1", {"repo": str(tmp_path), "branch": "feature", "mode": "file_by_file"}
+        )
+        assert status == 200
+        assert body["status"] == JobStatus.Done
+        assert body["output"] == "feature file_by_file"
+
+        status, job = _request(connect(), "GET", f"/jobs/{body['id']}")
+        assert status == 200
+        assert job["id"] == body["id"]
+
+        status, body = _request(connect(), "POST", "/jobs", {"repo": str(tmp_path)})
+        assert status == 400
+
+        status, body = _request(connect(), "GET", "/jobs/unknown")
+        assert status == 404
+    finally:
+        server.shutdown()
+        server.server_close()
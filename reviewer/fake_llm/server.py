@@ -0,0 +1,290 @@
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Optional
+from urllib.parse import urlparse
+
+from reviewer.config.reviewer_config import FakeLLMConfiguration
+
+# rough number of characters per token of code and English text
+CHARS_PER_TOKEN = 4
+
+# (pattern, answer template) pairs; the template may refer to the groups of the pattern
+DEFAULT_ANSWERS = [
+    (r"<TASK>\nDo the sanitize task for each", "{}"),
+    (r"<TASK>\nDo the sanitize task", ""),
+    (r"<SRC_TEXT>\n(?P<src>.*)\n</SRC_TEXT>", r"\g<src>"),
+    (r"<TASK>\nDo the review task", "no comments"),
+]
+FALLBACK_ANSWER = "no comments"
+
+
+class FakeLLM:
+    """Answers chat completions with canned text at the pace of a real inference server.
+
+    A request waits for one of `parallel` slots, then for `ttft` seconds plus the
+    prefill of its prompt, then gets its answer token by token at the decode rate.
+    With the prefix cache, the part of the prompt shared with a recent request
+    is not prefilled again. Tokens are estimated from the length of the text.
+    """
+
+    def __init__(
+        self,
+        config: FakeLLMConfiguration,
+        answers: Optional[list[tuple[str, str]]] = None,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.config = config
+        self.sleep = sleep
+        self.__answers = [
+            (re.compile(pattern, re.DOTALL), answer) for pattern, answer in (answers or []) + DEFAULT_ANSWERS
+        ]
+        self.__slots = threading.Semaphore(config.parallel)
+        self.__lock = threading.Lock()
+        self.__random = random.Random(config.seed)  # noqa:S311
+        self.__recent_prompts: deque[str] = deque(maxlen=16)
+        self.__stats = {
+            "requests": 0,
+            "errors": 0,
+            "disconnects": 0,
+            "prompt_tokens": 0,
+            "cached_tokens": 0,
+            "completion_tokens": 0,
+        }
+
+    @property
+    def slots(self) -> threading.Semaphore:
+        return self.__slots
+
+    def answer(self, prompt: str) -> str:
+        for pattern, template in self.__answers:
+            match = pattern.search(prompt)
+            if match:
+                return match.expand(template)
+        return FALLBACK_ANSWER
+
+    def reject(self, prompt_tokens: int) -> Optional[tuple[int, dict[str, Any]]]:
+        """The error response for a request that is not served: an injected error or a too long prompt."""
+        with self.__lock:
+            self.__stats["requests"] += 1
+            if self.__random.random() < self.config.error_rate:
+                self.__stats["errors"] += 1
+                return self.config.error_status, _error("injected error", "server_error", self.config.error_status)
+
+        if prompt_tokens > self.config.context_length:
+            with self.__lock:
+                self.__stats["errors"] += 1
+            message = (
+                f"the request exceeds the available context size, "
+                f"n_prompt_tokens: {prompt_tokens}, n_ctx: {self.config.context_length}"
+            )
+            return 400, _error(message, "exceed_context_size_error", 400)
+        return None
+
+    def prefill_seconds(self, prompt: str) -> float:
+        """Seconds until the first token; records the cached part of the prompt."""
+        cached = 0
+        with self.__lock:
+            if self.config.prefix_cache:
+                cached = max((len(os.path.commonprefix([prompt, seen])) for seen in self.__recent_prompts), default=0)
+                self.__recent_prompts.append(prompt)
+            self.__stats["prompt_tokens"] += count_tokens(prompt)
+            self.__stats["cached_tokens"] += cached // CHARS_PER_TOKEN
+        return self.config.ttft + count_tokens(prompt[cached:]) / self.config.prefill_tokens_per_second
+
+    def decode_seconds(self, tokens: int) -> float:
+        with self.__lock:
+            self.__stats["completion_tokens"] += tokens
+        return tokens / self.config.decode_tokens_per_second
+
+    def disconnects(self) -> bool:
+        with self.__lock:
+            disconnect = self.__random.random() < self.config.disconnect_rate
+            self.__stats["disconnects"] += disconnect
+            return disconnect
+
+    def stats(self) -> dict[str, int]:
+        with self.__lock:
+            return dict(self.__stats)
+
+
+def count_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def split_tokens(text: str) -> list[str]:
+    return [text[i : i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+
+
+def make_handler(fake: FakeLLM) -> type[BaseHTTPRequestHandler]:
+    """The endpoints of an OpenAI-compatible llama.cpp server used by the reviewer.
+
+    GET  /v1/models
+    POST /v1/chat/completions  streamed or not, with usage
+    GET  /props                llama.cpp server properties with n_ctx
+    GET  /stats                requests, errors and tokens served so far
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):  # noqa:N802
+            path = urlparse(self.path).path.rstrip("/")
+            if path in ("/v1/models", "/models"):
+                model = {"id": fake.config.model, "object": "model", "created": 0, "owned_by": "fake-llm"}
+                self.__respond(200, {"object": "list", "data": [model]})
+            elif path == "/props":
+                self.__respond(200, {"default_generation_settings": {"n_ctx": fake.config.context_length}})
+            elif path == "/stats":
+                self.__respond(200, fake.stats())
+            elif path == "/health":
+                self.__respond(200, {"status": "ok"})
+            else:
+                self.__respond(404, _error("not found", "not_found_error", 404))
+
+        def do_POST(self):  # noqa:N802
+            if urlparse(self.path).path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+                self.__respond(404, _error("not found", "not_found_error", 404))
+                return
+
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                prompt = "\n".join(_content(message) for message in request["messages"])
+            except (ValueError, KeyError, TypeError) as e:
+                self.__respond(400, _error(f"invalid request: {e}", "invalid_request_error", 400))
+                return
+
+            rejected = fake.reject(count_tokens(prompt))
+            if rejected:
+                self.__respond(*rejected)
+                return
+
+            with fake.slots:
+                if request.get("stream"):
+                    self.__stream(request, prompt)
+                else:
+                    self.__complete(request, prompt)
+
+        def log_message(self, format, *args):  # noqa:A002
+            logging.debug(format % args)
+
+        def __complete(self, request: dict[str, Any], prompt: str) -> None:
+            answer = fake.answer(prompt)
+            fake.sleep(fake.prefill_seconds(prompt) + fake.decode_seconds(count_tokens(answer)))
+            message = {"role": "assistant", "content": answer}
+            self.__respond(
+                200,
+                {
+                    **_completion(request, "chat.completion"),
+                    "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+                    "usage": _usage(prompt, answer),
+                },
+            )
+
+        def __stream(self, request: dict[str, Any], prompt: str) -> None:
+            answer = fake.answer(prompt)
+            tokens = split_tokens(answer)
+            disconnect_at = len(tokens) // 2 if fake.disconnects() else None
+
+            fake.sleep(fake.prefill_seconds(prompt))
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            completion = _completion(request, "chat.completion.chunk")
+            self.__event({**completion, "choices": [{"index": 0, "delta": {"role": "assistant"}}]})
+            for i, token in enumerate(tokens):
+                if i == disconnect_at:
+                    # the connection is closed without the last chunk of the response
+                    self.close_connection = True
+                    return
+                fake.sleep(fake.decode_seconds(1))
+                self.__event({**completion, "choices": [{"index": 0, "delta": {"content": token}}]})
+
+            self.__event({**completion, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            if (request.get("stream_options") or {}).get("include_usage"):
+                self.__event({**completion, "choices": [], "usage": _usage(prompt, answer)})
+            self.__chunk(b"data: [DONE]\n\n")
+            self.__chunk(b"")
+
+        def __event(self, body: dict[str, Any]) -> None:
+            self.__chunk(f"data: {json.dumps(body, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        def __chunk(self, data: bytes) -> None:
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def __respond(self, status: int, body: Any) -> None:
+            payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return Handler
+
+
+def make_server(fake: FakeLLM) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((fake.config.host, fake.config.port), make_handler(fake))
+    server.daemon_threads = True
+    return server
+
+
+def load_answers(path: Optional[str]) -> list[tuple[str, str]]:
+    if not path:
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [(rule["match"], rule["answer"]) for rule in json.load(f)]
+
+
+def serve(config: FakeLLMConfiguration) -> None:
+    server = make_server(FakeLLM(config, load_answers(config.answers_path)))
+    host, port = server.server_address[:2]
+    # the address of a socket server may be bytes
+    host = host.decode() if isinstance(host, bytes) else host
+    logging.info(f"fake {config.model} listening on http://{host}:{port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def _content(message: dict[str, Any]) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content)
+    return content
+
+
+def _completion(request: dict[str, Any], kind: str) -> dict[str, Any]:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": kind,
+        "created": int(time.time()),
+        "model": request.get("model", ""),
+    }
+
+
+def _usage(prompt: str, answer: str) -> dict[str, int]:
+    prompt_tokens, completion_tokens = count_tokens(prompt), count_tokens(answer)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def _error(message: str, kind: str, code: int) -> dict[str, Any]:
+    return {"error": {"message": message, "type": kind, "code": code}}
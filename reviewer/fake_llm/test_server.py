@@ -0,0 +1,106 @@
+import json
+import threading
+import urllib.request
+
+import httpx
+import openai
+import pytest
+
+from reviewer.config.reviewer_config import FakeLLMConfiguration
+from reviewer.fake_llm.server import FakeLLM, make_server
+
+
+def _start(config: FakeLLMConfiguration, answers=None, sleep=lambda _: None):
+    fake = FakeLLM(config, answers, sleep=sleep)
+    server = make_server(fake)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    client = openai.OpenAI(api_key="1", base_url=f"{url}/v1", max_retries=0)
+    return fake, server, url, client
+
+
+@pytest.fixture
+def fake_server():
+    servers = []
+
+    def start(answers=None, sleep=lambda _: None, **kwargs):
+        started = _start(FakeLLMConfiguration(port=0, **kwargs), answers, sleep)
+        servers.append(started[1])
+        return started
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _chat(client: openai.OpenAI, prompt: str, **kwargs):
+    return client.chat.completions.create(model="m", messages=[{"role": "user", "content": prompt}], **kwargs)
+
+
+def test_models_and_props(fake_server):
+    _, _, url, client = fake_server(model="local-model", context_length=4096)
+
+    assert [model.id for model in client.models.list().data] == ["local-model"]
+    with urllib.request.urlopen(f"{url}/props") as response:  # noqa:S310
+        assert json.load(response)["default_generation_settings"]["n_ctx"] == 4096
+
+
+def test_canned_answers(fake_server):
+    answers = [(r"<FILE_NAME>\n(?P<name>\S+)\n.*<TASK>\nDo the review task", r"\g<name>: looks fine")]
+    _, _, _, client = fake_server(answers=answers)
+
+    review = "<FILE_NAME>\napp/main.py\n</FILE_NAME>\n<TASK>\nDo the review task for the changes in the diff.\n</TASK>"
+    assert _chat(client, review).choices[0].message.content == "app/main.py: looks fine"
+    assert _chat(client, "<TASK>\nDo the sanitize task for the file a.py.\n</TASK>").choices[0].message.content == ""
+    assert _chat(client, "<SRC_TEXT>\nno comments\n</SRC_TEXT>\nTranslate").choices[0].message.content == "no comments"
+    assert _chat(client, "anything else").choices[0].message.content == "no comments"
+
+
+def test_streaming_paces_prefill_and_decode(fake_server):
+    slept = []
+    fake, _, _, client = fake_server(
+        answers=[("review", "twelve chars")],
+        sleep=slept.append,
+        ttft=0.5,
+        prefill_tokens_per_second=100,
+        decode_tokens_per_second=10,
+    )
+
+    chunks = list(_chat(client, "review" * 100, stream=True, stream_options={"include_usage": True}))
+
+    assert "".join(c.choices[0].delta.content or "" for c in chunks if c.choices) == "twelve chars"
+    assert chunks[-1].usage.prompt_tokens == 150
+    assert chunks[-1].usage.completion_tokens == 3
+    assert slept == [pytest.approx(0.5 + 150 / 100), 0.1, 0.1, 0.1]
+    assert fake.stats()["completion_tokens"] == 3
+
+
+def test_prefix_cache_skips_shared_prefill(fake_server):
+    slept = []
+    fake, _, _, client = fake_server(sleep=slept.append, ttft=0, prefill_tokens_per_second=1, prefix_cache=True)
+
+    _chat(client, "a" * 400 + "first")
+    _chat(client, "a" * 400 + "second")
+
+    assert slept[1] < slept[0] / 10
+    assert fake.stats()["cached_tokens"] == 100
+
+
+def test_errors(fake_server):
+    _, _, _, client = fake_server(context_length=10)
+    with pytest.raises(openai.BadRequestError, match="exceeds the available context size"):
+        _chat(client, "x" * 100)
+
+    _, _, _, client = fake_server(error_rate=1.0, error_status=503)
+    with pytest.raises(openai.InternalServerError):
+        _chat(client, "review")
+
+
+def test_disconnect_cuts_the_stream(fake_server):
+    fake, _, _, client = fake_server(answers=[("review", "a long answer that is cut off")], disconnect_rate=1.0)
+
+    # the openai client passes errors of a broken stream on as they are
+    with pytest.raises(httpx.RemoteProtocolError):
+        list(_chat(client, "review", stream=True))
+    assert fake.stats()["disconnects"] == 1
@@ -0,0 +1,388 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import AbstractAsyncContextManager, nullcontext
+from typing import Awaitable, Callable, Coroutine, Optional, Sequence, TypeVar
+
+import httpx
+from openai import DEFAULT_MAX_RETRIES, AsyncOpenAI
+
+from reviewer.config.reviewer_config import (
+    FALLBACK_MODEL_API_KEY,
+    FALLBACK_MODEL_BASE_URL,
+    FALLBACK_MODEL_NAME,
+    MODEL_API_KEY,
+    MODEL_BASE_URL,
+    MODEL_NAME,
+    Configuration,
+    InferenceProvider,
+)
+from reviewer.llm.call_bookkeeping import CallBookkeeping
+from reviewer.llm.call_metrics import CallMetricsRecorder, CallSource
+from reviewer.llm.endpoint_pool import EndpointPool
+from reviewer.llm.hedging import Hedger
+from reviewer.llm.http_client import make_async_http_client
+from reviewer.llm.llm import FallbackSplit, clean_response
+from reviewer.llm.prompt_logger import PromptLogger
+from reviewer.llm.resilience import CircuitBreaker, EmissionTracker, PrimaryGuard
+from reviewer.llm.response_cache import ResponseCache
+from reviewer.llm.streaming import CompletionStream, TextSink
+
+T = TypeVar("T")
+
+
+class AsyncLLM:
+    """asyncio counterpart of `LLM` for requests that run concurrently.
+
+    Every endpoint has its own limit of requests in flight (--llm_concurrency for
+    the big model, --fallback_concurrency for llama.cpp). The clients live on one
+    event loop in a background thread, so their connection pools survive between
+    calls and synchronous code submits work with `run`.
+    """
+
+    def __init__(
+        self,
+        configuration: Configuration,
+        prompt_logger: Optional[PromptLogger] = None,
+        response_cache: Optional[ResponseCache] = None,
+        call_metrics: Optional[CallMetricsRecorder] = None,
+        primary_guard: Optional[PrimaryGuard] = None,
+        hedger: Optional[Hedger] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+        fallback_pool: Optional[EndpointPool] = None,
+    ):
+        self.__config = configuration
+        self.__prompt_logger = prompt_logger or PromptLogger()
+        self.__primary_guard = primary_guard or PrimaryGuard(
+            configuration,
+            CircuitBreaker(configuration.primary_failure_threshold, configuration.primary_cooldown),
+        )
+        self.__hedger = hedger
+
+        http_client = http_client or make_async_http_client(configuration)
+        self.__model = AsyncOpenAI(
+            api_key=MODEL_API_KEY, base_url=MODEL_BASE_URL, max_retries=0, http_client=http_client
+        )
+        self.__fallback_pool = fallback_pool or EndpointPool(
+            configuration.fallback_urls, configuration.fallback_health_interval
+        )
+        self.__calls = CallBookkeeping(call_metrics or CallMetricsRecorder(), self.__fallback_pool, response_cache)
+        # with several servers a failed request is retried on another one
+        fallback_retries = DEFAULT_MAX_RETRIES if len(self.__fallback_pool.urls) == 1 else 0
+        self.__fallback_models = {
+            url: AsyncOpenAI(
+                api_key=FALLBACK_MODEL_API_KEY, base_url=url, max_retries=fallback_retries, http_client=http_client
+            )
+            for url in self.__fallback_pool.urls
+        }
+        self.__model_limit = asyncio.Semaphore(configuration.llm_concurrency)
+        # --fallback_concurrency requests in flight to each server of the pool
+        self.__fallback_limit = asyncio.Semaphore(configuration.fallback_concurrency * len(self.__fallback_models))
+
+        self.__loop = asyncio.new_event_loop()
+        self.__thread = threading.Thread(target=self.__loop.run_forever, name="async-llm", daemon=True)
+        self.__thread.start()
+
+    async def generate(
+        self, name: str, prompt: str, on_text: Optional[TextSink] = None, split: Optional[FallbackSplit] = None
+    ) -> str:
+        if self.__config.inference_provider == InferenceProvider.LlamaCpp:
+            result = await self.__generate_llama(prompt, name, on_text)
+        elif self.__hedger:
+            result = await self.__generate_hedged(prompt, name, on_text, self.__hedger, split)
+        else:
+            result = await self.__generate_with_fallback_llama(prompt, name, on_text, split)
+        self.__prompt_logger.log_prompt(name, prompt, result)
+        return result
+
+    def run(self, coroutine: Coroutine[None, None, T]) -> T:
+        """Runs a coroutine on the client loop and waits for its result."""
+        future: Future[T] = asyncio.run_coroutine_threadsafe(coroutine, self.__loop)
+        return future.result()
+
+    def close(self) -> None:
+        if self.__loop.is_closed():
+            return
+        self.run(self.__close_clients())
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join()
+        self.__loop.close()
+
+    async def __close_clients(self) -> None:
+        await self.__model.close()
+        for fallback_model in self.__fallback_models.values():
+            await fallback_model.close()
+
+    async def __generate(
+        self,
+        prompt: str,
+        name: str,
+        on_text: Optional[TextSink],
+        on_first_token: Optional[Callable[[], None]] = None,
+    ) -> str:
+        return await self.__cached(
+            MODEL_BASE_URL,
+            MODEL_NAME,
+            name,
+            prompt,
+            on_text,
+            lambda: self.__request(
+                self.__model,
+                self.__model_limit,
+                MODEL_BASE_URL,
+                MODEL_NAME,
+                CallSource.Primary,
+                name,
+                prompt,
+                on_text,
+                on_first_token,
+            ),
+        )
+
+    async def __generate_llama(self, prompt: str, name: str, on_text: Optional[TextSink]) -> str:
+        return await self.__cached(
+            FALLBACK_MODEL_BASE_URL,
+            FALLBACK_MODEL_NAME,
+            name,
+            prompt,
+            on_text,
+            lambda: self.__request_pool(name, prompt, on_text),
+        )
+
+    async def __generate_llama_split(
+        self, prompt: str, name: str, on_text: Optional[TextSink], split: Optional[FallbackSplit]
+    ) -> str:
+        """The answer of llama.cpp; to a prompt too large for it, the answers to its parts one after another."""
+        if not split:
+            return await self.__generate_llama(prompt, name, on_text)
+
+        answers: list[str] = []
+        for part_name, part_prompt in split():
+            if answers and on_text:
+                on_text("\n")
+            answers.append(await self.__generate_llama(part_prompt, part_name, on_text))
+        return "\n".join(answers)
+
+    async def __request_pool(self, name: str, prompt: str, on_text: Optional[TextSink]) -> str:
+        """Sends the request to the least loaded llama.cpp server, and to the next one when the server fails."""
+        tracker = EmissionTracker(on_text)
+        tried: set[str] = set()
+        error: Optional[Exception] = None
+        # the server is chosen once the request has a slot, so it sees the requests that are really in flight
+        async with self.__fallback_limit:
+            while (url := self.__fallback_pool.acquire(tried)) is not None:
+                tried.add(url)
+                try:
+                    result = await self.__request(
+                        self.__fallback_models[url],
+                        nullcontext(),
+                        url,
+                        FALLBACK_MODEL_NAME,
+                        CallSource.Fallback,
+                        name,
+                        prompt,
+                        tracker.sink,
+                    )
+                except Exception as e:
+                    if not self.__calls.release_failed(url, e, tracker.emitted):
+                        raise
+                    error = e
+                    continue
+                except asyncio.CancelledError:
+                    self.__fallback_pool.release(url)
+                    raise
+                self.__fallback_pool.release(url)
+                return result
+        raise error or RuntimeError("no llama.cpp server to send the request to")
+
+    async def __cached(
+        self,
+        endpoint: str,
+        model: str,
+        name: str,
+        prompt: str,
+        on_text: Optional[TextSink],
+        request: Callable[[], Awaitable[str]],
+    ) -> str:
+        cached = self.__calls.cached(endpoint, model, name, prompt, on_text)
+        if cached is not None:
+            return cached
+
+        result = await request()
+        self.__calls.store(endpoint, model, name, prompt, result)
+        return result
+
+    async def __request(
+        self,
+        client: AsyncOpenAI,
+        limit: AbstractAsyncContextManager,
+        endpoint: str,
+        model: str,
+        source: str,
+        name: str,
+        prompt: str,
+        on_text: Optional[TextSink],
+        on_first_token: Optional[Callable[[], None]] = None,
+    ) -> str:
+        async with limit:
+            started = time.perf_counter()
+            stream = CompletionStream(on_text, on_first_token) if self.__config.stream else None
+            try:
+                if stream:
+                    async for chunk in await client.chat.completions.create(
+                        model=model,
+                        messages=[
+                            {"role": "user", "content": prompt},
+                        ],
+                        stream=True,
+                        stream_options={"include_usage": True},
+                    ):
+                        stream.add(chunk)
+                    result = stream.finish()
+                    self.__calls.record(stream.metrics(name, model, endpoint, source))
+                    return result
+
+                response = await client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "user", "content": prompt},
+                    ],
+                )
+            except asyncio.CancelledError:
+                # a timed out attempt or the loser of a hedged call
+                self.__calls.record_failed(name, model, endpoint, started, stream, CallSource.Cancelled)
+                raise
+            except Exception:
+                self.__calls.record_failed(name, model, endpoint, started, stream)
+                raise
+        if on_first_token:
+            on_first_token()
+        result = clean_response(self.__calls.record_response(response, name, model, endpoint, source, started))
+        if on_text and result:
+            on_text(result)
+        return result
+
+    async def __generate_with_fallback_llama(
+        self, prompt: str, name: str, on_text: Optional[TextSink], split: Optional[FallbackSplit]
+    ) -> str:
+        tracker = EmissionTracker(on_text)
+        result = await self.__generate_primary(prompt, name, tracker)
+        if result is not None:
+            return result
+        return tracker.fall_back() + await self.__generate_llama_split(prompt, name, on_text, split)
+
+    async def __generate_primary(
+        self,
+        prompt: str,
+        name: str,
+        tracker: EmissionTracker,
+        on_first_token: Optional[Callable[[], None]] = None,
+    ) -> Optional[str]:
+        """The answer of the big model, or None when the local model has to answer instead."""
+        guard = self.__primary_guard
+        for delay in guard.attempts():
+            try:
+                await asyncio.sleep(delay)
+                result = await asyncio.wait_for(
+                    self.__generate(prompt, name, tracker.sink, on_first_token), guard.call_timeout()
+                )
+            except asyncio.CancelledError:
+                guard.breaker.record_abandoned()
+                raise
+            except Exception as e:
+                if guard.failed(e, tracker.emitted):
+                    continue
+                break
+            guard.breaker.record_success()
+            return result
+        return None
+
+    async def __generate_hedged(
+        self, prompt: str, name: str, on_text: Optional[TextSink], hedger: Hedger, split: Optional[FallbackSplit]
+    ) -> str:
+        """Sends the prompt to the local model too when the big model is slow to start; the first answer wins.
+
+        The big model streams to on_text until the call is hedged. After that both
+        answers are held back and only the winner's answer is passed on.
+        """
+        started = time.perf_counter()
+        first_token = asyncio.Event()
+        first_token_at = 0.0
+        hedged = False
+
+        def on_primary_first_token() -> None:
+            nonlocal first_token_at
+            first_token_at = time.perf_counter()
+            hedger.observe_first_token(first_token_at - started)
+            first_token.set()
+
+        def on_primary_text(text: str) -> None:
+            if not hedged and on_text:
+                on_text(text)
+
+        tracker = EmissionTracker(on_primary_text if on_text else None)
+        primary = asyncio.ensure_future(self.__generate_primary(prompt, name, tracker, on_primary_first_token))
+        waiter = asyncio.ensure_future(first_token.wait())
+        try:
+            await asyncio.wait({primary, waiter}, timeout=hedger.delay(), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiter.cancel()
+
+        if primary.done() or first_token.is_set():
+            result = await primary
+            if result is not None and first_token.is_set() and self.__config.stream:
+                hedger.observe_decode(time.perf_counter() - first_token_at)
+            hedger.record(hedged=False)
+            if result is not None:
+                return result
+            return tracker.fall_back() + await self.__generate_llama_split(prompt, name, on_text, split)
+
+        hedged = True
+        logging.info(f"{name}: no first token from the big model in {hedger.delay():.2f}s, hedging")
+        secondary = asyncio.ensure_future(self.__generate_llama_split(prompt, name, None, split))
+        try:
+            result, winner = await self.__first_answer(primary, secondary)
+        finally:
+            primary.cancel()
+            secondary.cancel()
+
+        if winner is primary:
+            hedger.record(hedged=True)
+        else:
+            decoded = time.perf_counter() - first_token_at if first_token.is_set() else 0.0
+            saved = hedger.remaining_decode(decoded) if self.__config.stream else 0.0
+            if not first_token.is_set():
+                # the big model is still slower than this, which keeps the hedge delay honest
+                hedger.observe_first_token(time.perf_counter() - started)
+            hedger.record(hedged=True, hedge_won=True, saved=saved)
+
+        if on_text and result:
+            on_text(result)
+        return result
+
+    @staticmethod
+    async def __first_answer(primary: asyncio.Future, secondary: asyncio.Future) -> tuple[str, asyncio.Future]:
+        """The first answer of the two and the future that gave it; the big model has no answer when it gives None."""
+        pending = {primary, secondary}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                if future.exception():
+                    error = future.exception()
+                elif future.result() is not None:
+                    return future.result(), future
+        raise error or RuntimeError("no model answered")
+
+
+async def gather_limited(limit: int, awaitables: Sequence[Awaitable[T]]) -> list[T]:
+    """Awaits at most limit awaitables at a time; results keep the order of awaitables."""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def bounded(awaitable: Awaitable[T]) -> T:
+        async with semaphore:
+            return await awaitable
+
+    return await asyncio.gather(*(bounded(awaitable) for awaitable in awaitables))
@@ -0,0 +1,113 @@
+import logging
+import time
+from dataclasses import replace
+from typing import Any, Optional
+
+from reviewer.llm.call_metrics import CallMetrics, CallMetricsRecorder, CallSource, reasoning_tokens
+from reviewer.llm.endpoint_pool import EndpointPool
+from reviewer.llm.resilience import is_transient
+from reviewer.llm.response_cache import ResponseCache, stage_of
+from reviewer.llm.streaming import CompletionStream, TextSink
+
+
+class CallBookkeeping:
+    """What `LLM` and `AsyncLLM` do around a request: the response cache, usage, metrics and llama.cpp server load."""
+
+    def __init__(
+        self,
+        call_metrics: CallMetricsRecorder,
+        fallback_pool: EndpointPool,
+        response_cache: Optional[ResponseCache] = None,
+    ):
+        self.__call_metrics = call_metrics
+        self.__fallback_pool = fallback_pool
+        self.__response_cache = response_cache
+
+    def cached(self, endpoint: str, model: str, name: str, prompt: str, on_text: Optional[TextSink]) -> Optional[str]:
+        """The cached answer to the prompt, also passed to on_text; None when it has to be requested."""
+        if not self.__response_cache:
+            return None
+
+        started = time.perf_counter()
+        stage = stage_of(name)
+        cached = self.__response_cache.get(ResponseCache.key(endpoint, model, stage, prompt), stage)
+        if cached is None:
+            return None
+
+        self.__call_metrics.record(
+            CallMetrics(
+                name=name,
+                model=model,
+                streamed=False,
+                elapsed=time.perf_counter() - started,
+                endpoint=endpoint,
+                source=CallSource.Cache,
+            )
+        )
+        if on_text and cached:
+            on_text(cached)
+        return cached
+
+    def store(self, endpoint: str, model: str, name: str, prompt: str, result: str) -> None:
+        if self.__response_cache:
+            stage = stage_of(name)
+            self.__response_cache.put(ResponseCache.key(endpoint, model, stage, prompt), stage, result)
+
+    def record(self, metrics: CallMetrics) -> None:
+        self.__call_metrics.record(metrics)
+        if metrics.source == CallSource.Fallback:
+            self.__fallback_pool.observe(metrics)
+
+    def record_response(self, response: Any, name: str, model: str, endpoint: str, source: str, started: float) -> str:
+        """Logs and records the usage of a completion that was not streamed; returns its raw content."""
+        usage = response.usage
+        if usage:
+            logging.info(
+                f"prompt_eval_count:{usage.prompt_tokens} "
+                f"total_tokens:{usage.total_tokens} "
+                f"eval:{usage.total_tokens - usage.prompt_tokens}"
+            )
+        else:
+            logging.warning(f"Usage data not available in response from {model}.")
+        self.record(
+            CallMetrics(
+                name=name,
+                model=model,
+                streamed=False,
+                elapsed=time.perf_counter() - started,
+                prompt_tokens=usage.prompt_tokens if usage else None,
+                completion_tokens=usage.completion_tokens if usage else None,
+                reasoning_tokens=reasoning_tokens(usage),
+                endpoint=endpoint,
+                source=source,
+            )
+        )
+        # a message without content, e.g. a refusal, is an empty answer
+        return response.choices[0].message.content or ""
+
+    def record_failed(
+        self,
+        name: str,
+        model: str,
+        endpoint: str,
+        started: float,
+        stream: Optional[CompletionStream],
+        source: str = CallSource.Error,
+    ) -> None:
+        """Records a request that failed or was cancelled: its seconds and the tokens streamed until then."""
+        elapsed = time.perf_counter() - started
+        if stream:
+            # no timings of the first token, so the medians describe only answered calls
+            metrics = replace(
+                stream.metrics(name, model, endpoint, source), elapsed=elapsed, ttft=None, decode_time=None
+            )
+        else:
+            metrics = CallMetrics(
+                name=name, model=model, streamed=False, elapsed=elapsed, endpoint=endpoint, source=source
+            )
+        self.__call_metrics.record(metrics)
+
+    def release_failed(self, url: str, error: Exception, emitted: bool) -> bool:
+        """Releases a llama.cpp server whose request failed; True when the next server can take the request."""
+        self.__fallback_pool.release(url, failed=is_transient(error))
+        return not emitted and is_transient(error)
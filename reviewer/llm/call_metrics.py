@@ -0,0 +1,148 @@
+import json
+import logging
+import statistics
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+
+class CallSource:
+    Primary = "primary"
+    Fallback = "fallback"
+    Cache = "cache"
+    # a request that failed, and one abandoned by a timeout or a lost hedge race
+    Error = "error"
+    Cancelled = "cancelled"
+
+
+@dataclass
+class CallMetrics:
+    name: str
+    model: str
+    streamed: bool
+    elapsed: float
+    # time to the first token; without streaming only the whole call is measured
+    ttft: Optional[float] = None
+    decode_time: Optional[float] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    reasoning_tokens: Optional[int] = None
+    endpoint: str = ""
+    source: str = CallSource.Primary
+
+    @property
+    def stage(self) -> str:
+        """`review: pkg/file.go` -> `review`."""
+        return self.name.split(":", 1)[0].strip()
+
+    @property
+    def target(self) -> str:
+        """The file or group of the call: `review: pkg/file.go` -> `pkg/file.go`."""
+        return self.name.split(":", 1)[1].strip() if ":" in self.name else ""
+
+    @property
+    def targets(self) -> list[str]:
+        """The files of a call for several of them: `sanitize: a.go, b.go` -> `["a.go", "b.go"]`."""
+        return [target.strip() for target in self.target.split(",")] if self.target else []
+
+    @property
+    def decode_tokens_per_second(self) -> Optional[float]:
+        if not self.completion_tokens or not self.decode_time:
+            return None
+        return self.completion_tokens / self.decode_time
+
+
+class CallMetricsRecorder:
+    """Keeps the timings of every LLM call of a run, shared by the sync and the async client."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__calls: list[CallMetrics] = []
+
+    def record(self, metrics: CallMetrics) -> None:
+        with self.__lock:
+            self.__calls.append(metrics)
+
+        model = {
+            CallSource.Cache: f"{metrics.model}, cached",
+            CallSource.Error: f"{metrics.model}, failed",
+            CallSource.Cancelled: f"{metrics.model}, cancelled",
+        }.get(metrics.source, metrics.model)
+        parts = [f"{metrics.name} ({model}): {metrics.elapsed:.2f}s"]
+        if metrics.ttft is not None:
+            parts.append(f"ttft {metrics.ttft:.2f}s")
+        if metrics.decode_tokens_per_second is not None:
+            parts.append(f"decode {metrics.decode_tokens_per_second:.1f} tok/s")
+        logging.info(", ".join(parts))
+
+    def calls(self) -> list[CallMetrics]:
+        with self.__lock:
+            return list(self.__calls)
+
+    def log_summary(self) -> None:
+        calls = self.calls()
+        if not calls:
+            return
+
+        ttfts = [c.ttft for c in calls if c.ttft is not None]
+        rates = [rate for c in calls if (rate := c.decode_tokens_per_second) is not None]
+        summary = [f"llm calls: {len(calls)}, total {sum(c.elapsed for c in calls):.2f}s"]
+        if ttfts:
+            summary.append(f"median ttft {statistics.median(ttfts):.2f}s")
+        if rates:
+            summary.append(f"median decode {statistics.median(rates):.1f} tok/s")
+        logging.info(", ".join(summary))
+
+    def usage_summary(self) -> dict[str, Any]:
+        """Tokens and seconds of the run in total and by stage, source, endpoint and file or group.
+
+        A call for several files counts for each of them with an equal share of its tokens and seconds.
+        """
+        calls = self.calls()
+        by_stage: dict[str, list[CallMetrics]] = defaultdict(list)
+        by_source: dict[str, list[CallMetrics]] = defaultdict(list)
+        by_endpoint: dict[str, list[CallMetrics]] = defaultdict(list)
+        by_target: dict[str, list[CallMetrics]] = defaultdict(list)
+        for call in calls:
+            by_stage[call.stage].append(call)
+            by_source[call.source].append(call)
+            if call.source != CallSource.Cache:
+                by_endpoint[call.endpoint].append(call)
+            for target in call.targets or [""]:
+                by_target[f"{call.stage}: {target}" if target else call.stage].append(call)
+
+        return {
+            "total": _usage(calls),
+            "by_stage": {key: _usage(group) for key, group in by_stage.items()},
+            "by_source": {key: _usage(group) for key, group in by_source.items()},
+            "by_endpoint": {key: _usage(group) for key, group in by_endpoint.items()},
+            "by_target": {key: _usage(group, split=True) for key, group in by_target.items()},
+        }
+
+    def log_usage(self) -> None:
+        if self.calls():
+            logging.info(f"llm usage: {json.dumps(self.usage_summary())}")
+
+    def write_usage(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.usage_summary(), f, indent=2)
+
+
+def reasoning_tokens(usage: Any) -> Optional[int]:
+    """Reasoning tokens of an OpenAI usage object, when the server reports them."""
+    details = getattr(usage, "completion_tokens_details", None)
+    return getattr(details, "reasoning_tokens", None) if details else None
+
+
+def _usage(calls: list[CallMetrics], split: bool = False) -> dict[str, Any]:
+    def share(call: CallMetrics) -> float:
+        return 1 / len(call.targets) if split and call.targets else 1.0
+
+    return {
+        "calls": len(calls),
+        "prompt_tokens": round(sum((c.prompt_tokens or 0) * share(c) for c in calls)),
+        "completion_tokens": round(sum((c.completion_tokens or 0) * share(c) for c in calls)),
+        "reasoning_tokens": round(sum((c.reasoning_tokens or 0) * share(c) for c in calls)),
+        "seconds": round(sum(c.elapsed * share(c) for c in calls), 3),
+    }
@@ -0,0 +1,23 @@
+import threading
+
+import pytest
+
+from reviewer.config.reviewer_config import FakeLLMConfiguration
+from reviewer.fake_llm.server import FakeLLM, make_server
+
+
+@pytest.fixture
+def servers():
+    """Starts fake llama.cpp servers, without delays unless a sleep is given; returns the base URL of each one."""
+    started = []
+
+    def start(answers=None, sleep=lambda _: None, **kwargs) -> str:
+        server = make_server(FakeLLM(FakeLLMConfiguration(port=0, **kwargs), answers, sleep))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        started.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    yield start
+    for server in started:
+        server.shutdown()
+        server.server_close()
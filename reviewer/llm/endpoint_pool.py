@@ -0,0 +1,132 @@
+import logging
+import threading
+import time
+from typing import Callable, Collection, Optional
+
+import httpx
+
+from reviewer.llm.call_metrics import CallMetrics
+
+# weight of the latest measurement in the decode rate of an endpoint
+RATE_SMOOTHING = 0.3
+
+
+class PoolEndpoint:
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.healthy = True
+        self.tokens_per_second: Optional[float] = None
+        self.requests = 0
+        self.failures = 0
+
+
+class EndpointPool:
+    """Spreads the calls of the local model over several llama.cpp servers of the same model.
+
+    A call goes to the healthy endpoint with the fewest outstanding requests per
+    measured token/s, so a faster box gets proportionally more of them. An endpoint
+    that fails leaves the rotation until its /health check passes again; the
+    caller retries the request on another endpoint.
+    """
+
+    def __init__(
+        self,
+        urls: list[str],
+        health_interval: float = 15.0,
+        check: Optional[Callable[[str], bool]] = None,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        if not urls:
+            raise ValueError("the endpoint pool needs at least one url")
+        self.__endpoints = {url: PoolEndpoint(url) for url in dict.fromkeys(urls)}
+        self.__health_interval = health_interval
+        self.__check = check or check_health
+        self.__sleep = sleep
+        self.__lock = threading.Lock()
+
+    @property
+    def urls(self) -> list[str]:
+        return list(self.__endpoints)
+
+    def acquire(self, exclude: Collection[str] = ()) -> Optional[str]:
+        """The endpoint for the next request, None when every endpoint is excluded.
+
+        Unhealthy endpoints are only used when no healthy one is left.
+        """
+        with self.__lock:
+            candidates = [e for e in self.__endpoints.values() if e.url not in exclude]
+            candidates = [e for e in candidates if e.healthy] or candidates
+            if not candidates:
+                return None
+            endpoint = min(candidates, key=self.__load)
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint.url
+
+    def release(self, url: str, failed: bool = False) -> None:
+        with self.__lock:
+            endpoint = self.__endpoints[url]
+            endpoint.outstanding -= 1
+            if not failed:
+                return
+            endpoint.failures += 1
+            if not endpoint.healthy:
+                return
+            endpoint.healthy = False
+
+        logging.warning(f"llama.cpp endpoint {url} failed, it is skipped until its health check passes")
+        threading.Thread(target=self.__recover, args=(url,), name="pool-health", daemon=True).start()
+
+    def observe(self, metrics: CallMetrics) -> None:
+        """Updates the decode rate of the endpoint of a finished call."""
+        rate = metrics.decode_tokens_per_second
+        if rate is None and metrics.completion_tokens and metrics.elapsed > 0:
+            rate = metrics.completion_tokens / metrics.elapsed
+        if not rate:
+            return
+        with self.__lock:
+            endpoint = self.__endpoints.get(metrics.endpoint)
+            if endpoint:
+                previous = endpoint.tokens_per_second
+                endpoint.tokens_per_second = rate if previous is None else previous + RATE_SMOOTHING * (rate - previous)
+
+    def stats(self) -> dict[str, dict[str, object]]:
+        with self.__lock:
+            return {
+                e.url: {
+                    "healthy": e.healthy,
+                    "requests": e.requests,
+                    "failures": e.failures,
+                    "tokens_per_second": round(e.tokens_per_second, 1) if e.tokens_per_second else None,
+                }
+                for e in self.__endpoints.values()
+            }
+
+    def log_stats(self) -> None:
+        if len(self.__endpoints) > 1:
+            logging.info(f"llama.cpp endpoints: {self.stats()}")
+
+    def __load(self, endpoint: PoolEndpoint) -> float:
+        # an endpoint without measurements counts as fast as the average of the measured ones
+        rates = [e.tokens_per_second for e in self.__endpoints.values() if e.tokens_per_second]
+        rate = endpoint.tokens_per_second or (sum(rates) / len(rates) if rates else 1.0)
+        return (endpoint.outstanding + 1) / rate
+
+    def __recover(self, url: str) -> None:
+        while True:
+            self.__sleep(self.__health_interval)
+            if self.__check(url):
+                break
+        with self.__lock:
+            self.__endpoints[url].healthy = True
+        logging.info(f"llama.cpp endpoint {url} is healthy again")
+
+
+def check_health(url: str) -> bool:
+    """GET /health of a llama.cpp server, which sits next to /v1."""
+    try:
+        response = httpx.get(url.rstrip("/").removesuffix("/v1") + "/health", timeout=5.0)
+    except httpx.HTTPError:
+        return False
+    return response.status_code == 200
@@ -0,0 +1,62 @@
+import logging
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import httpx
+from openai import OpenAI
+
+
+@dataclass
+class EndpointInfo:
+    model: Optional[str] = None
+    # tokens of one request: the slot size of llama.cpp or the max_model_len of vLLM
+    context_length: Optional[int] = None
+
+
+class EndpointProbe:
+    """Asks an endpoint for its model and context length in a background thread.
+
+    The probe overlaps with git and tokenizer work instead of delaying the start,
+    and leaves a warm connection in the pool of the client for the first call.
+    """
+
+    def __init__(self, client: OpenAI, label: str):
+        self.__client = client
+        self.__label = label
+        self.__info: Future[EndpointInfo] = Future()
+        threading.Thread(target=self.__probe, name=f"probe-{label}", daemon=True).start()
+
+    def model(self, timeout: Optional[float] = None) -> Optional[str]:
+        """The model served by the endpoint, None when the endpoint did not tell or is not reachable."""
+        return self.__info.result(timeout).model
+
+    def context_length(self, timeout: Optional[float] = None) -> Optional[int]:
+        return self.__info.result(timeout).context_length
+
+    def __probe(self) -> None:
+        info = EndpointInfo()
+        try:
+            models_data = self.__client.models.list().data
+            if models_data:
+                info.model = models_data[0].id
+                info.context_length = (models_data[0].model_extra or {}).get("max_model_len")
+                logging.info(f"{self.__label} model: {info.model}")
+            else:
+                logging.warning(f"{self.__label} model list is empty.")
+            info.context_length = self.__llama_context_length() or info.context_length
+        except Exception as e:
+            logging.error(f"Failed to retrieve {self.__label} model list: {e}")
+        finally:
+            self.__info.set_result(info)
+
+    def __llama_context_length(self) -> Optional[int]:
+        """n_ctx of a llama.cpp slot from /props, which sits next to /v1 on the server."""
+        url = str(self.__client.base_url).rstrip("/").removesuffix("/v1") + "/props"
+        try:
+            props: dict[str, Any] = self.__client.get(url, cast_to=httpx.Response).json()
+        except Exception as e:
+            logging.debug(f"{self.__label} has no llama.cpp properties: {e}")
+            return None
+        return (props.get("default_generation_settings") or {}).get("n_ctx") or props.get("n_ctx")
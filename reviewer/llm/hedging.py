@@ -0,0 +1,92 @@
+import logging
+import statistics
+import threading
+from collections import deque
+
+
+class LatencyPercentile:
+    """A percentile of the latest latency samples; a fixed value is used until there are enough of them."""
+
+    def __init__(self, percentile: float, initial: float, window: int = 100, min_samples: int = 10):
+        self.__percentile = percentile
+        self.__initial = initial
+        self.__min_samples = min_samples
+        self.__samples: deque[float] = deque(maxlen=window)
+        self.__lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self.__lock:
+            self.__samples.append(seconds)
+
+    def value(self) -> float:
+        with self.__lock:
+            if len(self.__samples) < self.__min_samples:
+                return self.__initial
+            ordered = sorted(self.__samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.__percentile / 100))]
+
+
+class Hedger:
+    """Decides when a call to the big model is hedged with the local model and keeps the outcome.
+
+    A call is hedged when the big model has not produced its first token within
+    the given percentile of its recent first-token latencies. The latency saved by
+    a hedge that wins is estimated as the time the big model would still have
+    needed to decode its answer: its median decode time, less what it had decoded.
+    """
+
+    def __init__(self, percentile: float, initial_delay: float):
+        self.__first_token = LatencyPercentile(percentile, initial_delay)
+        self.__decode_times: deque[float] = deque(maxlen=100)
+        self.__lock = threading.Lock()
+        self.__calls = 0
+        self.__hedged = 0
+        self.__hedge_wins = 0
+        self.__saved = 0.0
+
+    def delay(self) -> float:
+        """Seconds to wait for the first token of the big model before the call is hedged."""
+        return self.__first_token.value()
+
+    def observe_first_token(self, seconds: float) -> None:
+        self.__first_token.observe(seconds)
+
+    def observe_decode(self, seconds: float) -> None:
+        with self.__lock:
+            self.__decode_times.append(seconds)
+
+    def remaining_decode(self, decoded: float = 0.0) -> float:
+        """Estimated seconds the big model still needs after decoding for `decoded` seconds."""
+        with self.__lock:
+            if not self.__decode_times:
+                return 0.0
+            median = statistics.median(self.__decode_times)
+        return max(median - decoded, 0.0)
+
+    def record(self, hedged: bool, hedge_won: bool = False, saved: float = 0.0) -> None:
+        with self.__lock:
+            self.__calls += 1
+            self.__hedged += hedged
+            self.__hedge_wins += hedge_won
+            self.__saved += saved
+
+    def stats(self) -> dict[str, object]:
+        with self.__lock:
+            return {
+                "calls": self.__calls,
+                "hedged": self.__hedged,
+                "hedge_rate": self.__hedged / self.__calls if self.__calls else 0.0,
+                "hedge_wins": self.__hedge_wins,
+                "saved_seconds": self.__saved,
+            }
+
+    def log_stats(self) -> None:
+        stats = self.stats()
+        if not stats["calls"]:
+            return
+        logging.info(
+            f"hedged calls: {stats['hedged']}/{stats['calls']} ({stats['hedge_rate']:.0%}), "
+            f"won by the local model: {stats['hedge_wins']}, "
+            f"latency saved: ~{stats['saved_seconds']:.1f}s, "
+            f"hedge delay: {self.delay():.2f}s"
+        )
@@ -0,0 +1,37 @@
+import importlib.util
+
+import httpx
+from openai import DefaultAsyncHttpxClient, DefaultHttpxClient
+
+from reviewer.config.reviewer_config import Configuration
+
+# HTTP/2 needs the optional h2 package (pip install httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+# connections kept open between the calls of a run, and the probes and translation on top of the reviews
+KEEPALIVE_EXPIRY = 120.0
+EXTRA_CONNECTIONS = 2
+
+
+def make_http_client(config: Configuration) -> httpx.Client:
+    """One connection pool for the big model and the llama.cpp clients, so calls reuse warm connections."""
+    return DefaultHttpxClient(limits=http_limits(config), timeout=http_timeout(config), http2=use_http2(config))
+
+
+def make_async_http_client(config: Configuration) -> httpx.AsyncClient:
+    return DefaultAsyncHttpxClient(limits=http_limits(config), timeout=http_timeout(config), http2=use_http2(config))
+
+
+def http_limits(config: Configuration) -> httpx.Limits:
+    connections = config.llm_concurrency + config.fallback_concurrency * len(config.fallback_urls) + EXTRA_CONNECTIONS
+    return httpx.Limits(
+        max_connections=connections, max_keepalive_connections=connections, keepalive_expiry=KEEPALIVE_EXPIRY
+    )
+
+
+def http_timeout(config: Configuration) -> httpx.Timeout:
+    # a dead endpoint fails fast on connect, a slow answer may take up to the call timeout
+    return httpx.Timeout(config.primary_call_timeout, connect=config.http_connect_timeout)
+
+
+def use_http2(config: Configuration) -> bool:
+    return config.http2 and HTTP2_AVAILABLE
@@ -1,10 +1,13 @@
 import logging
 import re
-from typing import Callable
+import time
+from typing import TYPE_CHECKING, Callable, Optional
 
-from openai import OpenAI
+import httpx
+from openai import DEFAULT_MAX_RETRIES, NOT_GIVEN, NotGiven, OpenAI
 
 from reviewer.config.reviewer_config import (
+    DEFAULT_CONTEXT_WINDOW,
     FALLBACK_MODEL_API_KEY,
     FALLBACK_MODEL_BASE_URL,
     FALLBACK_MODEL_NAME,
@@ -14,94 +17,288 @@ from reviewer.config.reviewer_config import (
     Configuration,
     InferenceProvider,
 )
+from reviewer.llm.call_bookkeeping import CallBookkeeping
+from reviewer.llm.call_metrics import CallMetricsRecorder, CallSource
+from reviewer.llm.endpoint_pool import EndpointPool
+from reviewer.llm.endpoint_probe import EndpointProbe
+from reviewer.llm.http_client import make_http_client
 from reviewer.llm.prompt_logger import PromptLogger  # Import the new logger
+from reviewer.llm.resilience import (
+    CircuitBreaker,
+    DeadlineExceededError,
+    EmissionTracker,
+    PrimaryGuard,
+)
+from reviewer.llm.response_cache import ResponseCache
+from reviewer.llm.streaming import CompletionStream, TextSink
+
+if TYPE_CHECKING:
+    from reviewer.llm.async_llm import AsyncLLM
+
+# the (name, prompt) calls that llama.cpp answers instead of a prompt that is too large for it
+FallbackSplit = Callable[[], list[tuple[str, str]]]
 
 
 class LLM:
-    def __init__(self, configuration: Configuration):
+    def __init__(
+        self,
+        configuration: Configuration,
+        prompt_logger: Optional[PromptLogger] = None,
+        response_cache: Optional[ResponseCache] = None,
+        call_metrics: Optional[CallMetricsRecorder] = None,
+        primary_guard: Optional[PrimaryGuard] = None,
+        hedged_llm: Optional["AsyncLLM"] = None,
+        http_client: Optional[httpx.Client] = None,
+        fallback_pool: Optional[EndpointPool] = None,
+    ):
         self.__config = configuration
-        self.__prompt_logger = PromptLogger()  # Instantiate the logger
+        self.__prompt_logger = prompt_logger or PromptLogger()  # Instantiate the logger
+        self.__primary_guard = primary_guard or PrimaryGuard(
+            configuration,
+            CircuitBreaker(configuration.primary_failure_threshold, configuration.primary_cooldown),
+        )
+        # with --hedge the calls go through the async client, which can race and cancel requests
+        self.__hedged_llm = hedged_llm
 
-        self.__model = OpenAI(api_key=MODEL_API_KEY, base_url=MODEL_BASE_URL)
-        self.__fallback_model = OpenAI(api_key=FALLBACK_MODEL_API_KEY, base_url=FALLBACK_MODEL_BASE_URL)
+        self.__fallback_pool = fallback_pool or EndpointPool(
+            configuration.fallback_urls, configuration.fallback_health_interval
+        )
+        self.__calls = CallBookkeeping(call_metrics or CallMetricsRecorder(), self.__fallback_pool, response_cache)
 
-        if configuration.inference_provider == InferenceProvider.LlamaCpp:
-            # Ensure that models.list() and its data attribute are valid before accessing.
-            # This assumes the API client behaves as expected.
-            try:
-                models_data = self.__fallback_model.models.list().data
-                if models_data:  # Check if the list is not empty
-                    logging.info(f"llama.cpp model: {models_data[0].id}")
-                else:
-                    logging.warning("llama.cpp model list is empty.")
-            except Exception as e:
-                logging.error(f"Failed to retrieve llama.cpp model list: {e}")
-
-    def generate(self, name: str, prompt: str) -> str:
-        llm_executor: Callable[[str], str] = {
-            InferenceProvider.LlamaCpp: self.__generate_llama,
-            InferenceProvider.BigModel: self.__generate_with_fallback_llama,
-        }[self.__config.inference_provider]
-        result = llm_executor(prompt)
+        # all clients share one tuned connection pool
+        http_client = http_client or make_http_client(configuration)
+        # retries of the big model are done by the primary guard
+        self.__model = OpenAI(api_key=MODEL_API_KEY, base_url=MODEL_BASE_URL, max_retries=0, http_client=http_client)
+        # with several servers a failed request is retried on another one
+        fallback_retries = DEFAULT_MAX_RETRIES if len(self.__fallback_pool.urls) == 1 else 0
+        self.__fallback_models = {
+            url: OpenAI(
+                api_key=FALLBACK_MODEL_API_KEY, base_url=url, max_retries=fallback_retries, http_client=http_client
+            )
+            for url in self.__fallback_pool.urls
+        }
+
+        # the endpoints tell their model and context length in the background;
+        # a call of the big model ends up on llama.cpp when it fails or is hedged
+        self.__fallback_probe = EndpointProbe(self.__fallback_models[self.__fallback_pool.urls[0]], "llama.cpp")
+        self.__probe = {
+            InferenceProvider.LlamaCpp: lambda: self.__fallback_probe,
+            InferenceProvider.BigModel: lambda: EndpointProbe(self.__model, "primary"),
+        }[configuration.inference_provider]()
+        self.__model_name = {
+            InferenceProvider.LlamaCpp: FALLBACK_MODEL_NAME,
+            InferenceProvider.BigModel: MODEL_NAME,
+        }[configuration.inference_provider]
+        self.__context_budget: Optional[int] = None
+        self.__fallback_budget: Optional[int] = None
+
+    def generate(
+        self, name: str, prompt: str, on_text: Optional[TextSink] = None, split: Optional[FallbackSplit] = None
+    ) -> str:
+        """Returns the cleaned answer; with on_text set, the cleaned text is also passed to it as it arrives.
+
+        split gives the parts of a prompt that does not fit llama.cpp, which answers them when the big model does not.
+        """
+        if self.__hedged_llm and self.__config.inference_provider == InferenceProvider.BigModel:
+            return self.__hedged_llm.run(self.__hedged_llm.generate(name, prompt, on_text, split))
+
+        if self.__config.inference_provider == InferenceProvider.LlamaCpp:
+            result = self.__generate_llama(prompt, name, on_text)
+        else:
+            result = self.__generate_with_fallback_llama(prompt, name, on_text, split)
         self.__prompt_logger.log_prompt(name, prompt, result)  # Use the logger instance
         return result
 
-    def __generate(self, prompt: str) -> str:
-        response = self.__model.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[
-                {"role": "user", "content": prompt},
-            ],
+    def context_budget(self) -> int:
+        """Prompt tokens that fit the endpoint that serves the calls, less the reserve for the answer."""
+        if self.__context_budget is None:
+            self.__context_budget = self.__endpoint_budget(self.__model_name, self.__probe)
+            logging.info(f"review groups take {self.__context_budget} tokens")
+        return self.__context_budget
+
+    def fallback_budget(self) -> int:
+        """Prompt tokens that fit llama.cpp, which answers the calls that the big model does not."""
+        if self.__fallback_budget is None:
+            self.__fallback_budget = self.__endpoint_budget(FALLBACK_MODEL_NAME, self.__fallback_probe)
+        return self.__fallback_budget
+
+    def __endpoint_budget(self, model: str, probe: EndpointProbe) -> int:
+        try:
+            context_length = probe.context_length(self.__config.http_connect_timeout)
+            served_model = probe.model()
+        except TimeoutError:
+            context_length, served_model = None, None
+
+        known = self.__config.model_context_lengths
+        context_length = context_length or known.get(model) or known.get(served_model or "")
+        if not context_length:
+            logging.info(f"context length of {model} is unknown, it takes prompts of {DEFAULT_CONTEXT_WINDOW} tokens")
+            return DEFAULT_CONTEXT_WINDOW
+
+        # a reserve larger than the context still leaves half of it to the prompt
+        budget = max(context_length - self.__config.completion_reserve, context_length // 2)
+        logging.info(f"context length of {model}: {context_length}, it takes prompts of {budget} tokens")
+        return budget
+
+    def __generate(self, prompt: str, name: str, on_text: Optional[TextSink], deadline: float) -> str:
+        return self.__cached(
+            MODEL_BASE_URL,
+            MODEL_NAME,
+            name,
+            prompt,
+            on_text,
+            lambda: self.__request(
+                self.__model, MODEL_BASE_URL, MODEL_NAME, CallSource.Primary, name, prompt, on_text, deadline
+            ),
         )
-        if response.usage:  # Check if usage data is available
-            logging.info(
-                f"prompt_eval_count:{response.usage.prompt_tokens} "
-                f"total_tokens:{response.usage.total_tokens} "
-                f"eval:{response.usage.total_tokens - response.usage.prompt_tokens}"
-            )
-        else:
-            logging.warning("Usage data not available in response from primary model.")
-
-        content = response.choices[0].message.content.strip()
-        content = self.__remove_think_blocks(content)
-        return self.__remove_code_fence(content)
-
-    def __generate_llama(self, prompt: str) -> str:
-        response = self.__fallback_model.chat.completions.create(
-            model=FALLBACK_MODEL_NAME,
-            messages=[
-                {"role": "user", "content": prompt},
-            ],
+
+    def __generate_llama(self, prompt: str, name: str, on_text: Optional[TextSink]) -> str:
+        # the servers of the pool serve the same model, so they share cached answers
+        return self.__cached(
+            FALLBACK_MODEL_BASE_URL,
+            FALLBACK_MODEL_NAME,
+            name,
+            prompt,
+            on_text,
+            lambda: self.__request_pool(name, prompt, on_text),
         )
-        if response.usage:  # Check if usage data is available
-            logging.info(
-                f"prompt_eval_count:{response.usage.prompt_tokens} "
-                f"total_tokens:{response.usage.total_tokens} "
-                f"eval:{response.usage.total_tokens - response.usage.prompt_tokens} "
-            )
-        else:
-            logging.warning("Usage data not available in response from fallback (llama) model.")
 
-        content = response.choices[0].message.content.strip()
-        content = self.__remove_think_blocks(content)
-        return self.__remove_code_fence(content)
+    def __request_pool(self, name: str, prompt: str, on_text: Optional[TextSink]) -> str:
+        """Sends the request to the least loaded llama.cpp server, and to the next one when the server fails."""
+        tracker = EmissionTracker(on_text)
+        tried: set[str] = set()
+        error: Optional[Exception] = None
+        while (url := self.__fallback_pool.acquire(tried)) is not None:
+            tried.add(url)
+            try:
+                result = self.__request(
+                    self.__fallback_models[url],
+                    url,
+                    FALLBACK_MODEL_NAME,
+                    CallSource.Fallback,
+                    name,
+                    prompt,
+                    tracker.sink,
+                )
+            except Exception as e:
+                if not self.__calls.release_failed(url, e, tracker.emitted):
+                    raise
+                error = e
+                continue
+            self.__fallback_pool.release(url)
+            return result
+        raise error or RuntimeError("no llama.cpp server to send the request to")
+
+    def __cached(
+        self,
+        endpoint: str,
+        model: str,
+        name: str,
+        prompt: str,
+        on_text: Optional[TextSink],
+        request: Callable[[], str],
+    ) -> str:
+        cached = self.__calls.cached(endpoint, model, name, prompt, on_text)
+        if cached is not None:
+            return cached
 
-    def __generate_with_fallback_llama(self, prompt: str) -> str:
+        result = request()
+        self.__calls.store(endpoint, model, name, prompt, result)
+        return result
+
+    def __request(
+        self,
+        client: OpenAI,
+        endpoint: str,
+        model: str,
+        source: str,
+        name: str,
+        prompt: str,
+        on_text: Optional[TextSink],
+        deadline: Optional[float] = None,
+    ) -> str:
+        timeout: float | NotGiven = max(deadline - time.monotonic(), 0.001) if deadline else NOT_GIVEN
+        started = time.perf_counter()
+        stream = CompletionStream(on_text) if self.__config.stream else None
         try:
-            return self.__generate(prompt)
-        except BaseException as e:  # Consider catching more specific exceptions
-            logging.error(f"LLM error with primary model: {e}, falling back to local model.")
-            return self.__generate_llama(prompt)
-
-    @staticmethod
-    def __remove_think_blocks(text: str) -> str:
-        # Removes all <think>...</think> blocks including content
-        return re.sub(r"<think>.*?</think>", "", text, flags=re.DOTALL).strip()
-
-    @staticmethod
-    def __remove_code_fence(text: str) -> str:
-        # Regex to find ``` or ```language
-        pattern = r"```(?:\w+)?"
-        # Replace all occurrences with an empty string
-        result = re.sub(pattern, "", text)
+            if stream:
+                with client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "user", "content": prompt},
+                    ],
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    timeout=timeout,
+                ) as chunks:
+                    for chunk in chunks:
+                        stream.add(chunk)
+                        if deadline and time.monotonic() > deadline:
+                            raise DeadlineExceededError(f"{model} did not finish the answer in time")
+                result = stream.finish()
+                self.__calls.record(stream.metrics(name, model, endpoint, source))
+                return result
+
+            response = client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "user", "content": prompt},
+                ],
+                timeout=timeout,
+            )
+        except Exception:
+            self.__calls.record_failed(name, model, endpoint, started, stream)
+            raise
+        result = clean_response(self.__calls.record_response(response, name, model, endpoint, source, started))
+        if on_text and result:
+            on_text(result)
         return result
+
+    def __generate_with_fallback_llama(
+        self, prompt: str, name: str, on_text: Optional[TextSink], split: Optional[FallbackSplit]
+    ) -> str:
+        tracker = EmissionTracker(on_text)
+        for delay in self.__primary_guard.attempts():
+            time.sleep(delay)
+            try:
+                result = self.__generate(prompt, name, tracker.sink, self.__primary_guard.deadline())
+            except Exception as e:
+                if self.__primary_guard.failed(e, tracker.emitted):
+                    continue
+                break
+            self.__primary_guard.breaker.record_success()
+            return result
+
+        return tracker.fall_back() + self.__generate_llama_split(prompt, name, on_text, split)
+
+    def __generate_llama_split(
+        self, prompt: str, name: str, on_text: Optional[TextSink], split: Optional[FallbackSplit]
+    ) -> str:
+        """The answer of llama.cpp; to a prompt too large for it, the answers to its parts one after another."""
+        if not split:
+            return self.__generate_llama(prompt, name, on_text)
+
+        answers: list[str] = []
+        for part_name, part_prompt in split():
+            if answers and on_text:
+                on_text("\n")
+            answers.append(self.__generate_llama(part_prompt, part_name, on_text))
+        return "\n".join(answers)
+
+
+def clean_response(content: str) -> str:
+    """Strips the reasoning and the code fences from a model answer."""
+    return _remove_code_fence(_remove_think_blocks(content.strip()))
+
+
+def _remove_think_blocks(text: str) -> str:
+    # Removes all <think>...</think> blocks including content
+    return re.sub(r"<think>.*?</think>", "", text, flags=re.DOTALL).strip()
+
+
+def _remove_code_fence(text: str) -> str:
+    # Regex to find ``` or ```language
+    pattern = r"```(?:\w+)?"
+    # Replace all occurrences with an empty string
+    result = re.sub(pattern, "", text)
+    return result
@@ -28,7 +28,8 @@ class PromptLogger:
             result: The result string from the LLM.
 
         """
-        sanitized_name = name.replace("/", ".")
+        # the name of a call for many files is cut to a valid file name
+        sanitized_name = name.replace("/", ".")[:100]
 
         input_filename = os.path.join(self.log_dir, f"{self.log_count}_{sanitized_name}_input.txt")
         output_filename = os.path.join(self.log_dir, f"{self.log_count}_{sanitized_name}_output.txt")
@@ -0,0 +1,240 @@
+import logging
+import random
+import threading
+import time
+from typing import Callable, Iterator, Optional
+
+import httpx
+import openai
+
+from reviewer.config.reviewer_config import Configuration
+
+
+class DeadlineExceededError(TimeoutError):
+    pass
+
+
+class BreakerState:
+    Closed = "closed"
+    Open = "open"
+    HalfOpen = "half_open"
+
+
+def is_transient(error: BaseException) -> bool:
+    """Errors worth retrying and counting against the endpoint's health; a bad request is neither."""
+    transient = (
+        openai.APIConnectionError,
+        openai.RateLimitError,
+        openai.InternalServerError,
+        TimeoutError,
+        # a stream broken off midway is not wrapped by the openai client
+        httpx.TransportError,
+    )
+    if isinstance(error, transient):
+        return True
+    return isinstance(error, openai.APIStatusError) and (error.status_code in (408, 429) or error.status_code >= 500)
+
+
+class CircuitBreaker:
+    """Tracks the health of an endpoint across calls, threads and review jobs.
+
+    After failure_threshold transient failures in a row the breaker opens and the
+    endpoint is skipped for cooldown seconds. Then one probe call is let through
+    (half open): success closes the breaker, failure opens it for another cooldown.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        cooldown: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.__failure_threshold = failure_threshold
+        self.__cooldown = cooldown
+        self.__clock = clock
+        self.__lock = threading.Lock()
+        self.__state = BreakerState.Closed
+        self.__consecutive_failures = 0
+        self.__opened_at = 0.0
+        self.__probe_in_flight = False
+
+        self.__times_opened = 0
+        self.__skipped = 0
+        self.__failures = 0
+        self.__successes = 0
+
+    @property
+    def state(self) -> str:
+        with self.__lock:
+            return self.__current_state()
+
+    def allow(self) -> bool:
+        with self.__lock:
+            state = self.__current_state()
+            if state == BreakerState.Closed:
+                return True
+            if state == BreakerState.HalfOpen and not self.__probe_in_flight:
+                self.__probe_in_flight = True
+                return True
+            self.__skipped += 1
+            return False
+
+    def record_success(self) -> None:
+        with self.__lock:
+            self.__successes += 1
+            self.__consecutive_failures = 0
+            self.__probe_in_flight = False
+            self.__state = BreakerState.Closed
+
+    def record_failure(self) -> None:
+        with self.__lock:
+            self.__failures += 1
+            self.__consecutive_failures += 1
+            was_probe = self.__probe_in_flight
+            self.__probe_in_flight = False
+            if was_probe or (
+                self.__state == BreakerState.Closed and self.__consecutive_failures >= self.__failure_threshold
+            ):
+                self.__times_opened += 1
+                self.__state = BreakerState.Open
+                self.__opened_at = self.__clock()
+                logging.warning(f"primary model circuit opened for {self.__cooldown:.0f}s")
+
+    def record_abandoned(self) -> None:
+        """A call that was let through was cancelled before it could tell anything about the endpoint."""
+        with self.__lock:
+            self.__probe_in_flight = False
+
+    def stats(self) -> dict[str, object]:
+        with self.__lock:
+            return {
+                "state": self.__current_state(),
+                "times_opened": self.__times_opened,
+                "skipped_calls": self.__skipped,
+                "failures": self.__failures,
+                "successes": self.__successes,
+            }
+
+    def __current_state(self) -> str:
+        if self.__state == BreakerState.Open and self.__clock() - self.__opened_at >= self.__cooldown:
+            return BreakerState.HalfOpen
+        return self.__state
+
+
+class PrimaryGuard:
+    """Decides, for one review run, whether and how long the primary model may be tried.
+
+    Each call gets up to `primary_retries` jittered exponential retries for
+    transient errors, while the run-wide retry budget lasts. A call may take at
+    most `primary_call_timeout` seconds and never past the run deadline; once the
+    run deadline is over, every call goes straight to the fallback model.
+    """
+
+    def __init__(
+        self,
+        config: Configuration,
+        breaker: CircuitBreaker,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.breaker = breaker
+        self.__retries = config.primary_retries
+        self.__retry_budget = config.primary_retry_budget
+        self.__call_timeout = config.primary_call_timeout
+        self.__base_delay = config.primary_retry_delay
+        self.__clock = clock
+        self.__run_deadline = clock() + config.primary_run_deadline if config.primary_run_deadline else None
+        self.__lock = threading.Lock()
+        self.__retried = 0
+
+    def attempts(self) -> Iterator[float]:
+        """Yields the delay before every allowed attempt, starting with 0; stops when the primary must be skipped."""
+        for attempt in range(self.__retries + 1):
+            if attempt:
+                with self.__lock:
+                    if self.__retried >= self.__retry_budget:
+                        logging.warning("primary model retry budget is exhausted")
+                        return
+                    self.__retried += 1
+            if self.call_timeout() <= 0:
+                logging.warning("primary model run deadline is over")
+                return
+            if not self.breaker.allow():
+                logging.info("primary model skipped: circuit breaker is open")
+                return
+            yield self.__delay(attempt)
+
+    def failed(self, error: Exception, emitted: bool) -> bool:
+        """Records a failed primary call; returns whether it may be retried."""
+        if not is_transient(error):
+            # the endpoint answered, the request itself is at fault
+            self.breaker.record_success()
+            logging.error(f"LLM error with primary model: {error}, falling back to local model.")
+            return False
+
+        self.breaker.record_failure()
+        if emitted:
+            logging.error(
+                f"LLM error with primary model in the middle of an answer: {error}, falling back to local model."
+            )
+            return False
+        logging.warning(f"LLM error with primary model: {error}")
+        return True
+
+    def call_timeout(self) -> float:
+        """Seconds the next primary call may take."""
+        if self.__run_deadline is None:
+            return self.__call_timeout
+        return min(self.__call_timeout, self.__run_deadline - self.__clock())
+
+    def deadline(self) -> float:
+        """The clock value by which the next primary call must be done."""
+        return self.__clock() + self.call_timeout()
+
+    def stats(self) -> dict[str, object]:
+        with self.__lock:
+            retried = self.__retried
+        return {**self.breaker.stats(), "retries": retried}
+
+    def log_stats(self) -> None:
+        stats = self.stats()
+        if stats["failures"] or stats["skipped_calls"]:
+            logging.info("primary model: " + ", ".join(f"{key} {value}" for key, value in stats.items()))
+
+    def __delay(self, attempt: int) -> float:
+        if not attempt:
+            return 0.0
+        # full jitter: a random delay up to the exponential backoff
+        return random.uniform(0, self.__base_delay * 2 ** (attempt - 1))  # noqa:S311
+
+
+FALLBACK_NOTICE = "\n[the big model failed in the middle of the answer, the local model answers instead]\n"
+
+
+class EmissionTracker:
+    """Forwards streamed text and remembers whether any was shown; such a call cannot be retried silently."""
+
+    def __init__(self, on_text: Optional[Callable[[str], None]]):
+        self.__on_text = on_text
+        self.__shown: list[str] = []
+        self.emitted = False
+
+    def __call__(self, text: str) -> None:
+        self.emitted = True
+        self.__shown.append(text)
+        if self.__on_text:
+            self.__on_text(text)
+
+    def fall_back(self) -> str:
+        """Shows FALLBACK_NOTICE after a partly shown answer and returns all the text shown.
+
+        The answer of the local model follows it, so the result of the call is the
+        same as what was streamed.
+        """
+        if not self.emitted:
+            return ""
+        self(FALLBACK_NOTICE)
+        return "".join(self.__shown)
+
+    @property
+    def sink(self) -> Optional[Callable[[str], None]]:
+        return self if self.__on_text else None
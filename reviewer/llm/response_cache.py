@@ -0,0 +1,131 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Any, Optional
+
+from reviewer.state.review_state import default_state_dir
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    stage TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL
+)
+"""
+
+# eviction runs on open and after this many writes
+_EVICT_EVERY = 100
+
+
+class ResponseCache:
+    """Persists cleaned LLM answers in SQLite, keyed by endpoint, model, stage, prompt hash and generation params.
+
+    Entries older than max_age_seconds are dropped, and when the stored answers
+    exceed max_bytes the least recently used ones go first. The database is shared
+    by parallel reviews (WAL journal), each process keeps its own hit/miss counters.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_bytes: int = 256 * 1024 * 1024,
+        max_age_seconds: float = 30 * 24 * 3600,
+    ):
+        self.__path = path or os.path.join(default_state_dir(), "llm_cache.sqlite3")
+        self.__max_bytes = max_bytes
+        self.__max_age_seconds = max_age_seconds
+        self.__lock = threading.Lock()
+        self.__hits: Counter[str] = Counter()
+        self.__misses: Counter[str] = Counter()
+        self.__writes = 0
+
+        os.makedirs(os.path.dirname(self.__path), exist_ok=True)
+        self.__connection = sqlite3.connect(self.__path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute(_SCHEMA)
+        self.evict()
+
+    @staticmethod
+    def key(endpoint: str, model: str, stage: str, prompt: str, params: Optional[dict[str, Any]] = None) -> str:
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        params_json = json.dumps(params or {}, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256("\0".join([endpoint, model, stage, prompt_hash, params_json]).encode("utf-8")).hexdigest()
+
+    def get(self, key: str, stage: str) -> Optional[str]:
+        with self.__lock:
+            row = self.__connection.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            now = time.time()
+            if row is None or now - row[1] > self.__max_age_seconds:
+                self.__misses[stage] += 1
+                return None
+
+            self.__connection.execute("UPDATE responses SET used_at = ? WHERE key = ?", (now, key))
+            self.__hits[stage] += 1
+            return row[0]
+
+    def put(self, key: str, stage: str, response: str) -> None:
+        now = time.time()
+        with self.__lock:
+            self.__connection.execute(
+                "INSERT OR REPLACE INTO responses (key, stage, response, size, created_at, used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, stage, response, len(response.encode("utf-8")), now, now),
+            )
+            self.__writes += 1
+            evict = self.__writes % _EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def evict(self) -> None:
+        with self.__lock:
+            self.__connection.execute(
+                "DELETE FROM responses WHERE created_at < ?",
+                (time.time() - self.__max_age_seconds,),
+            )
+            total = self.__connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total <= self.__max_bytes:
+                return
+
+            to_free = total - self.__max_bytes
+            keys: list[tuple[str]] = []
+            for key, size in self.__connection.execute("SELECT key, size FROM responses ORDER BY used_at"):
+                keys.append((key,))
+                to_free -= size
+                if to_free <= 0:
+                    break
+            self.__connection.executemany("DELETE FROM responses WHERE key = ?", keys)
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Hits and misses of this process per stage."""
+        with self.__lock:
+            stages = sorted(set(self.__hits) | set(self.__misses))
+            return {stage: {"hits": self.__hits[stage], "misses": self.__misses[stage]} for stage in stages}
+
+    def log_stats(self) -> None:
+        stats = self.stats()
+        if not stats:
+            return
+        hits = sum(s["hits"] for s in stats.values())
+        misses = sum(s["misses"] for s in stats.values())
+        per_stage = ", ".join(f"{stage} {s['hits']}/{s['hits'] + s['misses']}" for stage, s in stats.items())
+        logging.info(f"llm cache: {hits} hits, {misses} misses ({per_stage})")
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__connection.close()
+
+
+def stage_of(name: str) -> str:
+    """`review: pkg/file.go` -> `review`; the prompt hash already tells files apart."""
+    return name.split(":", 1)[0].strip()
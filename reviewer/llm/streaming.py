@@ -0,0 +1,175 @@
+import re
+import time
+from typing import Any, Callable, Optional
+
+from reviewer.llm.call_metrics import CallMetrics, CallSource, reasoning_tokens
+
+TextSink = Callable[[str], None]
+
+_THINK_OPEN = "<think>"
+_THINK_CLOSE = "</think>"
+_FENCE = "```"
+_WORD = re.compile(r"\w")
+
+
+class ResponseFilter:
+    """Incremental version of `clean_response` for streamed answers.
+
+    `feed` takes the raw chunks as they arrive and returns the text that is safe
+    to show; a possible start of a tag or fence at the end of a chunk is held back
+    until the next chunk. The concatenated output of `feed` and `finish` equals
+    `clean_response` of the whole answer.
+    """
+
+    def __init__(self):
+        self.__think_pending = ""
+        self.__in_think = False
+        self.__think_buffer = ""
+        self.__started = False
+        self.__whitespace = ""
+        self.__fence_pending = ""
+
+    def feed(self, chunk: str) -> str:
+        return self.__remove_fences(self.__strip(self.__remove_think(chunk)))
+
+    def finish(self) -> str:
+        text = self.__think_pending
+        if self.__in_think:
+            # an unclosed block is not a think block for clean_response either
+            text = _THINK_OPEN + self.__think_buffer + text
+        self.__think_pending = ""
+        stripped = self.__strip(text)
+        # trailing whitespace is dropped, like str.strip does
+        self.__whitespace = ""
+        return self.__remove_fences(stripped, final=True)
+
+    def __remove_think(self, chunk: str) -> str:
+        text = self.__think_pending + chunk
+        self.__think_pending = ""
+        out: list[str] = []
+        while text:
+            if not self.__in_think:
+                start = text.find(_THINK_OPEN)
+                if start < 0:
+                    held = _partial_suffix(text, _THINK_OPEN)
+                    out.append(text[: len(text) - held])
+                    self.__think_pending = text[len(text) - held :]
+                    break
+                out.append(text[:start])
+                text = text[start + len(_THINK_OPEN) :]
+                self.__in_think = True
+                self.__think_buffer = ""
+            else:
+                end = text.find(_THINK_CLOSE)
+                if end < 0:
+                    held = _partial_suffix(text, _THINK_CLOSE)
+                    self.__think_buffer += text[: len(text) - held]
+                    self.__think_pending = text[len(text) - held :]
+                    break
+                text = text[end + len(_THINK_CLOSE) :]
+                self.__in_think = False
+                self.__think_buffer = ""
+        return "".join(out)
+
+    def __strip(self, text: str) -> str:
+        if not self.__started:
+            text = text.lstrip()
+            if not text:
+                return ""
+            self.__started = True
+
+        body = text.rstrip()
+        if not body:
+            self.__whitespace += text
+            return ""
+        out = self.__whitespace + body
+        self.__whitespace = text[len(body) :]
+        return out
+
+    def __remove_fences(self, chunk: str, final: bool = False) -> str:
+        text = self.__fence_pending + chunk
+        self.__fence_pending = ""
+        out: list[str] = []
+        while text:
+            start = text.find(_FENCE)
+            if start < 0:
+                held = 0 if final else _partial_suffix(text, _FENCE)
+                out.append(text[: len(text) - held])
+                self.__fence_pending = text[len(text) - held :]
+                break
+
+            out.append(text[:start])
+            end = start + len(_FENCE)
+            while end < len(text) and _WORD.match(text[end]):
+                end += 1
+            if end == len(text) and not final:
+                # the language name may continue in the next chunk
+                self.__fence_pending = text[start:]
+                break
+            text = text[end:]
+        return "".join(out)
+
+
+def _partial_suffix(text: str, tag: str) -> int:
+    """Length of the longest suffix of text that is a proper prefix of tag."""
+    for length in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:length]):
+            return length
+    return 0
+
+
+class CompletionStream:
+    """Collects a streamed chat completion: filtered text, usage and timings."""
+
+    def __init__(self, on_text: Optional[TextSink] = None, on_first_token: Optional[Callable[[], None]] = None):
+        self.__on_text = on_text
+        self.__on_first_token = on_first_token
+        self.__filter = ResponseFilter()
+        self.__parts: list[str] = []
+        self.__started_at = time.perf_counter()
+        self.__first_token_at: Optional[float] = None
+        self.__chunks = 0
+        self.__usage: Any = None
+
+    def add(self, chunk: Any) -> None:
+        if chunk.usage:
+            self.__usage = chunk.usage
+        for choice in chunk.choices:
+            delta = choice.delta
+            content = delta.content or ""
+            if self.__first_token_at is None and (content or getattr(delta, "reasoning_content", None)):
+                self.__first_token_at = time.perf_counter()
+                if self.__on_first_token:
+                    self.__on_first_token()
+            if content:
+                self.__chunks += 1
+                self.__emit(self.__filter.feed(content))
+
+    def finish(self) -> str:
+        self.__emit(self.__filter.finish())
+        return "".join(self.__parts)
+
+    def metrics(self, name: str, model: str, endpoint: str = "", source: str = CallSource.Primary) -> CallMetrics:
+        finished_at = time.perf_counter()
+        first_token_at = self.__first_token_at or finished_at
+        return CallMetrics(
+            name=name,
+            model=model,
+            streamed=True,
+            elapsed=finished_at - self.__started_at,
+            ttft=first_token_at - self.__started_at,
+            decode_time=finished_at - first_token_at,
+            prompt_tokens=self.__usage.prompt_tokens if self.__usage else None,
+            # without usage every content chunk is counted as one token
+            completion_tokens=self.__usage.completion_tokens if self.__usage else self.__chunks,
+            reasoning_tokens=reasoning_tokens(self.__usage),
+            endpoint=endpoint,
+            source=source,
+        )
+
+    def __emit(self, text: str) -> None:
+        if not text:
+            return
+        self.__parts.append(text)
+        if self.__on_text:
+            self.__on_text(text)
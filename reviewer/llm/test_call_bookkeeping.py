@@ -0,0 +1,40 @@
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+from reviewer.llm.call_bookkeeping import CallBookkeeping
+from reviewer.llm.call_metrics import CallMetricsRecorder, CallSource
+from reviewer.llm.endpoint_pool import EndpointPool
+from reviewer.llm.response_cache import ResponseCache
+
+
+def _response(content):
+    usage = SimpleNamespace(prompt_tokens=10, completion_tokens=2, total_tokens=12)
+    return SimpleNamespace(usage=usage, choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def test_response_without_content_is_an_empty_answer():
+    metrics = CallMetricsRecorder()
+    calls = CallBookkeeping(metrics, EndpointPool(["a"]))
+
+    assert (
+        calls.record_response(_response(None), "review: a.py", "m", "a", CallSource.Primary, time.perf_counter()) == ""
+    )
+    assert [(c.prompt_tokens, c.completion_tokens) for c in metrics.calls()] == [(10, 2)]
+
+
+def test_cached_answer_is_recorded_and_passed_on():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResponseCache(os.path.join(directory, "cache.sqlite3"))
+        metrics = CallMetricsRecorder()
+        calls = CallBookkeeping(metrics, EndpointPool(["a"]), cache)
+        printed = []
+
+        assert calls.cached("a", "m", "review: a.py", "prompt", printed.append) is None
+        calls.store("a", "m", "review: a.py", "prompt", "no comments")
+        assert calls.cached("a", "m", "review: a.py", "prompt", printed.append) == "no comments"
+        cache.close()
+
+    assert printed == ["no comments"]
+    assert [c.source for c in metrics.calls()] == [CallSource.Cache]
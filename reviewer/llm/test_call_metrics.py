@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+from reviewer.llm.call_metrics import CallMetrics, CallMetricsRecorder, CallSource, reasoning_tokens
+
+
+def _call(name: str, source: str = CallSource.Primary, endpoint: str = "http://big/v1", **kwargs) -> CallMetrics:
+    return CallMetrics(name=name, model="m", streamed=True, endpoint=endpoint, source=source, **kwargs)
+
+
+def test_usage_summary_attributes_calls():
+    recorder = CallMetricsRecorder()
+    recorder.record(_call("sanitize:a.py", elapsed=1.0, prompt_tokens=100, completion_tokens=5, reasoning_tokens=3))
+    recorder.record(
+        _call("review: pkg", CallSource.Fallback, "http://llama/v1", elapsed=2.0, prompt_tokens=50, completion_tokens=7)
+    )
+    recorder.record(_call("review: pkg", CallSource.Cache, elapsed=0.001))
+    recorder.record(_call("translate", elapsed=0.5, prompt_tokens=10, completion_tokens=10))
+
+    summary = recorder.usage_summary()
+
+    assert summary["total"] == {
+        "calls": 4,
+        "prompt_tokens": 160,
+        "completion_tokens": 22,
+        "reasoning_tokens": 3,
+        "seconds": 3.501,
+    }
+    assert summary["by_stage"]["review"]["calls"] == 2
+    assert summary["by_source"]["fallback"]["prompt_tokens"] == 50
+    assert summary["by_source"]["cache"]["calls"] == 1
+    assert summary["by_endpoint"]["http://big/v1"]["calls"] == 2  # cache hits are not sent anywhere
+    assert set(summary["by_target"]) == {"sanitize: a.py", "review: pkg", "translate"}
+
+
+def test_call_for_several_files_is_split_between_them():
+    recorder = CallMetricsRecorder()
+    recorder.record(_call("sanitize: a.py, b.py", elapsed=1.0, prompt_tokens=100, completion_tokens=10))
+    recorder.record(_call("sanitize: a.py", elapsed=0.5, prompt_tokens=40, completion_tokens=4))
+
+    by_target = recorder.usage_summary()["by_target"]
+
+    assert by_target["sanitize: a.py"] == {
+        "calls": 2,
+        "prompt_tokens": 90,
+        "completion_tokens": 9,
+        "reasoning_tokens": 0,
+        "seconds": 1.0,
+    }
+    assert by_target["sanitize: b.py"]["prompt_tokens"] == 50
+
+
+def test_failed_calls_count_in_the_usage():
+    recorder = CallMetricsRecorder()
+    recorder.record(_call("review: pkg", CallSource.Error, elapsed=3.0, completion_tokens=20))
+    recorder.record(_call("review: pkg", CallSource.Cancelled, elapsed=1.0))
+    recorder.record(_call("review: pkg", CallSource.Fallback, elapsed=2.0, completion_tokens=30))
+
+    summary = recorder.usage_summary()
+
+    assert summary["total"]["seconds"] == 6.0
+    assert summary["by_source"]["error"]["completion_tokens"] == 20
+    assert summary["by_source"]["cancelled"]["calls"] == 1
+    assert summary["by_target"]["review: pkg"]["calls"] == 3
+
+
+def test_reasoning_tokens():
+    assert reasoning_tokens(None) is None
+    assert reasoning_tokens(SimpleNamespace(completion_tokens_details=None)) is None
+    usage = SimpleNamespace(completion_tokens_details=SimpleNamespace(reasoning_tokens=12))
+    assert reasoning_tokens(usage) == 12
@@ -0,0 +1,77 @@
+import threading
+import time
+
+from reviewer.config.reviewer_config import Configuration, InferenceProvider
+from reviewer.llm.call_metrics import CallMetrics, CallSource
+from reviewer.llm.endpoint_pool import EndpointPool
+from reviewer.llm.llm import LLM
+
+
+def _metrics(url: str, tokens_per_second: float) -> CallMetrics:
+    return CallMetrics(
+        name="review: a.py",
+        model="m",
+        streamed=True,
+        elapsed=2.0,
+        decode_time=1.0,
+        completion_tokens=int(tokens_per_second),
+        endpoint=url,
+        source=CallSource.Fallback,
+    )
+
+
+def test_least_outstanding_weighted_by_speed():
+    pool = EndpointPool(["a", "b"])
+    pool.observe(_metrics("a", 30))
+    pool.observe(_metrics("b", 10))
+
+    # a is three times as fast, so it takes three requests for every one of b
+    assert [pool.acquire() for _ in range(4)] == ["a", "a", "a", "b"]
+    pool.release("a")
+    pool.release("a")
+    assert pool.acquire() == "a"
+
+
+def test_failed_endpoint_waits_for_health_check():
+    checks = []
+    recovered = threading.Event()
+
+    def check(url: str) -> bool:
+        checks.append(url)
+        if len(checks) < 2:
+            return False
+        recovered.set()
+        return True
+
+    pool = EndpointPool(["a", "b"], check=check, sleep=lambda _: None)
+    pool.release(pool.acquire(), failed=True)
+    assert pool.stats()["a"]["failures"] == 1
+
+    assert recovered.wait(5)
+    for _ in range(100):
+        if pool.stats()["a"]["healthy"]:
+            break
+        time.sleep(0.01)
+    assert checks == ["a", "a"]
+    assert pool.stats()["a"]["healthy"]
+
+
+def test_only_excluded_or_unhealthy_left():
+    pool = EndpointPool(["a", "b"], check=lambda _: False, sleep=lambda _: threading.Event().wait(1))
+    pool.release(pool.acquire(), failed=True)
+
+    assert pool.acquire() == "b"
+    assert pool.acquire(exclude=["b"]) == "a"  # an unhealthy endpoint is better than none
+    assert pool.acquire(exclude=["a", "b"]) is None
+
+
+def test_failed_request_is_sent_to_another_server(servers):
+    broken, working = servers(error_rate=1.0, error_status=503), servers()
+    pool = EndpointPool([broken, working], check=lambda _: False, sleep=lambda _: threading.Event().wait(1))
+    config = Configuration(
+        repo="", target_branch="", inference_provider=InferenceProvider.LlamaCpp, fallback_urls=[broken, working]
+    )
+
+    assert LLM(config, fallback_pool=pool).generate("review: a.py", "<TASK>\nDo the review task") == "no comments"
+    assert pool.stats()[broken]["failures"] == 1
+    assert pool.stats()[working]["requests"] == 1
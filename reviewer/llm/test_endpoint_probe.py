@@ -0,0 +1,64 @@
+import threading
+from unittest.mock import patch
+
+import openai
+import pytest
+
+from reviewer.config.reviewer_config import (
+    DEFAULT_CONTEXT_WINDOW,
+    Configuration,
+    FakeLLMConfiguration,
+    InferenceProvider,
+)
+from reviewer.fake_llm.server import FakeLLM, make_server
+from reviewer.llm import llm
+from reviewer.llm.endpoint_probe import EndpointProbe
+from reviewer.llm.http_client import make_http_client
+
+
+@pytest.fixture
+def llama_url():
+    server = make_server(FakeLLM(FakeLLMConfiguration(port=0, model="local-model", context_length=8192)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
+    server.server_close()
+
+
+def test_probe_reports_model_and_context_length(llama_url):
+    with make_http_client(Configuration(repo="", target_branch="")) as http_client:
+        probe = EndpointProbe(openai.OpenAI(api_key="1", base_url=llama_url, http_client=http_client), "llama.cpp")
+        assert probe.model(timeout=10) == "local-model"
+        assert probe.context_length() == 8192
+
+    unreachable = EndpointProbe(openai.OpenAI(api_key="1", base_url="http://127.0.0.1:1/v1", max_retries=0), "x")
+    assert unreachable.model(timeout=10) is None
+    assert unreachable.context_length() is None
+
+
+def _llama_llm(url: str, **kwargs) -> llm.LLM:
+    config = Configuration(
+        repo="", target_branch="", inference_provider=InferenceProvider.LlamaCpp, fallback_urls=[url], **kwargs
+    )
+    return llm.LLM(config)
+
+
+def test_context_budget_from_endpoint(llama_url):
+    assert _llama_llm(llama_url, completion_reserve=1024).context_budget() == 7168
+
+
+def test_context_budget_from_model_table():
+    unreachable = "http://127.0.0.1:1/v1"
+    table = {llm.FALLBACK_MODEL_NAME: 16384}
+    assert _llama_llm(unreachable, model_context_lengths=table).context_budget() == 16384 - 2560
+    assert _llama_llm(unreachable).context_budget() == DEFAULT_CONTEXT_WINDOW
+
+
+def test_big_model_and_its_fallback_have_budgets_of_their_own(servers):
+    primary = servers(model="big-model", context_length=131072)
+    config = Configuration(repo="", target_branch="", fallback_urls=[servers(context_length=16384)])
+
+    with patch("reviewer.llm.llm.MODEL_BASE_URL", primary):
+        big_model = llm.LLM(config)
+        assert big_model.context_budget() == 131072 - 2560
+        assert big_model.fallback_budget() == 16384 - 2560
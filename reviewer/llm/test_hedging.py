@@ -0,0 +1,39 @@
+from reviewer.llm.hedging import Hedger, LatencyPercentile
+
+
+def test_latency_percentile():
+    latencies = LatencyPercentile(90, initial=5.0, window=10, min_samples=3)
+    latencies.observe(1.0)
+    latencies.observe(2.0)
+    assert latencies.value() == 5.0  # not enough samples yet
+
+    for seconds in range(3, 11):
+        latencies.observe(float(seconds))
+    assert latencies.value() == 10.0
+
+    for _ in range(10):
+        latencies.observe(1.0)
+    assert latencies.value() == 1.0  # old samples leave the window
+
+
+def test_hedger_stats():
+    hedger = Hedger(90, initial_delay=2.0)
+    assert hedger.delay() == 2.0
+    assert hedger.remaining_decode() == 0.0
+
+    hedger.observe_decode(4.0)
+    hedger.observe_decode(6.0)
+    assert hedger.remaining_decode() == 5.0
+    assert hedger.remaining_decode(decoded=1.5) == 3.5
+
+    hedger.record(hedged=False)
+    hedger.record(hedged=True)
+    hedger.record(hedged=True, hedge_won=True, saved=5.0)
+    hedger.record(hedged=False)
+    assert hedger.stats() == {
+        "calls": 4,
+        "hedged": 2,
+        "hedge_rate": 0.5,
+        "hedge_wins": 1,
+        "saved_seconds": 5.0,
+    }
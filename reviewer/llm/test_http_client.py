@@ -0,0 +1,14 @@
+from reviewer.config.reviewer_config import Configuration
+from reviewer.llm.http_client import make_http_client
+
+
+def test_pool_fits_every_concurrent_call():
+    config = Configuration(
+        repo="", target_branch="", llm_concurrency=6, fallback_concurrency=2, http_connect_timeout=3, http2=False
+    )
+    with make_http_client(config) as client:
+        pool = client._transport._pool  # noqa:SLF001
+        assert pool._max_connections == 10  # noqa:SLF001
+        assert pool._max_keepalive_connections == 10  # noqa:SLF001
+        assert client.timeout.connect == 3
+        assert client.timeout.read == config.primary_call_timeout
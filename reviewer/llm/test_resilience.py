@@ -0,0 +1,232 @@
+import time
+from unittest.mock import patch
+
+import httpx
+import openai
+import pytest
+
+from reviewer.config.reviewer_config import Configuration
+from reviewer.llm.async_llm import AsyncLLM
+from reviewer.llm.call_metrics import CallMetricsRecorder, CallSource
+from reviewer.llm.hedging import Hedger
+from reviewer.llm.llm import LLM
+from reviewer.llm.resilience import (
+    FALLBACK_NOTICE,
+    BreakerState,
+    CircuitBreaker,
+    EmissionTracker,
+    PrimaryGuard,
+    is_transient,
+)
+from reviewer.processor.stream_output import OrderedStreamWriter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _status_error(status: int) -> openai.APIStatusError:
+    request = httpx.Request("POST", "http://endpoint/v1/chat/completions")
+    return openai.APIStatusError("error", response=httpx.Response(status, request=request), body=None)
+
+
+def _config(**kwargs) -> Configuration:
+    return Configuration(repo="", target_branch="", **kwargs)
+
+
+def test_breaker_opens_and_probes_after_cooldown():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=10, clock=clock)
+
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == BreakerState.Open
+    assert not breaker.allow()
+
+    clock.now = 10
+    assert breaker.state == BreakerState.HalfOpen
+    assert breaker.allow()
+    assert not breaker.allow()  # only one probe at a time
+
+    breaker.record_failure()
+    assert breaker.state == BreakerState.Open
+
+    clock.now = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == BreakerState.Closed
+    assert breaker.stats() == {
+        "state": BreakerState.Closed,
+        "times_opened": 2,
+        "skipped_calls": 2,
+        "failures": 3,
+        "successes": 1,
+    }
+
+
+def test_abandoned_probe_lets_the_next_one_through():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=1, clock=clock)
+    breaker.record_failure()
+    clock.now = 1
+
+    assert breaker.allow()
+    breaker.record_abandoned()
+    assert breaker.allow()
+
+
+def test_attempts_respect_retries_and_budget():
+    guard = PrimaryGuard(_config(primary_retries=2, primary_retry_budget=3), CircuitBreaker(failure_threshold=100))
+
+    first = list(guard.attempts())
+    assert len(first) == 3
+    assert first[0] == 0
+    assert 0 <= first[1] <= 1 and 0 <= first[2] <= 2
+
+    assert len(list(guard.attempts())) == 2  # one retry is left in the budget
+    assert len(list(guard.attempts())) == 1
+    assert guard.stats()["retries"] == 3
+
+
+def test_attempts_stop_at_run_deadline():
+    clock = FakeClock()
+    guard = PrimaryGuard(
+        _config(primary_call_timeout=30, primary_run_deadline=100),
+        CircuitBreaker(clock=clock),
+        clock=clock,
+    )
+    assert guard.call_timeout() == 30
+
+    clock.now = 90
+    assert guard.call_timeout() == 10
+    assert guard.deadline() == 100
+
+    clock.now = 100
+    assert list(guard.attempts()) == []
+
+
+def test_failed_retries_only_transient_errors():
+    breaker = CircuitBreaker(failure_threshold=100)
+    guard = PrimaryGuard(_config(), breaker)
+
+    assert guard.failed(TimeoutError(), emitted=False)
+    assert not guard.failed(TimeoutError(), emitted=True)  # part of the answer is already shown
+    assert not guard.failed(_status_error(400), emitted=False)
+    assert breaker.stats()["failures"] == 2
+
+
+def test_is_transient():
+    assert is_transient(TimeoutError())
+    assert is_transient(httpx.RemoteProtocolError("peer closed connection"))
+    assert is_transient(_status_error(503))
+    assert is_transient(_status_error(429))
+    assert not is_transient(_status_error(400))
+    assert not is_transient(ValueError())
+
+
+def test_emission_tracker():
+    assert EmissionTracker(None).sink is None
+
+    shown = []
+    tracker = EmissionTracker(shown.append)
+    assert not tracker.emitted
+    tracker.sink("text")
+    assert tracker.emitted
+    assert shown == ["text"]
+
+
+def _generate(
+    config: Configuration,
+    client: str,
+    on_text=None,
+    call_metrics=None,
+    hedge_delay: float = 5.0,
+    prompt: str = "<TASK>\nDo the review task",
+    split=None,
+) -> str:
+    """Asks for a review through the sync, the async or the hedged client."""
+    if client == "sync":
+        return LLM(config, call_metrics=call_metrics).generate("review: a.py", prompt, on_text, split)
+
+    hedger = Hedger(90, initial_delay=hedge_delay) if client == "hedged" else None
+    async_llm = AsyncLLM(config, call_metrics=call_metrics, hedger=hedger)
+    try:
+        return async_llm.run(async_llm.generate("review: a.py", prompt, on_text, split))
+    finally:
+        async_llm.close()
+
+
+@pytest.mark.parametrize("client", ["sync", "async", "hedged"])
+def test_answer_broken_off_midway_is_printed_once(servers, capsys, client, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # the prompt logger writes to the working directory
+    primary = servers(answers=[(r"Do the review task", "the big model review")], disconnect_rate=1.0)
+    config = Configuration(repo="", target_branch="", fallback_urls=[servers()], hedge=client == "hedged")
+    output = OrderedStreamWriter()
+    channel = output.channel(0)
+    call_metrics = CallMetricsRecorder()
+
+    with patch("reviewer.llm.llm.MODEL_BASE_URL", primary), patch("reviewer.llm.async_llm.MODEL_BASE_URL", primary):
+        result = _generate(config, client, channel.write, call_metrics)
+    channel.close()
+
+    # the processor prints only what the stream has not shown yet
+    assert result.removeprefix(output.text()) == ""
+    assert capsys.readouterr().out == result
+    assert result.startswith("the big")
+    assert result.endswith(f"{FALLBACK_NOTICE}no comments")
+    assert [call.source for call in call_metrics.calls()] == [CallSource.Error, CallSource.Fallback]
+
+
+@pytest.mark.parametrize(
+    ("client", "source"),
+    [("sync", CallSource.Error), ("async", CallSource.Cancelled), ("hedged", CallSource.Cancelled)],
+)
+def test_abandoned_primary_call_is_recorded(servers, client, source, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    primary = servers(sleep=time.sleep, ttft=2.0)
+    config = Configuration(
+        repo="",
+        target_branch="",
+        fallback_urls=[servers()],
+        primary_retries=0,
+        # the hedged call gives up on the big model by losing the race instead
+        primary_call_timeout=0.2 if client != "hedged" else 30.0,
+        hedge=client == "hedged",
+    )
+    call_metrics = CallMetricsRecorder()
+
+    with patch("reviewer.llm.llm.MODEL_BASE_URL", primary), patch("reviewer.llm.async_llm.MODEL_BASE_URL", primary):
+        assert _generate(config, client, call_metrics=call_metrics, hedge_delay=0.1) == "no comments"
+
+    calls = {call.source: call for call in call_metrics.calls()}
+    assert set(calls) == {source, CallSource.Fallback}
+    assert calls[source].elapsed >= 0.1
+    assert calls[source].ttft is None
+
+
+@pytest.mark.parametrize("client", ["sync", "async", "hedged"])
+def test_prompt_too_large_for_the_fallback_is_answered_in_parts(servers, client, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    primary = servers(error_rate=1.0, error_status=400)
+    answers = [(r"review of a", "a looks fine"), (r"review of b", "b looks fine")]
+    config = Configuration(
+        repo="", target_branch="", fallback_urls=[servers(answers, context_length=100)], hedge=client == "hedged"
+    )
+    call_metrics = CallMetricsRecorder()
+    printed = []
+
+    def split():
+        return [("review: a.py", "<TASK>\nreview of a"), ("review: b.py", "<TASK>\nreview of b")]
+
+    with patch("reviewer.llm.llm.MODEL_BASE_URL", primary), patch("reviewer.llm.async_llm.MODEL_BASE_URL", primary):
+        result = _generate(config, client, printed.append, call_metrics, prompt="x" * 1000, split=split)
+
+    assert result == "a looks fine\nb looks fine"
+    assert "".join(printed) == result
+    fallback_calls = [call.name for call in call_metrics.calls() if call.source == CallSource.Fallback]
+    assert fallback_calls == ["review: a.py", "review: b.py"]
@@ -0,0 +1,55 @@
+import time
+
+from reviewer.llm.response_cache import ResponseCache, stage_of
+
+
+def test_roundtrip_and_stats(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"))
+    key = ResponseCache.key("http://endpoint/v1", "model", "review", "prompt")
+
+    assert cache.get(key, "review") is None
+    cache.put(key, "review", "no comments")
+    assert cache.get(key, "review") == "no comments"
+    cache.close()
+
+    reopened = ResponseCache(str(tmp_path / "cache.sqlite3"))
+    assert reopened.get(key, "review") == "no comments"
+    assert reopened.get(ResponseCache.key("http://endpoint/v1", "model", "review", "other prompt"), "review") is None
+    assert reopened.stats() == {"review": {"hits": 1, "misses": 1}}
+
+
+def test_key_covers_every_part():
+    parts = ("http://endpoint/v1", "model", "review", "prompt")
+    keys = {
+        ResponseCache.key(*parts),
+        ResponseCache.key("http://other/v1", *parts[1:]),
+        ResponseCache.key(parts[0], "other-model", *parts[2:]),
+        ResponseCache.key(*parts[:2], "sanitize", parts[3]),
+        ResponseCache.key(*parts[:3], "other prompt"),
+        ResponseCache.key(*parts, params={"temperature": 0.2}),
+    }
+    assert len(keys) == 6
+
+
+def test_eviction_by_age_and_size(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), max_bytes=10, max_age_seconds=3600)
+    cache.put("old", "review", "12345")
+    cache.put("new", "review", "67890")
+    time.sleep(0.01)
+    assert cache.get("old", "review") == "12345"  # now the most recently used
+
+    cache.put("newest", "review", "abc")
+    cache.evict()
+    assert cache.get("new", "review") is None
+    assert cache.get("old", "review") == "12345"
+    assert cache.get("newest", "review") == "abc"
+    cache.close()
+
+    expired = ResponseCache(str(tmp_path / "cache.sqlite3"), max_age_seconds=0)
+    assert expired.get("old", "review") is None
+
+
+def test_stage_of():
+    assert stage_of("review: pkg/a.go") == "review"
+    assert stage_of("sanitize:a.go") == "sanitize"
+    assert stage_of("translate") == "translate"
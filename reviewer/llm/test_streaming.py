@@ -0,0 +1,61 @@
+import random
+from types import SimpleNamespace
+
+from reviewer.llm.llm import clean_response
+from reviewer.llm.streaming import CompletionStream, ResponseFilter
+
+PIECES = ["<think>", "</think>", "```", "```python", "`", "<th", "</thi", " ", "\n", "code", "x_1", "<", "\t"]
+
+
+def _filter_in_chunks(text: str, rng: random.Random) -> str:
+    response_filter = ResponseFilter()
+    out = []
+    i = 0
+    while i < len(text):
+        size = rng.randint(1, 6)
+        out.append(response_filter.feed(text[i : i + size]))
+        i += size
+    out.append(response_filter.finish())
+    return "".join(out)
+
+
+def test_filter_matches_clean_response():
+    rng = random.Random(0)  # noqa:S311
+    for _ in range(3000):
+        text = "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 15)))
+        assert _filter_in_chunks(text, rng) == clean_response(text), repr(text)
+
+
+def test_filter_emits_text_before_the_answer_ends():
+    response_filter = ResponseFilter()
+    assert response_filter.feed("<think>plan") == ""
+    assert response_filter.feed("ning</think>\n\nfile.py: ") == "file.py:"
+    assert response_filter.feed("use ```py") == " use "
+    assert response_filter.feed("thon\nx```") == "\nx"
+    assert response_filter.finish() == ""
+
+
+def _chunk(content=None, usage=None):
+    choices = [] if content is None else [SimpleNamespace(delta=SimpleNamespace(content=content))]
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+def test_completion_stream():
+    received: list[str] = []
+    stream = CompletionStream(received.append)
+    for chunk in [
+        _chunk("<think>hm</think>"),
+        _chunk("no "),
+        _chunk("comments"),
+        _chunk(usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5)),
+    ]:
+        stream.add(chunk)
+
+    assert stream.finish() == "no comments"
+    assert "".join(received) == "no comments"
+
+    metrics = stream.metrics("review: a.py", "model")
+    assert metrics.streamed
+    assert metrics.prompt_tokens == 10
+    assert metrics.completion_tokens == 5
+    assert 0 <= metrics.ttft <= metrics.elapsed
@@ -1,13 +1,24 @@
 from typing import Optional
 
+import httpx
+
 from reviewer.agents.review import Reviewer
 from reviewer.agents.sanitizer import Sanitizer
 from reviewer.agents.translator import Translator
 from reviewer.ast_parser.ast_parser import ASTParser
 from reviewer.config.reviewer_config import Configuration, get_configuration
+from reviewer.llm.async_llm import AsyncLLM
+from reviewer.llm.call_metrics import CallMetricsRecorder
+from reviewer.llm.endpoint_pool import EndpointPool
+from reviewer.llm.hedging import Hedger
+from reviewer.llm.http_client import make_http_client
 from reviewer.llm.llm import LLM
+from reviewer.llm.prompt_logger import PromptLogger
+from reviewer.llm.resilience import CircuitBreaker, PrimaryGuard
+from reviewer.llm.response_cache import ResponseCache
 from reviewer.processor.processor import ReviewerProcessor
 from reviewer.processor.review_modes import ReviewModes
+from reviewer.state.review_state import ReviewStateStore
 from reviewer.tokenization.token_counter import TokenCounter
 
 
@@ -15,12 +26,49 @@ class ServiceLocator:
     __reviewer_processor: Optional[ReviewerProcessor] = None
     __configuration: Optional[Configuration] = None
     __llm: Optional[LLM] = None
+    __async_llm: Optional[AsyncLLM] = None
+    __prompt_logger: Optional[PromptLogger] = None
+    __response_cache: Optional[ResponseCache] = None
+    __call_metrics: Optional[CallMetricsRecorder] = None
+    __circuit_breaker: Optional[CircuitBreaker] = None
+    __primary_guard: Optional[PrimaryGuard] = None
+    __hedger: Optional[Hedger] = None
+    __http_client: Optional[httpx.Client] = None
+    __fallback_pool: Optional[EndpointPool] = None
     __reviewer: Optional[Reviewer] = None
     __sanitizer: Optional[Sanitizer] = None
     __translator: Optional[Translator] = None
     __ast_parser: Optional[ASTParser] = None
     __token_counter: Optional[TokenCounter] = None
     __review_modes: Optional[ReviewModes] = None
+    __review_state: Optional[ReviewStateStore] = None
+
+    def __init__(self, configuration: Optional[Configuration] = None):
+        self.__configuration = configuration
+
+    def for_job(self, configuration: Configuration) -> "ServiceLocator":
+        """A locator for one review job that shares the configuration-independent, expensive services."""
+        locator = ServiceLocator(configuration)
+        locator.__token_counter = self.get_token_counter()
+        locator.__ast_parser = self.get_ast_parser()
+        locator.__review_state = self.get_review_state()
+        # the health of the big model outlives a single job
+        locator.__circuit_breaker = self.get_circuit_breaker()
+        return locator
+
+    def warm_up(self) -> None:
+        """Loads the tokenizer and the tree-sitter parsers ahead of the first job."""
+        self.get_token_counter().load()
+        self.get_ast_parser().warm_up()
+
+    def close(self) -> None:
+        """Stops the background event loop of the async LLM clients, closes the connections and the response cache."""
+        if self.__async_llm:
+            self.__async_llm.close()
+        if self.__http_client:
+            self.__http_client.close()
+        if self.__response_cache:
+            self.__response_cache.close()
 
     def get_reviewer_processor(self) -> ReviewerProcessor:
         if not self.__reviewer_processor:
@@ -28,6 +76,12 @@ class ServiceLocator:
                 self.get_configuration(),
                 self.get_translator(),
                 self.get_review_modes(),
+                self.get_review_state(),
+                self.get_response_cache(),
+                self.get_call_metrics(),
+                self.get_primary_guard(),
+                self.get_hedger(),
+                self.get_fallback_pool(),
             )
 
         return self.__reviewer_processor
@@ -46,10 +100,91 @@ class ServiceLocator:
 
     def get_llm(self) -> LLM:
         if not self.__llm:
-            self.__llm = LLM(self.get_configuration())
+            self.__llm = LLM(
+                self.get_configuration(),
+                self.get_prompt_logger(),
+                self.get_response_cache(),
+                self.get_call_metrics(),
+                self.get_primary_guard(),
+                self.get_async_llm() if self.get_hedger() else None,
+                self.get_http_client(),
+                self.get_fallback_pool(),
+            )
 
         return self.__llm
 
+    def get_async_llm(self) -> AsyncLLM:
+        if not self.__async_llm:
+            self.__async_llm = AsyncLLM(
+                self.get_configuration(),
+                self.get_prompt_logger(),
+                self.get_response_cache(),
+                self.get_call_metrics(),
+                self.get_primary_guard(),
+                self.get_hedger(),
+                None,
+                self.get_fallback_pool(),
+            )
+
+        return self.__async_llm
+
+    def get_http_client(self) -> httpx.Client:
+        if not self.__http_client:
+            self.__http_client = make_http_client(self.get_configuration())
+
+        return self.__http_client
+
+    def get_fallback_pool(self) -> EndpointPool:
+        if not self.__fallback_pool:
+            configuration = self.get_configuration()
+            self.__fallback_pool = EndpointPool(configuration.fallback_urls, configuration.fallback_health_interval)
+
+        return self.__fallback_pool
+
+    def get_prompt_logger(self) -> PromptLogger:
+        if not self.__prompt_logger:
+            self.__prompt_logger = PromptLogger()
+
+        return self.__prompt_logger
+
+    def get_call_metrics(self) -> CallMetricsRecorder:
+        if not self.__call_metrics:
+            self.__call_metrics = CallMetricsRecorder()
+
+        return self.__call_metrics
+
+    def get_circuit_breaker(self) -> CircuitBreaker:
+        if not self.__circuit_breaker:
+            config = self.get_configuration()
+            self.__circuit_breaker = CircuitBreaker(config.primary_failure_threshold, config.primary_cooldown)
+
+        return self.__circuit_breaker
+
+    def get_primary_guard(self) -> PrimaryGuard:
+        if not self.__primary_guard:
+            self.__primary_guard = PrimaryGuard(self.get_configuration(), self.get_circuit_breaker())
+
+        return self.__primary_guard
+
+    def get_hedger(self) -> Optional[Hedger]:
+        """None unless calls are hedged with --hedge."""
+        config = self.get_configuration()
+        if not self.__hedger and config.hedge:
+            self.__hedger = Hedger(config.hedge_percentile, config.hedge_delay)
+
+        return self.__hedger
+
+    def get_response_cache(self) -> Optional[ResponseCache]:
+        """None when the cache is bypassed with --no-llm_cache."""
+        config = self.get_configuration()
+        if not self.__response_cache and config.llm_cache:
+            self.__response_cache = ResponseCache(
+                max_bytes=config.llm_cache_max_mb * 1024 * 1024,
+                max_age_seconds=config.llm_cache_max_age_days * 24 * 3600,
+            )
+
+        return self.__response_cache
+
     def get_review_modes(self) -> ReviewModes:
         if not self.__review_modes:
             self.__review_modes = ReviewModes(
@@ -63,13 +198,14 @@ class ServiceLocator:
 
     def get_reviewer(self) -> Reviewer:
         if not self.__reviewer:
-            self.__reviewer = Reviewer(self.get_llm())
+            self.__reviewer = Reviewer(self.get_llm(), self.get_async_llm())
 
         return self.__reviewer
 
     def get_token_counter(self) -> TokenCounter:
         if not self.__token_counter:
-            self.__token_counter = TokenCounter("Qwen/Qwen3-8B")
+            # loaded on the first count, so modes that do not count tokens never load it
+            self.__token_counter = TokenCounter(self.get_configuration().tokenizer, lazy=True)
 
         return self.__token_counter
 
@@ -84,3 +220,9 @@ class ServiceLocator:
             self.__ast_parser = ASTParser()
 
         return self.__ast_parser
+
+    def get_review_state(self) -> ReviewStateStore:
+        if not self.__review_state:
+            self.__review_state = ReviewStateStore()
+
+        return self.__review_state
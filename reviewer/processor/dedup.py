@@ -0,0 +1,115 @@
+import hashlib
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field, replace
+
+from reviewer.system_utils.diff import DiffFile
+
+_HUNK_HEADER = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,\d+)? @@.*$")
+
+# hunks with fewer added and removed lines are too common to stand for the same change
+DEFAULT_MIN_CHANGED_LINES = 3
+
+
+@dataclass
+class DedupResult:
+    diffs: list[DiffFile]
+    # file whose copy of a hunk is reviewed -> files where the same hunk was dropped -> first lines of dropped hunks
+    duplicates: dict[str, dict[str, list[int]]] = field(default_factory=dict)
+
+    def fan_out(self, results: list[str]) -> list[str]:
+        """Appends a note for every hunk that was reviewed as part of another file."""
+        if not self.duplicates:
+            return results
+
+        lines = ["\nidentical changes (reviewed once):"]
+        for reviewed, copies in self.duplicates.items():
+            for copy, first_lines in copies.items():
+                at = ", ".join(str(line) for line in first_lines)
+                lines.append(f"{copy}: the changes at line {at} are the same as in {reviewed}, see its review")
+        return results + ["\n".join(lines)]
+
+
+class HunkDeduper:
+    """Streaming hunk deduplication.
+
+    `observe` registers a file's hunks as files arrive and only keeps 16-byte
+    digests, `reduce` rebuilds a file's diff without the hunks owned by an earlier
+    file. Both can run long after the other files' contents are gone. Hunks with
+    fewer than min_changed_lines added and removed lines are always kept.
+    """
+
+    def __init__(self, min_changed_lines: int = DEFAULT_MIN_CHANGED_LINES):
+        self.__min_changed_lines = min_changed_lines
+        self.__owners: dict[bytes, str] = {}
+        self.duplicates: dict[str, dict[str, list[int]]] = defaultdict(dict)
+
+    def observe(self, diff_file: DiffFile) -> bool:
+        """Registers the hunks of a file; returns False if all of them were already seen in other files."""
+        hunks = split_hunks(diff_file.diff)[1]
+        owns_any = False
+        for hunk in hunks:
+            if not self.__deduplicable(hunk):
+                owns_any = True
+                continue
+            owner = self.__owners.setdefault(_hunk_digest(hunk), diff_file.full_name)
+            if owner == diff_file.full_name:
+                owns_any = True
+            else:
+                self.duplicates[owner].setdefault(diff_file.full_name, []).append(_first_line(hunk))
+        return owns_any or not hunks
+
+    def reduce(self, diff_file: DiffFile) -> DiffFile:
+        header, hunks = split_hunks(diff_file.diff)
+        kept = [
+            hunk
+            for hunk in hunks
+            if not self.__deduplicable(hunk) or self.__owners.get(_hunk_digest(hunk)) == diff_file.full_name
+        ]
+        if len(kept) == len(hunks):
+            return diff_file
+        return replace(diff_file, diff="\n".join([header] + kept))
+
+    def __deduplicable(self, hunk: str) -> bool:
+        changed = sum(1 for line in hunk.split("\n")[1:] if line.startswith(("+", "-")))
+        return changed >= self.__min_changed_lines
+
+    def result(self, diffs: list[DiffFile]) -> DedupResult:
+        return DedupResult(diffs=diffs, duplicates={k: v for k, v in self.duplicates.items() if v})
+
+
+def dedupe_hunks(diffs: list[DiffFile], min_changed_lines: int = DEFAULT_MIN_CHANGED_LINES) -> DedupResult:
+    """Keeps each distinct hunk of at least min_changed_lines changed lines only in the first file that contains it.
+
+    Hunks are compared by a hash of their lines without the `@@` header, so the same
+    edit at different positions in different files (a renamed import, a bumped
+    logger call) is recognized. Files left without hunks are dropped from the review.
+    """
+    deduper = HunkDeduper(min_changed_lines)
+    return deduper.result([deduper.reduce(diff_file) for diff_file in diffs if deduper.observe(diff_file)])
+
+
+def split_hunks(diff: str) -> tuple[str, list[str]]:
+    """Splits a single-file diff into its header and its `@@` hunks."""
+    header: list[str] = []
+    hunks: list[list[str]] = []
+
+    for line in diff.split("\n"):
+        if _HUNK_HEADER.match(line):
+            hunks.append([line])
+        elif hunks:
+            hunks[-1].append(line)
+        else:
+            header.append(line)
+
+    return "\n".join(header), ["\n".join(hunk) for hunk in hunks]
+
+
+def _first_line(hunk: str) -> int:
+    match = _HUNK_HEADER.match(hunk.split("\n", 1)[0])
+    return int(match.group(1)) if match else 0
+
+
+def _hunk_digest(hunk: str) -> bytes:
+    body = hunk.split("\n", 1)[1] if "\n" in hunk else ""
+    return hashlib.blake2b(body.encode("utf-8"), digest_size=16).digest()
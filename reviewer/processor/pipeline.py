@@ -0,0 +1,113 @@
+import os
+import queue
+import threading
+from typing import Any, Callable, Generator, Iterable, Iterator, Sequence
+
+from reviewer.system_utils.diff import DiffFile
+
+# items a stage may run ahead of the stage after it
+DEFAULT_QUEUE_SIZE = 4
+
+_DONE = object()
+
+# seconds a blocked stage waits before it checks whether the pipeline was closed
+_POLL_INTERVAL = 0.1
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def staged(
+    source: Iterable[Any], stages: Sequence[Callable[[Any], Iterable[Any]]], maxsize: int = DEFAULT_QUEUE_SIZE
+) -> Generator[Any, None, None]:
+    """Runs the source and every stage in a thread of its own, connected by bounded queues.
+
+    A stage takes one item of the stage before it and yields any number of items
+    for the next one, so all stages work at the same time and a slow stage holds
+    the ones before it back by at most maxsize items. Items keep their order. An
+    error of the source or of a stage is raised from the returned iterator. Closing
+    the iterator before its end stops the stages and closes the source, e.g. the
+    `git diff` process it reads.
+    """
+    queues: list[queue.Queue] = [queue.Queue(maxsize) for _ in range(len(stages) + 1)]
+    cancelled = threading.Event()
+
+    def start(items: Iterable[Any], output: queue.Queue) -> None:
+        threading.Thread(target=_run, args=(items, output, cancelled), name="pipeline-stage", daemon=True).start()
+
+    start(source, queues[0])
+    for stage, stage_input, stage_output in zip(stages, queues, queues[1:], strict=False):
+        start(_apply(stage, _drain(stage_input, cancelled)), stage_output)
+    return _results(queues[-1], cancelled)
+
+
+def by_final_directory(files: Iterable[DiffFile]) -> Iterator[list[DiffFile]]:
+    """Groups a stream of files in `git diff` order by directory, as soon as a directory is complete.
+
+    git lists paths in sorted order, so all paths under a prefix come one after
+    another: a directory is final once the stream has moved past its prefix. Files
+    at the root are final only at the end. A file that comes after its directory
+    was passed on (git pairs renames out of order) is passed on as a directory of its own.
+    """
+    open_directories: dict[str, list[DiffFile]] = {}
+    for file in files:
+        for directory in [d for d in open_directories if d and not file.full_name.startswith(d + "/")]:
+            yield open_directories.pop(directory)
+        open_directories.setdefault(os.path.dirname(file.full_name), []).append(file)
+    yield from open_directories.values()
+
+
+def _apply(stage: Callable[[Any], Iterable[Any]], items: Iterable[Any]) -> Iterator[Any]:
+    for item in items:
+        yield from stage(item)
+
+
+def _run(items: Iterable[Any], output: queue.Queue, cancelled: threading.Event) -> None:
+    iterator = iter(items)
+    try:
+        for item in iterator:
+            if not _put(output, item, cancelled):
+                return
+        _put(output, _DONE, cancelled)
+    except BaseException as e:
+        _put(output, _Failure(e), cancelled)
+    finally:
+        # a generator is closed by the thread that runs it
+        close = getattr(iterator, "close", None)
+        if close:
+            close()
+
+
+def _put(output: queue.Queue, item: Any, cancelled: threading.Event) -> bool:
+    while not cancelled.is_set():
+        try:
+            output.put(item, timeout=_POLL_INTERVAL)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _drain(stage_output: queue.Queue, cancelled: threading.Event) -> Iterator[Any]:
+    while True:
+        try:
+            item = stage_output.get(timeout=_POLL_INTERVAL)
+        except queue.Empty:
+            if cancelled.is_set():
+                return
+            continue
+        if item is _DONE:
+            return
+        if isinstance(item, _Failure):
+            raise item.error
+        yield item
+
+
+def _results(stage_output: queue.Queue, cancelled: threading.Event) -> Generator[Any, None, None]:
+    try:
+        yield from _drain(stage_output, cancelled)
+    finally:
+        # the consumer is done, possibly early: stages blocked on a full queue stop
+        cancelled.set()
@@ -1,23 +1,80 @@
 import logging
 import os
+from typing import Iterator, Optional
 
 from reviewer.agents.translator import Translator
-from reviewer.config.reviewer_config import Configuration, ReviewMode
+from reviewer.config.reviewer_config import Configuration, ObjectReader, ReviewMode
+from reviewer.llm.call_metrics import CallMetricsRecorder
+from reviewer.llm.endpoint_pool import EndpointPool
+from reviewer.llm.hedging import Hedger
+from reviewer.llm.resilience import PrimaryGuard
+from reviewer.llm.response_cache import ResponseCache
+from reviewer.processor.dedup import DedupResult, HunkDeduper, dedupe_hunks
 from reviewer.processor.review_modes import ReviewModes
-from reviewer.system_utils.diff import DiffFile, diff_master, get_git_diff_files
+from reviewer.processor.stream_output import OrderedStreamWriter
+from reviewer.state.review_state import ReviewStateStore
+from reviewer.system_utils import git, git_objects
+from reviewer.system_utils.diff import (
+    BlobReader,
+    DiffFile,
+    diff_master,
+    fetch_review_refs,
+    get_git_diff_files,
+    get_git_diff_files_incremental,
+    read_master_contents,
+)
+from reviewer.system_utils.diff_parser import parse_unified_diff
+from reviewer.system_utils.diff_store import DiffContentStore
+from reviewer.system_utils.file_classifier import FileClassifier
 
 
 class ReviewerProcessor:
-    def __init__(self, config: Configuration, translator: Translator, review_modes: ReviewModes):
+    def __init__(
+        self,
+        config: Configuration,
+        translator: Translator,
+        review_modes: ReviewModes,
+        review_state: ReviewStateStore,
+        response_cache: Optional[ResponseCache] = None,
+        call_metrics: Optional[CallMetricsRecorder] = None,
+        primary_guard: Optional[PrimaryGuard] = None,
+        hedger: Optional[Hedger] = None,
+        fallback_pool: Optional[EndpointPool] = None,
+    ):
         self.config = config
         self.__translator = translator
         self.__review_modes = review_modes
+        self.__review_state = review_state
+        self.__response_cache = response_cache
+        self.__call_metrics = call_metrics
+        self.__primary_guard = primary_guard
+        self.__hedger = hedger
+        self.__fallback_pool = fallback_pool
+        self.__head = ""
 
     def process_review(self):
         os.chdir(self.config.repo)
-        diff_master(self.config.target_branch)
-        diffs = get_git_diff_files("master", self.config.target_branch)
-        diffs = self.__filter_files_to_review(diffs, self.config)
+        base_ref, target_ref, content_ref = self.__resolve_refs()
+        self.__head = git.rev_parse(target_ref)
+        skipped = self.__classify_files(base_ref, target_ref)
+        since = self.__incremental_base()
+
+        if self.__pipelined(since):
+            self.__process_pipelined(base_ref, target_ref, content_ref, skipped)
+            return
+
+        content_store: Optional[DiffContentStore] = None
+        if self.config.low_memory and not since:
+            content_store, dedup = self.__collect_diffs(base_ref, target_ref, content_ref, skipped)
+        else:
+            diffs = self.__load_diffs(base_ref, target_ref, content_ref, skipped, since)
+            diffs = self.__filter_files_to_review(diffs, self.config)
+            dedup = (
+                dedupe_hunks(diffs, self.config.dedupe_min_changed_lines)
+                if self.config.dedupe_hunks
+                else DedupResult(diffs)
+            )
+        diffs = dedup.diffs
 
         logging.info(
             f"""repo: {self.config.repo}, branch: {self.config.target_branch}
@@ -29,46 +86,232 @@ mode: {self.config.review_mode}"""
         logging.info(f"translate enabled: {self.config.translate_enabled}")
 
         output_results: list[str] = []
+        # reviews are printed while they are generated, unless they are translated first
+        output = OrderedStreamWriter() if self.config.stream and not self.config.translate_enabled else None
+
+        try:
+            if self.config.review_mode == ReviewMode.FileByFile:
+                output_results = self.__review_modes.file_by_file(diffs, content_store, output)
 
-        if self.config.review_mode == ReviewMode.FileByFile:
-            output_results = self.__review_modes.file_by_file(diffs)
+            elif self.config.review_mode == ReviewMode.AllFilesAtOnce:
+                output_results = self.__review_modes.all_files_at_once(diffs, content_store, output)
 
-        elif self.config.review_mode == ReviewMode.AllFilesAtOnce:
-            output_results = self.__review_modes.all_files_at_once(diffs)
+            elif self.config.review_mode == ReviewMode.PackageByPackage:
+                output_results = self.__review_modes.package_by_package(diffs, content_store, output)
 
-        elif self.config.review_mode == ReviewMode.PackageByPackage:
-            output_results = self.__review_modes.package_by_package(diffs)
+            elif self.config.review_mode == ReviewMode.Auto:
+                output_results = self.__review_modes.auto(diffs, content_store, output)
+        finally:
+            if content_store:
+                content_store.close()
 
-        elif self.config.review_mode == ReviewMode.Auto:
-            output_results = self.__review_modes.auto(diffs)
+        self.__finish(dedup, output_results, output)
 
+    def __pipelined(self, since: Optional[str]) -> bool:
+        if not self.config.pipeline:
+            return False
+        if self.config.review_mode != ReviewMode.Auto or self.config.low_memory or since:
+            logging.info("--pipeline applies to full reviews in auto mode, reviewing in stages")
+            return False
+        return True
+
+    def __process_pipelined(
+        self, base_ref: str, target_ref: str, content_ref: Optional[str], skipped: dict[str, str]
+    ) -> None:
+        """Auto mode with files flowing from git through token counting and sanitizing to review (--pipeline)."""
+        logging.info(
+            f"""repo: {self.config.repo}, branch: {self.config.target_branch}
+review_test_files: {self.config.review_test_files}
+mode: {self.config.review_mode}, pipelined"""
+        )
+        logging.info(f"inference provider: {self.config.inference_provider}")
+        logging.info(f"translate enabled: {self.config.translate_enabled}")
+
+        deduper = HunkDeduper(self.config.dedupe_min_changed_lines)
+        master_paths: dict[str, Optional[str]] = {}
+
+        def load(files: list[DiffFile]) -> None:
+            paths = [path for path in (master_paths[f.full_name] for f in files) if path]
+            contents = read_master_contents(paths, content_ref, self.__blob_reader(), self.config.git_workers)
+            for f in files:
+                f.original_content = contents.get(master_paths[f.full_name] or "") or ""
+
+        output = OrderedStreamWriter() if self.config.stream and not self.config.translate_enabled else None
+        files = self.__stream_diffs(base_ref, target_ref, skipped, deduper, master_paths)
+        output_results = self.__review_modes.auto_pipelined(files, load, output)
+        reviewed = "\n".join(master_paths)
+        logging.info(f"files reviewed:\n{reviewed}")
+
+        self.__finish(deduper.result([]), output_results, output)
+
+    def __stream_diffs(
+        self,
+        base_ref: str,
+        target_ref: str,
+        skipped: dict[str, str],
+        deduper: HunkDeduper,
+        master_paths: dict[str, Optional[str]],
+    ) -> Iterator[DiffFile]:
+        """Files of one `git diff` process as they are parsed, without master contents."""
+        for file_diff in parse_unified_diff(git.iter_diff(base_ref, target_ref, skipped)):
+            diff_file = DiffFile(name=os.path.basename(file_diff.path), diff=file_diff.diff, full_name=file_diff.path)
+            if self.__skip_path(diff_file.full_name, self.config):
+                continue
+            if self.config.dedupe_hunks:
+                if not deduper.observe(diff_file):
+                    continue
+                diff_file = deduper.reduce(diff_file)
+            master_paths[diff_file.full_name] = None if file_diff.is_binary else file_diff.old_path
+            yield diff_file
+
+    def __finish(self, dedup: DedupResult, output_results: list[str], output: Optional[OrderedStreamWriter]) -> None:
+        if output_results:
+            output_results = dedup.fan_out(output_results)
         final_output = str.join("\n", output_results)
 
         if self.config.translate_enabled and final_output:
-            print(self.__translator.translate(final_output))
+            if self.config.stream:
+                self.__translator.translate(final_output, on_text=OrderedStreamWriter().channel(0).write)
+                print()
+            else:
+                print(self.__translator.translate(final_output))
         elif final_output:
-            print(final_output)
+            print(final_output.removeprefix(output.text()) if output else final_output)
         else:
             logging.info("No review results to display.")
 
+        if self.__response_cache:
+            self.__response_cache.log_stats()
+        if self.__call_metrics:
+            self.__call_metrics.log_summary()
+            self.__call_metrics.log_usage()
+            if self.config.usage_report:
+                self.__call_metrics.write_usage(self.config.usage_report)
+        if self.__primary_guard:
+            self.__primary_guard.log_stats()
+        if self.__hedger:
+            self.__hedger.log_stats()
+        if self.__fallback_pool:
+            self.__fallback_pool.log_stats()
+
+        self.__review_state.set_last_reviewed(self.config.repo, self.config.target_branch, self.__head)
+
+    def __resolve_refs(self) -> tuple[str, str, Optional[str]]:
+        """Returns the base ref, the target ref and the ref to read master contents from (None for the worktree)."""
+        if self.config.ref_only:
+            base_ref, target_ref = fetch_review_refs(
+                self.config.target_branch, allow_stale_refs=self.config.allow_stale_refs
+            )
+            return base_ref, target_ref, base_ref
+
+        diff_master(self.config.target_branch)
+        return "master", self.config.target_branch, "master" if self.config.git_object_content else None
+
+    def __load_diffs(
+        self,
+        base_ref: str,
+        target_ref: str,
+        content_ref: Optional[str],
+        skipped: dict[str, str],
+        since: Optional[str],
+    ) -> list[DiffFile]:
+        if since:
+            logging.info(f"incremental review of {since[:12]}..{self.__head[:12]}")
+            return get_git_diff_files_incremental(
+                base_ref,
+                since,
+                target_ref,
+                content_ref=content_ref,
+                blob_reader=self.__blob_reader(),
+                workers=self.config.git_workers,
+                exclude=skipped,
+            )
+
+        return get_git_diff_files(
+            base_ref,
+            target_ref,
+            self.config.single_git_diff,
+            content_ref=content_ref,
+            blob_reader=self.__blob_reader(),
+            workers=self.config.git_workers,
+            exclude=skipped,
+        )
+
+    def __collect_diffs(
+        self,
+        base_ref: str,
+        target_ref: str,
+        content_ref: Optional[str],
+        skipped: dict[str, str],
+    ) -> tuple[DiffContentStore, DedupResult]:
+        """Streams the diff once, keeping only file names and hunk digests; contents are loaded per review group."""
+        deduper = HunkDeduper(self.config.dedupe_min_changed_lines)
+
+        def keep(diff_file: DiffFile) -> bool:
+            if self.__skip_path(diff_file.full_name, self.config):
+                return False
+            return not self.config.dedupe_hunks or deduper.observe(diff_file)
+
+        content_store = DiffContentStore(
+            base_ref,
+            target_ref,
+            content_ref=content_ref,
+            blob_reader=self.__blob_reader(),
+            workers=self.config.git_workers,
+            reduce_diff=deduper.reduce if self.config.dedupe_hunks else lambda diff_file: diff_file,
+        )
+        diffs = content_store.collect(exclude=skipped, keep=keep)
+        return content_store, deduper.result(diffs)
+
+    def __classify_files(self, base_ref: str, target_ref: str) -> dict[str, str]:
+        if not self.config.classify_files:
+            return {}
+
+        skipped = FileClassifier().classify(base_ref, target_ref, lambda path: self.__skip_path(path, self.config))
+        for path, reason in sorted(skipped.items()):
+            logging.info(f"skip {path}: {reason}")
+        return skipped
+
+    def __incremental_base(self) -> Optional[str]:
+        if not self.config.incremental:
+            return None
+
+        last_reviewed = self.__review_state.get_last_reviewed(self.config.repo, self.config.target_branch)
+        if not last_reviewed:
+            logging.info("no previous review of this branch, reviewing all changes")
+            return None
+        if not git.is_ancestor(last_reviewed, self.__head):
+            logging.info(f"branch was rewritten since {last_reviewed[:12]}, reviewing all changes")
+            return None
+
+        return last_reviewed
+
+    def __blob_reader(self) -> BlobReader:
+        return {
+            ObjectReader.CatFile: git.read_blobs,
+            ObjectReader.Packfile: git_objects.read_blobs,
+        }[self.config.object_reader]
+
     @staticmethod
     def __filter_files_to_review(src: list[DiffFile], config: Configuration) -> list[DiffFile]:
-        def skip(x: DiffFile) -> bool:
-            return (
-                ".pb." in x.name
-                or "mock" in x.full_name
-                and "smartmock" not in x.full_name
-                or x.full_name.startswith("pkg/")
-                or x.name.endswith("swagger.json")
-                or x.name == "mimir.yaml"
-                or "_test" in x.name
-                and not config.review_test_files  # go tests
-                or "src/api/generated" in x.full_name  # seller-ui generated clients
-                or "framework/data/schemas/" in x.full_name  # python tests
-                or "framework/clients/api_client.py" in x.full_name  # python tests
-                or "pb/" in x.full_name
-                and (x.name.endswith(".py") or x.name.endswith(".pyi"))
-                or x.name in ["go.mod", "go.sum", "poetry.lock", "pyproject.toml"]
-            )
+        return [x for x in src if not ReviewerProcessor.__skip_path(x.full_name, config)]
 
-        return [x for x in src if not skip(x)]
+    @staticmethod
+    def __skip_path(full_name: str, config: Configuration) -> bool:
+        name = os.path.basename(full_name)
+        return (
+            ".pb." in name
+            or "mock" in full_name
+            and "smartmock" not in full_name
+            or full_name.startswith("pkg/")
+            or name.endswith("swagger.json")
+            or name == "mimir.yaml"
+            or "_test" in name
+            and not config.review_test_files  # go tests
+            or "src/api/generated" in full_name  # seller-ui generated clients
+            or "framework/data/schemas/" in full_name  # python tests
+            or "framework/clients/api_client.py" in full_name  # python tests
+            or "pb/" in full_name
+            and (name.endswith(".py") or name.endswith(".pyi"))
+            or name in ["go.mod", "go.sum", "poetry.lock", "pyproject.toml"]
+        )
@@ -1,13 +1,25 @@
+import asyncio
 import logging
 import os
+import threading
 from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import AbstractContextManager, closing, nullcontext
+from typing import Callable, Coroutine, Iterable, Iterator, Optional
 
 from reviewer.agents.review import Reviewer
 from reviewer.agents.sanitizer import Sanitizer
 from reviewer.config.reviewer_config import Configuration
+from reviewer.llm.async_llm import gather_limited
+from reviewer.processor.pipeline import by_final_directory, staged
+from reviewer.processor.stream_output import OrderedStreamWriter, StreamChannel
 from reviewer.system_utils.diff import DiffFile
+from reviewer.system_utils.diff_store import DiffContentStore
 from reviewer.tokenization.token_counter import TokenCounter
 
+# files with fewer tokens are reviewed as they are
+SANITIZE_MIN_TOKENS = 2048
+
 
 class ReviewModes:
     def __init__(
@@ -21,33 +33,105 @@ class ReviewModes:
         self.__reviewer = reviewer
         self.__token_counter = token_counter
         self.__sanitizer = sanitizer
+        # the stages of the pipeline count tokens from different threads
+        self.__count_lock = threading.Lock()
+        self.__overhead_tokens: Optional[int] = None
 
-    def auto(self, diffs: list[DiffFile]) -> list[str]:
-        for _, diffs_in_dir in self.__group_by_directory(diffs).items():
-            for diff in diffs_in_dir:
-                diff.tokens_count = self.__token_counter.count_tokens(diff.original_content + diff.diff)
+    def auto(
+        self,
+        diffs: list[DiffFile],
+        content_store: Optional[DiffContentStore] = None,
+        output: Optional[OrderedStreamWriter] = None,
+    ) -> list[str]:
+        grouped_by_directory = self.__group_by_directory(diffs)
+        if not content_store:
+            self.__count_tokens(diffs)
+        to_sanitize = []
+        for _, diffs_in_dir in grouped_by_directory.items():
+            with self.__loaded(content_store, diffs_in_dir):
+                if content_store:
+                    # contents are only loaded one directory at a time (--low_memory)
+                    self.__count_tokens(diffs_in_dir)
+                for diff in diffs_in_dir:
+                    if not diff.original_content:
+                        continue
+                    if diff.tokens_count < SANITIZE_MIN_TOKENS:
+                        continue
 
-                if not diff.original_content:
-                    continue
-                if diff.tokens_count < 2048:
-                    continue
+                    to_sanitize.append(diff)
 
-                self.__sanitizer.sanitize(diff, diffs_in_dir)
-                diff.tokens_count = self.__token_counter.count_tokens(diff.original_content + diff.diff)
+        for batch in self.__sanitize_batches(to_sanitize, grouped_by_directory):
+            # the diffs of the directories of a batch, as for a single file
+            directories = dict.fromkeys(os.path.dirname(diff.full_name) for diff in batch)
+            related = [diff for directory in directories for diff in grouped_by_directory[directory]]
+            with self.__loaded(content_store, related):
+                self.__sanitizer.sanitize_batch(batch, related)
+                self.__count_tokens(batch)
 
-        if sum(diff.tokens_count for diff in diffs) < self.__config.context_window:
-            return self.all_files_at_once(diffs)
+        if sum(diff.tokens_count for diff in diffs) < self.__context_window():
+            return self.all_files_at_once(diffs, content_store, output)
 
         groups = self.split_by_context_recursive(diffs)
-        result = []
-        for group in groups:
-            result.append(self.__reviewer.review_files(group))
+        return self.__review_concurrently(
+            [self.__review_group(group, content_store, self.__channel(output, i)) for i, group in enumerate(groups)],
+        )
 
-        return result
+    def auto_pipelined(
+        self,
+        files: Iterable[DiffFile],
+        load: Callable[[list[DiffFile]], None],
+        output: Optional[OrderedStreamWriter] = None,
+    ) -> list[str]:
+        """Auto mode as a pipeline that overlaps loading, token counting, sanitizing and reviewing (--pipeline).
+
+        files come in `git diff` order without master contents, load fills them in
+        for one directory. A directory moves on to the next stage as soon as it is
+        final, and a review group is sent to the model as soon as the next directory
+        does not fit into it, so groups are packed in the order of the diff rather
+        than by size.
+        """
+        limit = self.__context_window()
+
+        def load_directory(directory: list[DiffFile]) -> Iterator[list[DiffFile]]:
+            load(directory)
+            yield directory
+
+        stages = [load_directory, self.__count_directory, self.__sanitize_directory]
+        # closed early on an error, so the stage threads and the `git diff` process do not outlive the run
+        with (
+            closing(staged(by_final_directory(files), stages)) as directories,
+            ThreadPoolExecutor(max_workers=self.__config.llm_concurrency) as executor,
+        ):
+            reviews: list[Future[str]] = []
+
+            def dispatch(group: list[DiffFile]) -> None:
+                reviews.append(executor.submit(self.__review_group_now, group, self.__channel(output, len(reviews))))
+
+            group: list[DiffFile] = []
+            group_tokens = 0
+            for directory in directories:
+                # a directory larger than the context window is split into its files, as in split_by_context_recursive
+                directory_tokens = sum(f.tokens_count for f in directory)
+                items = (
+                    [directory] if directory_tokens <= limit else [[f] for f in sorted(directory, key=lambda f: f.name)]
+                )
+                for item in items:
+                    item_tokens = sum(f.tokens_count for f in item)
+                    if item_tokens == 0:
+                        continue
+                    if group and group_tokens + item_tokens > limit:
+                        dispatch(group)
+                        group, group_tokens = [], 0
+                    group.extend(item)
+                    group_tokens += item_tokens
+            if group:
+                dispatch(group)
+
+            return [review.result() for review in reviews]
 
-    def split_by_context_recursive(self, diffs: list[DiffFile]) -> list[list[DiffFile]]:
+    def split_by_context_recursive(self, diffs: list[DiffFile], limit: Optional[int] = None) -> list[list[DiffFile]]:
         """Splits a list of DiffFile objects into sublists (groups) based on token counts
-        and a context window limit.
+        and a context window limit (by default the context window of a review group).
 
         The method tries to keep files from the same directory together if the entire
         directory fits within the context window. If a directory is too large, its files
@@ -61,7 +145,7 @@ class ReviewModes:
             return []
 
         grouped_by_directory = self.__group_by_directory(diffs)
-        limit = self.__config.context_window
+        limit = limit or self.__context_window()
         packable_items = []
 
         type_map = {"dir": 0, "file": 1, "file_oversized": 2}
@@ -140,32 +224,180 @@ class ReviewModes:
 
         return all_groups
 
-    def file_by_file(self, diffs: list[DiffFile]) -> list[str]:
-        result = []
-        for diff_file in diffs:
-            review = self.__reviewer.review_file(diff_file)
-            result.append(review)
-        return result
-
-    def all_files_at_once(self, diffs: list[DiffFile]) -> list[str]:
+    def file_by_file(
+        self,
+        diffs: list[DiffFile],
+        content_store: Optional[DiffContentStore] = None,
+        output: Optional[OrderedStreamWriter] = None,
+    ) -> list[str]:
+        return self.__review_concurrently(
+            [
+                self.__review_group([diff_file], content_store, self.__channel(output, i), single_file=True)
+                for i, diff_file in enumerate(diffs)
+            ],
+        )
+
+    def all_files_at_once(
+        self,
+        diffs: list[DiffFile],
+        content_store: Optional[DiffContentStore] = None,
+        output: Optional[OrderedStreamWriter] = None,
+    ) -> list[str]:
         if diffs:
-            review = self.__reviewer.review_files(diffs)
+            channel = self.__channel(output, 0)
+            with self.__loaded(content_store, diffs):
+                review = self.__reviewer.review_files(
+                    diffs, on_text=channel.write if channel else None, fallback_groups=self.__fallback_groups(diffs)
+                )
+            if channel:
+                channel.close()
             return [review]
         else:
             logging.info("No files to review in AllFilesAtOnce mode.")
             return []
 
-    def package_by_package(self, diffs: list[DiffFile]) -> list[str]:
-        result = []
+    def package_by_package(
+        self,
+        diffs: list[DiffFile],
+        content_store: Optional[DiffContentStore] = None,
+        output: Optional[OrderedStreamWriter] = None,
+    ) -> list[str]:
+        reviews: list[Coroutine[None, None, str]] = []
         grouped_by_directory = self.__group_by_directory(diffs)
         for directory, files_in_dir in grouped_by_directory.items():
             if files_in_dir:
-                review = self.__reviewer.review_files(files_in_dir, directory)
-                result.append(review)
+                channel = self.__channel(output, len(reviews))
+                reviews.append(self.__review_group(files_in_dir, content_store, channel, directory))
             else:
                 logging.info(f"No files to review in package: {directory}")
 
-        return result
+        return self.__review_concurrently(reviews)
+
+    def __count_tokens(self, diffs: list[DiffFile]) -> None:
+        """Counts the tokens of the content and the diff of all files in one batch."""
+        with self.__count_lock:
+            counts = self.__token_counter.count_tokens_batch([diff.original_content + diff.diff for diff in diffs])
+        for diff, count in zip(diffs, counts, strict=True):
+            diff.tokens_count = count
+
+    def __count_directory(self, directory: list[DiffFile]) -> Iterator[list[DiffFile]]:
+        self.__count_tokens(directory)
+        yield directory
+
+    def __sanitize_directory(self, directory: list[DiffFile]) -> Iterator[list[DiffFile]]:
+        to_sanitize = [d for d in directory if d.original_content and d.tokens_count >= SANITIZE_MIN_TOKENS]
+        for batch in self.__sanitize_batches(to_sanitize, {os.path.dirname(directory[0].full_name): directory}):
+            self.__sanitizer.sanitize_batch(batch, directory)
+            self.__count_tokens(batch)
+        yield directory
+
+    def __review_group_now(self, files: list[DiffFile], channel: Optional[StreamChannel]) -> str:
+        try:
+            return self.__reviewer.review_files(
+                files, on_text=channel.write if channel else None, fallback_groups=self.__fallback_groups(files)
+            )
+        finally:
+            if channel:
+                channel.close()
+
+    def __sanitize_batches(
+        self, diffs: list[DiffFile], grouped_by_directory: dict[str, list[DiffFile]]
+    ) -> list[list[DiffFile]]:
+        """Packs files to sanitize in their order into batches of up to sanitize_batch_tokens tokens.
+
+        Besides the files, a batch prompt takes the sanitize instructions and the diffs of every directory
+        of the batch. A file larger than the budget is sanitized on its own; a budget of 0 gives one batch per file.
+        """
+        if not diffs:
+            return []
+
+        directories = list(dict.fromkeys(os.path.dirname(diff.full_name) for diff in diffs))
+        with self.__count_lock:
+            overhead, *diff_tokens = self.__token_counter.count_tokens_batch(
+                [self.__sanitizer.prompt_overhead()]
+                + ["".join(d.diff for d in grouped_by_directory[directory]) for directory in directories]
+            )
+        directory_tokens = dict(zip(directories, diff_tokens, strict=True))
+
+        # a batch is not split when its call falls back, so it has to fit llama.cpp
+        limit = min(self.__config.sanitize_batch_tokens, self.__fallback_window()) - overhead
+        batches: list[list[DiffFile]] = []
+        batch_tokens = 0
+        batch_directories: set[str] = set()
+        for diff in diffs:
+            directory = os.path.dirname(diff.full_name)
+            tokens = diff.tokens_count + (0 if directory in batch_directories else directory_tokens[directory])
+            if batches and batch_tokens + tokens <= limit:
+                batches[-1].append(diff)
+                batch_tokens += tokens
+                batch_directories.add(directory)
+            else:
+                batches.append([diff])
+                batch_tokens = diff.tokens_count + directory_tokens[directory]
+                batch_directories = {directory}
+        return batches
+
+    def __context_window(self) -> int:
+        """Prompt tokens of a review group: --context_window, or what the endpoint can take besides the instructions."""
+        return self.__window(self.__reviewer.context_budget)
+
+    def __fallback_window(self) -> int:
+        """Prompt tokens of a review group that llama.cpp answers when the big model does not."""
+        return self.__window(self.__reviewer.fallback_budget)
+
+    def __window(self, budget: Callable[[], int]) -> int:
+        if self.__config.context_window:
+            return self.__config.context_window
+        with self.__count_lock:
+            if self.__overhead_tokens is None:
+                self.__overhead_tokens = self.__token_counter.count_tokens(self.__reviewer.prompt_overhead())
+        return budget() - self.__overhead_tokens
+
+    def __fallback_groups(self, files: list[DiffFile]) -> Optional[list[list[DiffFile]]]:
+        """The files of a group too large for llama.cpp, split into groups that fit it; None when the group fits."""
+        tokens = sum(f.tokens_count for f in files)
+        # files are counted only in auto mode
+        if not tokens or tokens <= self.__fallback_window():
+            return None
+        return self.split_by_context_recursive(files, self.__fallback_window())
+
+    def __review_concurrently(self, reviews: list[Coroutine[None, None, str]]) -> list[str]:
+        """Runs up to llm_concurrency reviews at a time; results keep the order of reviews."""
+        return self.__reviewer.run(gather_limited(self.__config.llm_concurrency, reviews))
+
+    async def __review_group(
+        self,
+        files: list[DiffFile],
+        content_store: Optional[DiffContentStore],
+        channel: Optional[StreamChannel],
+        name: str = "all files",
+        single_file: bool = False,
+    ) -> str:
+        on_text = channel.write if channel else None
+        try:
+            # contents are loaded only once the review gets its slot (--low_memory), in a thread so that
+            # git does not block the event loop that streams the other reviews
+            if content_store:
+                await asyncio.to_thread(content_store.load, files)
+            try:
+                if single_file:
+                    return await self.__reviewer.review_file_async(files[0], on_text)
+                return await self.__reviewer.review_files_async(files, name, on_text, self.__fallback_groups(files))
+            finally:
+                if content_store:
+                    await asyncio.to_thread(content_store.release, files)
+        finally:
+            if channel:
+                channel.close()
+
+    @staticmethod
+    def __channel(output: Optional[OrderedStreamWriter], index: int) -> Optional[StreamChannel]:
+        return output.channel(index) if output else None
+
+    @staticmethod
+    def __loaded(content_store: Optional[DiffContentStore], files: list[DiffFile]) -> AbstractContextManager:
+        """Loads file contents for the duration of a block when the diff is streamed (--low_memory)."""
+        return content_store.loaded(files) if content_store else nullcontext(files)
 
     @staticmethod
     def __group_by_directory(objects: list[DiffFile]) -> dict[str, list[DiffFile]]:
@@ -0,0 +1,70 @@
+import sys
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable
+
+
+def _write_stdout(text: str) -> None:
+    # looked up on every write, so a redirected stdout (daemon jobs) is honoured
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+
+@dataclass
+class StreamChannel:
+    write: Callable[[str], None]
+    close: Callable[[], None]
+
+
+class OrderedStreamWriter:
+    """Prints the text of concurrently generated reviews as it arrives, in the order of the reviews.
+
+    The first unfinished review is printed live, text of later ones is buffered
+    until every review before them is done. The printed text is the same as
+    joining the finished results with newlines.
+    """
+
+    def __init__(self, write: Callable[[str], None] = _write_stdout):
+        self.__write = write
+        self.__lock = threading.Lock()
+        self.__current = 0
+        self.__started: set[int] = set()
+        self.__closed: set[int] = set()
+        self.__buffers: dict[int, list[str]] = defaultdict(list)
+        self.__printed: list[str] = []
+
+    def channel(self, index: int) -> StreamChannel:
+        return StreamChannel(
+            write=lambda text: self.__write_channel(index, text),
+            close=lambda: self.__close_channel(index),
+        )
+
+    def text(self) -> str:
+        with self.__lock:
+            return "".join(self.__printed)
+
+    def __write_channel(self, index: int, text: str) -> None:
+        if not text:
+            return
+        with self.__lock:
+            if index not in self.__started:
+                self.__started.add(index)
+                if index > 0:
+                    text = "\n" + text
+            if index == self.__current:
+                self.__emit(text)
+            else:
+                self.__buffers[index].append(text)
+
+    def __close_channel(self, index: int) -> None:
+        with self.__lock:
+            self.__closed.add(index)
+            while self.__current in self.__closed:
+                self.__current += 1
+                for text in self.__buffers.pop(self.__current, []):
+                    self.__emit(text)
+
+    def __emit(self, text: str) -> None:
+        self.__printed.append(text)
+        self.__write(text)
@@ -0,0 +1,63 @@
+from reviewer.processor.dedup import dedupe_hunks, split_hunks
+from reviewer.system_utils.diff import DiffFile
+
+LOGGER_HUNK = """ import logging
+-log = logging.getLogger("old")
++log = logging.getLogger(__name__)
++log.setLevel(logging.INFO)
+ """
+
+
+def _diff(full_name: str, *hunks: tuple[int, str]) -> DiffFile:
+    header = f"diff --git a/{full_name} b/{full_name}\n--- a/{full_name}\n+++ b/{full_name}"
+    body = "\n".join(f"@@ -{line},3 +{line},3 @@ def f():\n{hunk}" for line, hunk in hunks)
+    return DiffFile(name=full_name.split("/")[-1], full_name=full_name, diff=f"{header}\n{body}")
+
+
+def test_split_hunks():
+    header, hunks = split_hunks(_diff("a.py", (1, LOGGER_HUNK), (40, "+x = 1")).diff)
+
+    assert header.endswith("+++ b/a.py")
+    assert len(hunks) == 2
+    assert hunks[1] == "@@ -40,3 +40,3 @@ def f():\n+x = 1"
+
+
+def test_dedupe_hunks():
+    a = _diff("pkg/a.py", (1, LOGGER_HUNK), (40, "+x = 1"))
+    b = _diff("pkg/b.py", (7, LOGGER_HUNK))
+    c = _diff("other/c.py", (3, LOGGER_HUNK), (90, "+y = 2"))
+    d = _diff("other/d.py", (5, "+z = 3"))
+
+    result = dedupe_hunks([a, b, c, d])
+
+    assert [f.full_name for f in result.diffs] == ["pkg/a.py", "other/c.py", "other/d.py"]
+    assert result.diffs[0] is a
+    assert result.diffs[2] is d
+    assert "logging" not in result.diffs[1].diff
+    assert "+y = 2" in result.diffs[1].diff
+    assert result.duplicates == {"pkg/a.py": {"pkg/b.py": [7], "other/c.py": [3]}}
+
+    fanned_out = result.fan_out(["review"])
+    assert fanned_out[0] == "review"
+    assert "pkg/b.py: the changes at line 7 are the same as in pkg/a.py" in fanned_out[1]
+    assert "other/c.py: the changes at line 3 are the same as in pkg/a.py" in fanned_out[1]
+    assert "90" not in fanned_out[1]
+
+
+def test_small_hunks_are_kept():
+    a = _diff("a.py", (1, "+}\n+x = 1"))
+    b = _diff("b.py", (5, "+}\n+x = 1"))
+
+    result = dedupe_hunks([a, b])
+
+    assert result.diffs == [a, b]
+    assert result.duplicates == {}
+    assert dedupe_hunks([a, b], min_changed_lines=2).diffs == [a]
+
+
+def test_no_duplicates():
+    a = _diff("a.py", (1, "+a = 1"))
+    result = dedupe_hunks([a])
+
+    assert result.diffs == [a]
+    assert result.fan_out(["review"]) == ["review"]
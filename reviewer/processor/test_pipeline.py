@@ -0,0 +1,149 @@
+import threading
+import unittest
+from unittest.mock import Mock
+
+from reviewer.config.reviewer_config import Configuration
+from reviewer.processor.pipeline import by_final_directory, staged
+from reviewer.processor.review_modes import ReviewModes
+from reviewer.system_utils.diff import DiffFile
+
+
+def _file(full_name: str, content: str = "") -> DiffFile:
+    return DiffFile(name=full_name.rsplit("/", 1)[-1], full_name=full_name, diff="", original_content=content)
+
+
+class TestStaged(unittest.TestCase):
+    def test_items_keep_their_order(self):
+        result = list(staged(range(20), [lambda x: [x, x], lambda x: [x * 10]], maxsize=1))
+        self.assertEqual([x * 10 for x in range(20) for _ in range(2)], result)
+
+    def test_stages_run_in_their_own_threads(self):
+        threads = set()
+
+        def stage(x):
+            threads.add(threading.current_thread().name)
+            yield x
+
+        self.assertEqual([1, 2], list(staged([1, 2], [stage])))
+        self.assertNotIn(threading.current_thread().name, threads)
+
+    def test_error_of_a_stage_is_raised(self):
+        def fail(x):
+            if x == 3:
+                raise ValueError("broken")
+            yield x
+
+        with self.assertRaisesRegex(ValueError, "broken"):
+            list(staged(range(5), [fail]))
+
+    def test_closing_early_stops_the_stages_and_closes_the_source(self):
+        source_closed = threading.Event()
+
+        def source():
+            try:
+                yield from range(1000)
+            finally:
+                source_closed.set()
+
+        results = staged(source(), [lambda x: [x], lambda x: [x]], maxsize=1)
+        self.assertEqual(0, next(results))
+        results.close()
+
+        self.assertTrue(source_closed.wait(timeout=5))
+        for thread in [t for t in threading.enumerate() if t.name == "pipeline-stage"]:
+            thread.join(timeout=5)
+            self.assertFalse(thread.is_alive())
+
+
+class TestByFinalDirectory(unittest.TestCase):
+    def test_directory_is_final_once_the_stream_moves_past_it(self):
+        seen = []
+
+        def files():
+            for name in ["a/b/x.go", "a/b/y.go", "a/c/z.go", "d/w.go", "root.go"]:
+                seen.append(name)
+                yield _file(name)
+
+        groups = []
+        for group in by_final_directory(files()):
+            groups.append(([f.full_name for f in group], len(seen)))
+
+        self.assertEqual(
+            [
+                (["a/b/x.go", "a/b/y.go"], 3),
+                (["a/c/z.go"], 4),
+                (["d/w.go"], 5),
+                (["root.go"], 5),
+            ],
+            groups,
+        )
+
+    def test_late_file_of_a_passed_directory_is_a_group_of_its_own(self):
+        names = [[f.full_name for f in group] for group in by_final_directory(map(_file, ["a/x", "b/y", "a/z"]))]
+        self.assertEqual([["a/x"], ["b/y"], ["a/z"]], names)
+
+
+class TestAutoPipelined(unittest.TestCase):
+    def _review_modes(self, context_window: int) -> tuple[ReviewModes, Mock, Mock]:
+        config = Configuration(repo="", target_branch="", context_window=context_window, llm_concurrency=2)
+        reviewer = Mock()
+        reviewer.review_files.side_effect = lambda files, on_text=None, fallback_groups=None: ",".join(
+            f.full_name for f in files
+        )
+        token_counter = Mock()
+        token_counter.count_tokens_batch.side_effect = lambda texts: [len(text) for text in texts]
+        token_counter.count_tokens.side_effect = len
+        sanitizer = Mock()
+        sanitizer.prompt_overhead.return_value = ""
+        return ReviewModes(config, reviewer, token_counter, sanitizer), reviewer, sanitizer
+
+    def test_groups_are_packed_in_diff_order(self):
+        review_modes, _, _ = self._review_modes(context_window=100)
+        files = [_file("a/x", "x" * 40), _file("a/y", "y" * 40), _file("b/z", "z" * 30), _file("c/w", "w" * 10)]
+        loaded = []
+
+        def load(directory):
+            loaded.append([f.full_name for f in directory])
+
+        result = review_modes.auto_pipelined(files, load)
+
+        self.assertEqual([["a/x", "a/y"], ["b/z"], ["c/w"]], loaded)
+        self.assertEqual(["a/x,a/y", "b/z,c/w"], result)
+
+    def test_endpoint_budget_leaves_room_for_the_instructions(self):
+        review_modes, reviewer, _ = self._review_modes(context_window=0)
+        reviewer.context_budget.return_value = 100
+        reviewer.fallback_budget.return_value = 100
+        reviewer.prompt_overhead.return_value = "i" * 30
+        files = [_file("a/x", "x" * 40), _file("b/y", "y" * 40)]
+
+        self.assertEqual(["a/x", "b/y"], review_modes.auto_pipelined(files, lambda _: None))
+
+    def test_group_too_large_for_the_fallback_is_split_for_it(self):
+        review_modes, reviewer, _ = self._review_modes(context_window=0)
+        reviewer.context_budget.return_value = 200
+        reviewer.fallback_budget.return_value = 100
+        reviewer.prompt_overhead.return_value = ""
+        files = [_file("a/x", "x" * 60), _file("b/y", "y" * 60)]
+
+        self.assertEqual(["a/x,b/y"], review_modes.auto_pipelined(files, lambda _: None))
+        fallback_groups = reviewer.review_files.call_args.kwargs["fallback_groups"]
+        self.assertEqual([["a/x"], ["b/y"]], [[f.full_name for f in group] for group in fallback_groups])
+
+    def test_directory_over_the_window_is_split_into_files(self):
+        review_modes, _, _ = self._review_modes(context_window=100)
+        files = [_file("a/y", "y" * 60), _file("a/x", "x" * 60), _file("b/z", "")]
+
+        self.assertEqual(["a/x", "a/y"], review_modes.auto_pipelined(files, lambda _: None))
+
+    def test_large_files_are_sanitized_with_their_directory(self):
+        review_modes, _, sanitizer = self._review_modes(context_window=100000)
+        large, small = _file("a/large", "x" * 3000), _file("a/small", "y")
+
+        review_modes.auto_pipelined([large, small], lambda _: None)
+
+        sanitizer.sanitize_batch.assert_called_once_with([large], [large, small])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,16 @@
+import asyncio
+import threading
+import time
 import unittest
+from typing import cast
 from unittest.mock import Mock
 
+from reviewer.agents.review import Reviewer
 from reviewer.config.reviewer_config import Configuration
+from reviewer.llm.call_metrics import CallMetrics, CallMetricsRecorder
+from reviewer.llm.llm import LLM
 from reviewer.processor.review_modes import ReviewModes
+from reviewer.processor.stream_output import OrderedStreamWriter
 from reviewer.system_utils.diff import DiffFile
 
 
@@ -205,5 +213,155 @@ class TestSplitByContextRecursive(unittest.TestCase):
         self.assertEqual(self._get_file_names(result), expected_names)
 
 
+class TestAutoSanitizeBatches(unittest.TestCase):
+    def _auto(self, sanitize_batch_tokens: int, overhead: str = "", diff: str = "") -> list[list[str]]:
+        config = Configuration(
+            repo="", target_branch="", context_window=100000, sanitize_batch_tokens=sanitize_batch_tokens
+        )
+        token_counter = Mock()
+        token_counter.count_tokens_batch.side_effect = lambda texts: [len(text) for text in texts]
+        sanitizer = Mock()
+        sanitizer.prompt_overhead.return_value = overhead
+        diffs = [
+            DiffFile(name=f"f{i}.py", full_name=f"dir{i % 3}/f{i}.py", diff=diff, original_content="x" * (3000 + i))
+            for i in range(10)
+        ] + [DiffFile(name="small.py", full_name="dir0/small.py", diff="", original_content="x")]
+
+        ReviewModes(config, Mock(), token_counter, sanitizer).auto(diffs)
+        return [[f.name for f in call.args[0]] for call in sanitizer.sanitize_batch.call_args_list]
+
+    def test_files_are_packed_up_to_the_budget(self):
+        batches = self._auto(sanitize_batch_tokens=12100)
+
+        self.assertEqual([len(batch) for batch in batches], [4, 4, 2])
+        self.assertEqual(sorted(name for batch in batches for name in batch), sorted(f"f{i}.py" for i in range(10)))
+
+    def test_budget_leaves_room_for_the_instructions_and_the_related_diffs(self):
+        # 12100 - 3000 of instructions leave room for 3 files, and f2 no longer fits next to f4 and f7
+        # once the 30 tokens of the diffs of its directory are added to the batch
+        batches = self._auto(sanitize_batch_tokens=12100, overhead="i" * 3000, diff="+" * 10)
+
+        self.assertEqual(
+            batches, [["f0.py", "f3.py", "f6.py"], ["f9.py", "f1.py"], ["f4.py", "f7.py"], ["f2.py", "f5.py", "f8.py"]]
+        )
+
+    def test_zero_budget_sanitizes_file_by_file(self):
+        self.assertEqual(len(self._auto(sanitize_batch_tokens=0)), 10)
+
+
+class TestAutoTokenCounting(unittest.TestCase):
+    def test_all_files_are_counted_in_one_batch(self):
+        token_counter = Mock()
+        token_counter.count_tokens_batch.side_effect = lambda texts: [len(text) for text in texts]
+        reviewer = Mock()
+        reviewer.review_files.return_value = "ok"
+        diffs = [
+            DiffFile(name=f"f{i}.py", full_name=f"dir{i % 3}/f{i}.py", diff="+", original_content="x" * i)
+            for i in range(6)
+        ]
+
+        ReviewModes(
+            Configuration(repo="", target_branch="", context_window=1000), reviewer, token_counter, Mock()
+        ).auto(diffs)
+
+        token_counter.count_tokens_batch.assert_called_once()
+        self.assertEqual([1, 2, 3, 4, 5, 6], [diff.tokens_count for diff in diffs])
+
+
+class TestAutoUsage(unittest.TestCase):
+    def test_usage_of_every_group_is_split_between_its_files(self):
+        call_metrics = CallMetricsRecorder()
+
+        class RecordingLLM:
+            def generate(self, name: str, prompt: str, on_text=None, split=None) -> str:
+                call_metrics.record(CallMetrics(name=name, model="m", streamed=False, elapsed=1.0, prompt_tokens=10))
+                return "ok"
+
+        token_counter = Mock()
+        token_counter.count_tokens_batch.side_effect = lambda texts: [len(text) for text in texts]
+        diffs = [
+            DiffFile(name=f"f{i}.py", full_name=f"dir{i % 2}/f{i}.py", diff="", original_content="x" * 40)
+            for i in range(4)
+        ]
+
+        ReviewModes(
+            Configuration(repo="", target_branch="", context_window=100),
+            Reviewer(cast(LLM, RecordingLLM())),
+            token_counter,
+            Mock(),
+        ).auto(diffs)
+
+        by_target = call_metrics.usage_summary()["by_target"]
+        self.assertEqual({f"review: f{i}.py" for i in range(4)}, set(by_target))
+        self.assertEqual([5, 5, 5, 5], [target["prompt_tokens"] for target in by_target.values()])
+
+
+class SlowLLM:
+    """Answers with the prompt's first file name; earlier calls take longer, so completion order is reversed."""
+
+    def __init__(self, calls: int):
+        self.delays = [0.02 * (calls - i) for i in range(calls)]
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def generate(self, name: str, prompt: str, on_text=None, split=None) -> str:
+        with self.lock:
+            delay = self.delays.pop(0)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(delay)
+        with self.lock:
+            self.in_flight -= 1
+        if on_text:
+            on_text(name)
+        return name
+
+
+class TestConcurrentReviews(unittest.TestCase):
+    def setUp(self):
+        self.config = Configuration(repo="", target_branch="", llm_concurrency=3)
+        self.diffs = [
+            DiffFile(name=f"f{i}.py", full_name=f"dir{i % 2}/f{i}.py", diff="", original_content="") for i in range(6)
+        ]
+
+    def _review_modes(self, llm: SlowLLM) -> ReviewModes:
+        return ReviewModes(self.config, Reviewer(cast(LLM, llm)), Mock(), Mock())
+
+    def test_file_by_file_keeps_order(self):
+        llm = SlowLLM(len(self.diffs))
+        result = self._review_modes(llm).file_by_file(self.diffs)
+
+        self.assertEqual(result, [f"\n{d.name}:review: {d.name}" for d in self.diffs])
+        self.assertEqual(llm.max_in_flight, 3)
+
+    def test_package_by_package_keeps_order(self):
+        llm = SlowLLM(2)
+        result = self._review_modes(llm).package_by_package(self.diffs)
+
+        self.assertEqual(result, ["\ndir0:review: f0.py, f2.py, f4.py", "\ndir1:review: f1.py, f3.py, f5.py"])
+        self.assertEqual(llm.max_in_flight, 2)
+
+    def test_streamed_output_matches_results(self):
+        printed = []
+        llm = SlowLLM(len(self.diffs))
+        result = self._review_modes(llm).file_by_file(self.diffs, output=OrderedStreamWriter(printed.append))
+
+        self.assertEqual("".join(printed), "\n".join(result))
+
+    def test_contents_are_loaded_off_the_event_loop(self):
+        def off_loop(files):
+            with self.assertRaises(RuntimeError):
+                asyncio.get_running_loop()
+
+        content_store = Mock()
+        content_store.load.side_effect = off_loop
+        content_store.release.side_effect = off_loop
+        self._review_modes(SlowLLM(len(self.diffs))).file_by_file(self.diffs, content_store)
+
+        self.assertEqual(len(self.diffs), content_store.load.call_count)
+        self.assertEqual(len(self.diffs), content_store.release.call_count)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,21 @@
+from reviewer.processor.stream_output import OrderedStreamWriter
+
+
+def test_later_channels_wait_for_earlier_ones():
+    printed: list[str] = []
+    writer = OrderedStreamWriter(printed.append)
+    first, second, third = writer.channel(0), writer.channel(1), writer.channel(2)
+
+    third.write("c1")
+    first.write("a1")
+    second.write("b1")
+    assert printed == ["a1"]
+
+    third.close()
+    first.write("a2")
+    first.close()
+    assert printed == ["a1", "a2", "\nb1"]
+
+    second.write("b2")
+    second.close()
+    assert writer.text() == "a1a2\nb1b2\nc1"
@@ -0,0 +1,60 @@
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+def default_state_dir() -> str:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "reviewer")
+
+
+class ReviewStateStore:
+    """Persists the last reviewed head SHA per (repository, branch) in a local JSON file.
+
+    Updates are read-modify-write under an exclusive file lock, so parallel reviews
+    of different branches in the same clone do not lose each other's state.
+    """
+
+    def __init__(self, state_dir: Optional[str] = None):
+        self.__state_dir = state_dir or default_state_dir()
+        self.__path = os.path.join(self.__state_dir, "review_state.json")
+        self.__lock_path = self.__path + ".lock"
+        self.__lock = threading.Lock()
+
+    def get_last_reviewed(self, repo: str, branch: str) -> Optional[str]:
+        with self.__locked():
+            return self.__load().get(self.__key(repo, branch))
+
+    def set_last_reviewed(self, repo: str, branch: str, sha: str) -> None:
+        with self.__locked():
+            state = self.__load()
+            state[self.__key(repo, branch)] = sha
+
+            tmp_path = f"{self.__path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.__path)
+
+    def __load(self) -> dict[str, str]:
+        try:
+            with open(self.__path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    @contextmanager
+    def __locked(self) -> Iterator[None]:
+        os.makedirs(self.__state_dir, exist_ok=True)
+        with self.__lock, open(self.__lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def __key(repo: str, branch: str) -> str:
+        return f"{os.path.realpath(repo)}:{branch}"
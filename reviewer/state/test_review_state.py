@@ -0,0 +1,17 @@
+from reviewer.state.review_state import ReviewStateStore
+
+
+def test_last_reviewed_roundtrip(tmp_path):
+    store = ReviewStateStore(str(tmp_path / "state"))
+    repo = str(tmp_path / "repo")
+
+    assert store.get_last_reviewed(repo, "feature") is None
+
+    store.set_last_reviewed(repo, "feature", "a" * 40)
+    store.set_last_reviewed(repo, "other", "b" * 40)
+    store.set_last_reviewed(repo, "feature", "c" * 40)
+
+    reopened = ReviewStateStore(str(tmp_path / "state"))
+    assert reopened.get_last_reviewed(repo, "feature") == "c" * 40
+    assert reopened.get_last_reviewed(repo, "other") == "b" * 40
+    assert reopened.get_last_reviewed(str(tmp_path / "another-repo"), "feature") is None
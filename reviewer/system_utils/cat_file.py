@@ -0,0 +1,115 @@
+import atexit
+import os
+import subprocess
+import threading
+from typing import IO, Iterable, Optional
+
+# bytes of a skipped payload read from the pipe at a time
+SKIP_CHUNK = 64 * 1024
+
+
+class CatFileBatch:
+    """A long-lived `git cat-file --batch` process.
+
+    Object names are written from a helper thread while the answers are read
+    back, so the whole batch is pipelined through one process instead of one
+    subprocess or one open() per file.
+    """
+
+    def __init__(self, repo: Optional[str] = None):
+        self.__lock = threading.Lock()
+        self.__process = subprocess.Popen(  # noqa:S603
+            ["git", "cat-file", "--batch"],  # noqa:S607
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            cwd=repo,
+            env=os.environ.copy(),
+        )
+
+    def read_blobs(self, ref: str, paths: list[str], limit: Optional[int] = None) -> dict[str, Optional[bytes]]:
+        """Reads `<ref>:<path>` for every path; missing paths and non-blobs map to None.
+
+        With limit only the first limit bytes of each blob are kept; the rest is
+        drained from the pipe in small chunks and never held in memory.
+        """
+        result: dict[str, Optional[bytes]] = {path: None for path in paths}
+        requestable = [path for path in paths if "\n" not in path]
+        if not requestable:
+            return result
+
+        with self.__lock:
+            process = self.__process
+            assert process.stdin is not None
+            assert process.stdout is not None
+
+            writer = threading.Thread(
+                target=self.__write_requests,
+                args=(process.stdin, (f"{ref}:{path}" for path in requestable)),
+                daemon=True,
+            )
+            writer.start()
+            for path in requestable:
+                result[path] = self.__read_object(process.stdout, limit)
+            writer.join()
+
+        return result
+
+    def close(self) -> None:
+        with self.__lock:
+            if self.__process.poll() is not None:
+                return
+            assert self.__process.stdin is not None
+            self.__process.stdin.close()
+            self.__process.wait()
+            assert self.__process.stdout is not None
+            self.__process.stdout.close()
+
+    @staticmethod
+    def __write_requests(stdin: IO[bytes], names: Iterable[str]) -> None:
+        for name in names:
+            stdin.write(name.encode("utf-8") + b"\n")
+        stdin.flush()
+
+    @staticmethod
+    def __read_object(stdout: IO[bytes], limit: Optional[int] = None) -> Optional[bytes]:
+        header = stdout.readline()
+        if not header:
+            raise RuntimeError("git cat-file --batch exited unexpectedly")
+
+        parts = header.rstrip(b"\n").split(b" ")
+        # "<name> missing" / "<name> ambiguous" carry no payload
+        if len(parts) != 3 or not parts[2].isdigit():
+            return None
+
+        _, object_type, size = parts
+        kept = int(size) if limit is None else min(int(size), limit)
+        content = stdout.read(kept)
+        # the rest of the payload and the trailing LF
+        remaining = int(size) - kept + 1
+        while remaining:
+            chunk = stdout.read(min(remaining, SKIP_CHUNK))
+            if not chunk:
+                raise RuntimeError("git cat-file --batch exited unexpectedly")
+            remaining -= len(chunk)
+        return content if object_type == b"blob" else None
+
+
+_instances: dict[str, CatFileBatch] = {}
+_instances_lock = threading.Lock()
+
+
+def get_cat_file(repo: Optional[str] = None) -> CatFileBatch:
+    """Returns the shared `git cat-file --batch` process of a repository, starting it on first use."""
+    key = os.path.realpath(repo or os.getcwd())
+    with _instances_lock:
+        if key not in _instances:
+            _instances[key] = CatFileBatch(key)
+        return _instances[key]
+
+
+@atexit.register
+def close_all() -> None:
+    with _instances_lock:
+        for instance in _instances.values():
+            instance.close()
+        _instances.clear()
@@ -0,0 +1,38 @@
+import subprocess
+
+import pytest
+
+
+def run_git(*args: str) -> str:
+    result = subprocess.run(["git", *args], check=True, capture_output=True, text=True)  # noqa:S603,S607
+    return result.stdout.strip()
+
+
+@pytest.fixture
+def git_repo(tmp_path, monkeypatch):
+    """An empty repository on master with a configured author, used as the working directory."""
+    monkeypatch.chdir(tmp_path)
+    run_git("init", "-q", "-b", "master")
+    run_git("config", "user.email", "test@example.com")
+    run_git("config", "user.name", "test")
+    return tmp_path
+
+
+@pytest.fixture
+def feature_repo(git_repo):
+    """A repository with a `feature` branch that modifies, deletes and adds files; master is checked out."""
+    (git_repo / "pkg").mkdir()
+    (git_repo / "pkg" / "a.py").write_text("a = 1\n")
+    (git_repo / "pkg" / "b.py").write_text("b = 1\n")
+    (git_repo / "c.py").write_text("c = 1\n")
+    run_git("add", "-A")
+    run_git("commit", "-q", "-m", "init")
+
+    run_git("checkout", "-q", "-b", "feature")
+    (git_repo / "pkg" / "a.py").write_text("a = 2\n")
+    (git_repo / "pkg" / "b.py").unlink()
+    (git_repo / "d.py").write_text("d = 1\n")
+    run_git("add", "-A")
+    run_git("commit", "-q", "-m", "change")
+    run_git("checkout", "-q", "master")
+    return git_repo
@@ -1,6 +1,15 @@
+import hashlib
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
+from typing import Callable, Collection, Optional
 
 from . import git, os
+from .diff_parser import FileDiff, parse_unified_diff
+
+# (ref, paths) -> content of every path at ref, None for missing paths
+BlobReader = Callable[[str, list[str]], dict[str, Optional[str]]]
 
 
 @dataclass
@@ -27,32 +36,188 @@ def diff_master(branch: str):
     git.checkout("master")
 
 
-def get_git_diff_files(base_branch: str, target_branch: str) -> list[DiffFile]:
-    changed_files = git.get_changed_files(base_branch, target_branch)
-    diff_files: list[DiffFile] = []
+def fetch_review_refs(
+    branch: str, base_branch: str = "master", remote: str = "origin", allow_stale_refs: bool = False
+) -> tuple[str, str]:
+    """Checkout-free replacement for `diff_master`.
 
-    for changed_file in changed_files:
-        if os.file_exists(changed_file):
+    Fetches only the base and the reviewed branch and returns the refs to diff and
+    read contents from. The working tree and HEAD are never touched. A failed fetch
+    is raised, unless allow_stale_refs accepts whatever local refs there are.
+    """
+    try:
+        git.fetch_branches(remote, [base_branch, branch])
+    except subprocess.CalledProcessError as e:
+        if not allow_stale_refs:
+            raise ValueError(
+                f"could not fetch {branch} from {remote}: the branch does not exist or {remote} is not reachable "
+                "(--allow_stale_refs reviews the local refs instead)"
+            ) from e
+        logging.warning(f"could not fetch {branch} from {remote}, reviewing possibly stale local refs")
+
+    base_ref = f"{remote}/{base_branch}"
+    target_ref = f"{remote}/{branch}"
+    if not git.ref_exists(base_ref):
+        base_ref = base_branch
+    if not git.ref_exists(target_ref):
+        target_ref = branch
+
+    if not git.ref_exists(target_ref):
+        raise ValueError(f"branch {branch} does not exist")
+    if not git.ref_exists(base_ref):
+        raise ValueError(f"branch {base_branch} does not exist")
+
+    return base_ref, target_ref
+
+
+def get_git_diff_files(
+    base_branch: str,
+    target_branch: str,
+    single_diff: bool = False,
+    content_ref: Optional[str] = None,
+    blob_reader: BlobReader = git.read_blobs,
+    workers: int = 1,
+    exclude: Collection[str] = (),
+) -> list[DiffFile]:
+    """Collects the diff and the master content of every changed file.
+
+    With content_ref set the master content is read with blob_reader from the git
+    object store at that ref instead of from the checked out working tree.
+    Up to `workers` file reads and git calls run concurrently; the result keeps the
+    order of `git diff`. Paths in exclude are never read or diffed.
+    """
+    if single_diff:
+        return get_git_diff_files_single(base_branch, target_branch, content_ref, blob_reader, workers, exclude)
+
+    changed_files = [path for path in git.get_changed_files(base_branch, target_branch) if path not in exclude]
+
+    def load(changed_file: str) -> tuple[Optional[str], str]:
+        full_content = None
+        if not content_ref and os.file_exists(changed_file):
             full_content = os.get_file_content(changed_file)
-            file_diff = git.get_file_diff(base_branch, target_branch, changed_file)
-
-            # Создаем Diff и добавляем его в список
-            diff_files.append(
-                DiffFile(
-                    name=os.basename(changed_file),
-                    original_content=full_content,
-                    diff=file_diff,
-                    full_name=changed_file,
-                )
-            )
-        else:
-            file_diff = git.get_file_diff(base_branch, target_branch, changed_file)
-            diff_files.append(
-                DiffFile(
-                    name=os.basename(changed_file),
-                    diff=file_diff,
-                    full_name=changed_file,
-                )
+        return full_content, git.get_file_diff(base_branch, target_branch, changed_file)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        loaded = executor.map(load, changed_files)
+        # the blob batch streams through one process while the pool runs the diffs
+        contents = blob_reader(content_ref, changed_files) if content_ref else {}
+        file_diffs: dict[str, str] = {}
+        for changed_file, (full_content, file_diff) in zip(changed_files, loaded, strict=True):
+            file_diffs[changed_file] = file_diff
+            if full_content is not None:
+                contents[changed_file] = full_content
+
+    contents = _intern_contents(contents)
+    diff_files: list[DiffFile] = []
+    for changed_file in changed_files:
+        # Создаем Diff и добавляем его в список
+        diff_files.append(
+            DiffFile(
+                name=os.basename(changed_file),
+                original_content=contents.get(changed_file) or "",
+                diff=file_diffs[changed_file],
+                full_name=changed_file,
             )
+        )
 
     return diff_files
+
+
+def get_git_diff_files_single(
+    base_branch: str,
+    target_branch: str,
+    content_ref: Optional[str] = None,
+    blob_reader: BlobReader = git.read_blobs,
+    workers: int = 1,
+    exclude: Collection[str] = (),
+) -> list[DiffFile]:
+    """Builds the same list as `get_git_diff_files`, but from one `git diff` process.
+
+    Renamed files keep their master content (read from the old path), binary files
+    are never read.
+    """
+    file_diffs = list(parse_unified_diff(git.iter_diff(base_branch, target_branch, exclude)))
+    master_paths = {f.path: f.old_path for f in file_diffs if not f.is_binary}
+    return _with_master_contents(file_diffs, master_paths, content_ref, blob_reader, workers)
+
+
+def get_git_diff_files_incremental(
+    base_branch: str,
+    since_ref: str,
+    target_branch: str,
+    content_ref: Optional[str] = None,
+    blob_reader: BlobReader = git.read_blobs,
+    workers: int = 1,
+    exclude: Collection[str] = (),
+) -> list[DiffFile]:
+    """Collects only the files that changed between since_ref and target_branch.
+
+    Files are limited to those the branch itself changes relative to base_branch,
+    so changes brought in by merging master into the branch are not reviewed. Each
+    file gets its whole diff against the merge base, as in a full review, so the
+    hunks match the master content the model sees next to them.
+    """
+    branch_files = git.get_changed_files_with_origin(base_branch, target_branch)
+    changed = {path for path in git.get_changed_files_range(since_ref, target_branch) if path in branch_files}
+    if not changed:
+        return []
+
+    # origins of renamed files keep the renames in the diff
+    include = changed | {branch_files[path] or path for path in changed}
+    file_diffs = [
+        f for f in parse_unified_diff(git.iter_diff(base_branch, target_branch, exclude, include)) if f.path in changed
+    ]
+    master_paths = {f.path: branch_files[f.path] for f in file_diffs if not f.is_binary}
+    return _with_master_contents(file_diffs, master_paths, content_ref, blob_reader, workers)
+
+
+def _with_master_contents(
+    file_diffs: list[FileDiff],
+    master_paths: dict[str, Optional[str]],
+    content_ref: Optional[str],
+    blob_reader: BlobReader,
+    workers: int,
+) -> list[DiffFile]:
+    paths = [path for path in master_paths.values() if path]
+    contents = read_master_contents(paths, content_ref, blob_reader, workers)
+
+    return [
+        DiffFile(
+            name=os.basename(file_diff.path),
+            original_content=contents.get(master_paths.get(file_diff.path) or "") or "",
+            diff=file_diff.diff,
+            full_name=file_diff.path,
+        )
+        for file_diff in file_diffs
+    ]
+
+
+def read_master_contents(
+    paths: list[str],
+    content_ref: Optional[str],
+    blob_reader: BlobReader = git.read_blobs,
+    workers: int = 1,
+) -> dict[str, Optional[str]]:
+    """Reads master contents from the object store at content_ref, or from the working tree without it."""
+    if content_ref:
+        contents = blob_reader(content_ref, paths)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            contents = dict(zip(paths, executor.map(_read_worktree_file, paths), strict=True))
+    return _intern_contents(contents)
+
+
+def _read_worktree_file(path: str) -> Optional[str]:
+    return os.get_file_content(path) if os.file_exists(path) else None
+
+
+def _intern_contents(contents: dict[str, Optional[str]]) -> dict[str, Optional[str]]:
+    """Makes byte-identical master blobs share one string object."""
+    by_hash: dict[bytes, str] = {}
+    result: dict[str, Optional[str]] = {}
+    for path, content in contents.items():
+        if content:
+            digest = hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+            content = by_hash.setdefault(digest, content)
+        result[path] = content
+    return result
@@ -0,0 +1,166 @@
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional
+
+DEV_NULL = "/dev/null"
+
+_C_ESCAPES = {
+    "a": "\a",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+    "v": "\v",
+    "\\": "\\",
+    '"': '"',
+}
+
+
+@dataclass
+class FileDiff:
+    """A single file section of a unified `git diff` output."""
+
+    old_path: Optional[str]
+    new_path: Optional[str]
+    diff: str
+    is_new: bool = False
+    is_deleted: bool = False
+    is_rename: bool = False
+    is_binary: bool = False
+
+    @property
+    def path(self) -> str:
+        """Path of the file on the target side, or the removed path for deletions."""
+        return self.new_path or self.old_path or ""
+
+
+def parse_unified_diff(lines: Iterable[str]) -> Iterator[FileDiff]:
+    """Splits a multi-file `git diff` output into per-file sections.
+
+    Lines are consumed lazily, so the parser can sit directly on top of a running
+    `git diff` process and never holds more than one file section in memory.
+    Renames, deletions, additions and binary markers are taken from the extended
+    header lines; the section text matches what `git diff -- <path>` prints for it.
+    """
+    section: list[str] = []
+
+    for line in lines:
+        line = line.rstrip("\n")
+        if line.startswith("diff --git ") and section:
+            yield _parse_section(section)
+            section = []
+        if section or line.startswith("diff --git "):
+            section.append(line)
+
+    if section:
+        yield _parse_section(section)
+
+
+def _parse_section(section: list[str]) -> FileDiff:
+    header_old, header_new = _split_diff_git_header(section[0][len("diff --git ") :])
+    old_path: Optional[str] = header_old
+    new_path: Optional[str] = header_new
+    is_new = is_deleted = is_rename = is_binary = False
+
+    for line in section[1:]:
+        if line.startswith("@@"):
+            break
+        if line.startswith("new file mode"):
+            is_new = True
+        elif line.startswith("deleted file mode"):
+            is_deleted = True
+        elif line.startswith("rename from "):
+            is_rename = True
+            old_path = _unquote(line[len("rename from ") :])
+        elif line.startswith("rename to "):
+            is_rename = True
+            new_path = _unquote(line[len("rename to ") :])
+        elif line.startswith("--- "):
+            old_path = _strip_prefix(line[len("--- ") :], "a/")
+        elif line.startswith("+++ "):
+            new_path = _strip_prefix(line[len("+++ ") :], "b/")
+        elif line.startswith("Binary files ") or line == "GIT binary patch":
+            is_binary = True
+
+    if is_new:
+        old_path = None
+    if is_deleted:
+        new_path = None
+
+    return FileDiff(
+        old_path=old_path,
+        new_path=new_path,
+        diff="\n".join(section).strip(),
+        is_new=is_new,
+        is_deleted=is_deleted,
+        is_rename=is_rename,
+        is_binary=is_binary,
+    )
+
+
+def _strip_prefix(raw: str, prefix: str) -> Optional[str]:
+    # git terminates names containing spaces with a tab in ---/+++ lines
+    raw = raw.rstrip("\t")
+    if raw == DEV_NULL:
+        return None
+    path = _unquote(raw)
+    return path[len(prefix) :] if path.startswith(prefix) else path
+
+
+def _split_diff_git_header(header: str) -> tuple[Optional[str], Optional[str]]:
+    """Extracts both paths from `a/<old> b/<new>`.
+
+    The header is ambiguous for unquoted names with spaces, so it is only a fallback
+    for sections without ---/+++ or rename lines (mode changes, binary files).
+    """
+    if header.startswith('"'):
+        old_raw, rest = _take_quoted(header)
+        rest = rest.lstrip(" ")
+        new_raw = _take_quoted(rest)[0] if rest.startswith('"') else rest
+        return _drop_side_prefix(old_raw, "a/"), _drop_side_prefix(new_raw, "b/")
+
+    if header.endswith('"'):
+        quote_start = header.rfind(' "')
+        old_raw = header[:quote_start]
+        new_raw = _take_quoted(header[quote_start + 1 :])[0]
+        return _drop_side_prefix(old_raw, "a/"), _drop_side_prefix(new_raw, "b/")
+
+    # Unquoted: for unchanged names both halves are equal, which resolves spaces.
+    half = (len(header) - 1) // 2
+    if len(header) % 2 == 1 and header[half] == " " and header[:half][2:] == header[half + 1 :][2:]:
+        return _drop_side_prefix(header[:half], "a/"), _drop_side_prefix(header[half + 1 :], "b/")
+
+    old_raw, _, new_raw = header.partition(" b/")
+    return _drop_side_prefix(old_raw, "a/"), new_raw or None
+
+
+def _drop_side_prefix(path: str, prefix: str) -> str:
+    return path[len(prefix) :] if path.startswith(prefix) else path
+
+
+def _take_quoted(text: str) -> tuple[str, str]:
+    """Returns the C-style quoted string at the beginning of text (unescaped) and the remainder."""
+    result = bytearray()
+    i = 1
+    while i < len(text):
+        char = text[i]
+        if char == '"':
+            return result.decode("utf-8", errors="replace"), text[i + 1 :]
+        if char == "\\" and i + 1 < len(text):
+            nxt = text[i + 1]
+            if nxt in "01234567" and i + 3 < len(text):
+                result.append(int(text[i + 1 : i + 4], 8))
+                i += 4
+                continue
+            result.extend(_C_ESCAPES.get(nxt, nxt).encode("utf-8"))
+            i += 2
+            continue
+        result.extend(char.encode("utf-8"))
+        i += 1
+    return result.decode("utf-8", errors="replace"), ""
+
+
+def _unquote(path: str) -> str:
+    if path.startswith('"') and path.endswith('"') and len(path) >= 2:
+        return _take_quoted(path)[0]
+    return path
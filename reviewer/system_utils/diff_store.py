@@ -0,0 +1,118 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from dataclasses import replace
+from typing import Callable, Collection, Iterator, Optional
+
+from . import git
+from . import os as reviewer_os
+from .diff import BlobReader, DiffFile, read_master_contents
+from .diff_parser import parse_unified_diff
+
+
+class DiffContentStore:
+    """Keeps changed files as content-free `DiffFile` stubs and loads their content on demand.
+
+    `collect` streams one `git diff` and keeps only names; `load` re-reads master
+    content and diffs for a handful of files (one directory, one review group) and
+    `release` drops them again. Content changed while loaded (sanitized master
+    versions) is spilled to a temporary directory instead of being kept in memory.
+    """
+
+    def __init__(
+        self,
+        base_branch: str,
+        target_branch: str,
+        content_ref: Optional[str] = None,
+        blob_reader: BlobReader = git.read_blobs,
+        workers: int = 1,
+        reduce_diff: Callable[[DiffFile], DiffFile] = lambda diff_file: diff_file,
+    ):
+        self.__base_branch = base_branch
+        self.__target_branch = target_branch
+        self.__content_ref = content_ref
+        self.__blob_reader = blob_reader
+        self.__workers = workers
+        self.__reduce_diff = reduce_diff
+
+        self.__master_paths: dict[str, Optional[str]] = {}
+        self.__loaded: dict[str, bytes] = {}
+        self.__spill_dir = tempfile.mkdtemp(prefix="reviewer-")
+
+    def collect(
+        self, exclude: Collection[str] = (), keep: Callable[[DiffFile], bool] = lambda _: True
+    ) -> list[DiffFile]:
+        """Streams the diff once; keep sees every file with its diff before the diff is dropped."""
+        stubs: list[DiffFile] = []
+        for file_diff in parse_unified_diff(git.iter_diff(self.__base_branch, self.__target_branch, exclude)):
+            name = reviewer_os.basename(file_diff.path)
+            if not keep(DiffFile(name=name, diff=file_diff.diff, full_name=file_diff.path)):
+                continue
+            self.__master_paths[file_diff.path] = None if file_diff.is_binary else file_diff.old_path
+            stubs.append(DiffFile(name=name, diff="", full_name=file_diff.path))
+        return stubs
+
+    def load(self, files: list[DiffFile]) -> None:
+        to_load = [f for f in files if f.full_name not in self.__loaded]
+        if not to_load:
+            return
+
+        names = {f.full_name for f in to_load}
+        master_paths = {name: self.__master_paths.get(name) for name in names}
+        pathspecs = names | {path for path in master_paths.values() if path}
+        diffs = {
+            file_diff.path: file_diff.diff
+            for file_diff in parse_unified_diff(
+                git.iter_diff(self.__base_branch, self.__target_branch, include=pathspecs)
+            )
+            if file_diff.path in names
+        }
+
+        spilled = {name: self.__read_spilled(name) for name in names}
+        to_read = [path for name, path in master_paths.items() if path and spilled[name] is None]
+        contents = read_master_contents(to_read, self.__content_ref, self.__blob_reader, self.__workers)
+
+        for f in to_load:
+            master_path = master_paths[f.full_name]
+            content = spilled[f.full_name]
+            if content is None:
+                content = contents.get(master_path) if master_path else None
+            f.original_content = content or ""
+            f.diff = self.__reduce_diff(replace(f, diff=diffs.get(f.full_name, ""))).diff
+            self.__loaded[f.full_name] = self.__digest(f.original_content)
+
+    def release(self, files: list[DiffFile]) -> None:
+        for f in files:
+            digest = self.__loaded.pop(f.full_name, None)
+            if digest is not None and digest != self.__digest(f.original_content):
+                with open(self.__spill_path(f.full_name), "w", encoding="utf-8") as spill:
+                    spill.write(f.original_content)
+            f.original_content = ""
+            f.diff = ""
+
+    @contextmanager
+    def loaded(self, files: list[DiffFile]) -> Iterator[list[DiffFile]]:
+        self.load(files)
+        try:
+            yield files
+        finally:
+            self.release(files)
+
+    def close(self) -> None:
+        shutil.rmtree(self.__spill_dir, ignore_errors=True)
+
+    def __read_spilled(self, full_name: str) -> Optional[str]:
+        try:
+            with open(self.__spill_path(full_name), "r", encoding="utf-8") as spill:
+                return spill.read()
+        except FileNotFoundError:
+            return None
+
+    def __spill_path(self, full_name: str) -> str:
+        return os.path.join(self.__spill_dir, hashlib.blake2b(full_name.encode("utf-8"), digest_size=16).hexdigest())
+
+    @staticmethod
+    def __digest(content: str) -> bytes:
+        return hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
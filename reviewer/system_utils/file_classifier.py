@@ -0,0 +1,182 @@
+import re
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from . import git, os
+
+HEADER_BYTES = 4096
+
+LOCKFILES = {
+    "go.sum",
+    "poetry.lock",
+    "package-lock.json",
+    "npm-shrinkwrap.json",
+    "yarn.lock",
+    "pnpm-lock.yaml",
+    "Cargo.lock",
+    "Gemfile.lock",
+    "composer.lock",
+    "Pipfile.lock",
+    "uv.lock",
+}
+
+VENDORED_DIRECTORIES = ("vendor/", "node_modules/", "third_party/", "bower_components/")
+
+# https://go.dev/s/generatedcode: a line of its own anywhere in the file
+GO_GENERATED_MARKER = re.compile(r"^// Code generated .* DO NOT EDIT\.\r?$", re.MULTILINE)
+
+# other generators, looked for only in the comments a file starts with
+GENERATED_MARKERS = re.compile(
+    r"@generated"
+    r"|Generated by the protocol buffer compiler"
+    r"|This file was automatically generated"
+    r"|Autogenerated by",
+    re.IGNORECASE,
+)
+
+COMMENT_PREFIXES = ("//", "#", "/*", "*", "--", "<!--", ";")
+
+MINIFIED_SUFFIXES = (".min.js", ".min.css", ".min.mjs", ".bundle.js")
+
+
+@dataclass
+class ChangedFileStat:
+    path: str
+    old_path: Optional[str]
+    added: Optional[int]
+    deleted: Optional[int]
+
+    @property
+    def is_binary(self) -> bool:
+        return self.added is None
+
+
+def parse_numstat(output: str) -> list[ChangedFileStat]:
+    """Parses `git diff --numstat -z` output, including the three-field form of renames."""
+    fields = output.split("\0")
+    result: list[ChangedFileStat] = []
+
+    i = 0
+    while i < len(fields) and fields[i]:
+        added, deleted, path = fields[i].split("\t", 2)
+        old_path: Optional[str] = path
+        if not path:
+            old_path, path = fields[i + 1], fields[i + 2]
+            i += 3
+        else:
+            i += 1
+        result.append(
+            ChangedFileStat(
+                path=path,
+                old_path=old_path,
+                added=None if added == "-" else int(added),
+                deleted=None if deleted == "-" else int(deleted),
+            )
+        )
+    return result
+
+
+class FileClassifier:
+    """Decides which changed files are not worth reviewing before their contents are loaded or diffed.
+
+    Only `git diff --numstat`, blob sizes and the first HEADER_BYTES of small files
+    on the target side are looked at: binary markers, lockfiles, vendored
+    directories, `Code generated ... DO NOT EDIT` style headers, minified code and
+    size thresholds. git still sends every sniffed blob through the pipe of
+    `git cat-file`, but only its first HEADER_BYTES are kept and decoded.
+    """
+
+    def __init__(
+        self,
+        max_file_bytes: int = 512 * 1024,
+        max_changed_lines: int = 5000,
+        minified_line_length: int = 1000,
+    ):
+        self.__max_file_bytes = max_file_bytes
+        self.__max_changed_lines = max_changed_lines
+        self.__minified_line_length = minified_line_length
+
+    def classify(
+        self,
+        base_branch: str,
+        target_branch: str,
+        skip_path: Callable[[str], bool] = lambda _: False,
+        read_prefixes: Callable[[str, list[str], int], dict[str, Optional[bytes]]] = git.read_blob_prefixes,
+    ) -> dict[str, str]:
+        """Returns the changed paths to skip, mapped to the reason.
+
+        skip_path adds project-specific rules on top of the built-in ones. For renamed
+        files both the old and the new path are returned, so that excluding them from
+        `git diff` does not turn the rename into a deletion.
+        """
+        stats = parse_numstat(git.get_numstat(base_branch, target_branch))
+        skipped: dict[str, str] = {}
+
+        to_sniff: list[ChangedFileStat] = []
+        for stat in stats:
+            reason = "excluded by review rules" if skip_path(stat.path) else self.__classify_by_stat(stat)
+            if reason:
+                skipped[stat.path] = reason
+            else:
+                to_sniff.append(stat)
+
+        sizes = git.get_blob_sizes(target_branch, [stat.path for stat in to_sniff])
+        small_files: list[str] = []
+        for stat in to_sniff:
+            size = sizes.get(stat.path)
+            if size is None:  # deleted on the branch
+                continue
+            if size > self.__max_file_bytes:
+                skipped[stat.path] = f"file is larger than {self.__max_file_bytes} bytes"
+            else:
+                small_files.append(stat.path)
+
+        for path, header in read_prefixes(target_branch, small_files, HEADER_BYTES).items():
+            reason = self.__classify_by_header(header or b"")
+            if reason:
+                skipped[path] = reason
+
+        for stat in stats:
+            if stat.path in skipped and stat.old_path and stat.old_path != stat.path:
+                skipped.setdefault(stat.old_path, skipped[stat.path])
+
+        return skipped
+
+    def __classify_by_stat(self, stat: ChangedFileStat) -> Optional[str]:
+        name = os.basename(stat.path)
+        if stat.is_binary:
+            return "binary"
+        if name in LOCKFILES:
+            return "lockfile"
+        if any(f"/{directory}" in f"/{stat.path}" for directory in VENDORED_DIRECTORIES):
+            return "vendored"
+        if name.endswith(MINIFIED_SUFFIXES):
+            return "minified"
+        if (stat.added or 0) + (stat.deleted or 0) > self.__max_changed_lines:
+            return f"more than {self.__max_changed_lines} changed lines"
+        return None
+
+    def __classify_by_header(self, header: bytes) -> Optional[str]:
+        if b"\0" in header:
+            return "binary"
+        # the sniff is cut at HEADER_BYTES, so is its last line
+        truncated = len(header) == HEADER_BYTES
+        text = header.decode("utf-8", errors="replace")
+        if GO_GENERATED_MARKER.search(text) or any(GENERATED_MARKERS.search(line) for line in _leading_comments(text)):
+            return "generated"
+
+        lines = text.splitlines()
+        complete_lines = lines[:-1] if truncated else lines
+        if any(len(line) > self.__minified_line_length for line in complete_lines) or (truncated and len(lines) <= 2):
+            return "minified"
+        return None
+
+
+def _leading_comments(text: str) -> list[str]:
+    comments: list[str] = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped and not stripped.startswith(COMMENT_PREFIXES):
+            break
+        comments.append(stripped)
+    return comments
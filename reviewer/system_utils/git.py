@@ -1,5 +1,10 @@
+import fcntl
 import os
 import subprocess
+from contextlib import contextmanager
+from typing import Collection, Iterator, Optional
+
+from .cat_file import get_cat_file
 
 
 def get_local_branches() -> list[str]:
@@ -29,6 +34,33 @@ def pull() -> None:
     run_git_command(["pull", "origin"])
 
 
+def fetch_branches(remote: str, branches: list[str]) -> None:
+    """Fetches exactly the given branches into their remote-tracking refs.
+
+    Parallel reviews in one clone all update the remote-tracking ref of the base
+    branch, and git fails a fetch whose ref another fetch updated meanwhile, so
+    fetches into the same clone take turns, across processes too.
+    """
+    refspecs = [f"+refs/heads/{branch}:refs/remotes/{remote}/{branch}" for branch in branches]
+    with _fetch_lock():
+        run_git_command(["fetch", "--no-write-fetch-head", "--no-tags", remote] + refspecs)
+
+
+@contextmanager
+def _fetch_lock() -> Iterator[None]:
+    path = os.path.join(run_git_command(["rev-parse", "--git-common-dir"]), "reviewer-fetch.lock")
+    with open(path, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def ref_exists(ref: str) -> bool:
+    return git_command_succeeds(["rev-parse", "--verify", "--quiet", f"{ref}^{{commit}}"])
+
+
 def checkout(branch: str) -> None:
     run_git_command(["checkout", branch])
 
@@ -45,6 +77,139 @@ def get_file_diff(base_branch: str, target_branch: str, file_path: str) -> str:
     return run_git_command(command)
 
 
+def read_blobs(ref: str, paths: list[str]) -> dict[str, Optional[str]]:
+    """Reads the contents of paths at ref from the object store, without touching the working tree."""
+    blobs = get_cat_file().read_blobs(ref, paths)
+    return {
+        path: content.decode("utf-8", errors="replace") if content is not None else None
+        for path, content in blobs.items()
+    }
+
+
+def read_blob_prefixes(ref: str, paths: list[str], limit: int) -> dict[str, Optional[bytes]]:
+    """Reads at most the first limit bytes of each path at ref, undecoded, so a prefix cut at the limit shows."""
+    return get_cat_file().read_blobs(ref, paths, limit)
+
+
+def iter_diff(
+    base_branch: str,
+    target_branch: str,
+    exclude: Collection[str] = (),
+    include: Collection[str] = (),
+) -> Iterator[str]:
+    """Streams the full `git diff` between two branches line by line from a single git process."""
+    return iter_git_command(_DIFF_COMMAND + [f"{base_branch}...{target_branch}"] + _pathspecs(include, exclude))
+
+
+def get_changed_files_range(from_ref: str, to_ref: str) -> list[str]:
+    """Paths changed between two commits (`git diff from..to`), both sides of renames included."""
+    result = run_git_command(["diff", "--name-only", "-z", "--no-renames", from_ref, to_ref])
+    return [path for path in result.split("\0") if path]
+
+
+_DIFF_COMMAND = ["-c", "core.quotePath=false", "diff", "--no-color", "--no-ext-diff", "--find-renames"]
+
+
+def _pathspecs(include: Collection[str], exclude: Collection[str]) -> list[str]:
+    if not include and not exclude:
+        return []
+    return (
+        ["--"]
+        + [f":(literal){path}" for path in sorted(include)]
+        + [f":(exclude,literal){path}" for path in sorted(exclude)]
+    )
+
+
+def get_changed_files_with_origin(base_branch: str, target_branch: str) -> dict[str, Optional[str]]:
+    """Maps every path changed on target_branch to its path on base_branch (None for added files)."""
+    command = ["diff", "--name-status", "-z", "--find-renames", f"{base_branch}...{target_branch}"]
+    fields = run_git_command(command).split("\0")
+
+    result: dict[str, Optional[str]] = {}
+    i = 0
+    while i < len(fields) and fields[i]:
+        status = fields[i]
+        if status[0] in "RC":
+            result[fields[i + 2]] = fields[i + 1] if status[0] == "R" else None
+            i += 3
+        else:
+            result[fields[i + 1]] = None if status[0] == "A" else fields[i + 1]
+            i += 2
+    return result
+
+
+def get_numstat(base_branch: str, target_branch: str) -> str:
+    """Raw NUL-separated `git diff --numstat -z` output, parsed by file_classifier."""
+    command = ["diff", "--numstat", "-z", "--find-renames", f"{base_branch}...{target_branch}"]
+    return run_git_command(command)
+
+
+def get_blob_sizes(ref: str, paths: list[str]) -> dict[str, Optional[int]]:
+    """Sizes of paths at ref from one `git cat-file --batch-check` call, without reading any content."""
+    requestable = [path for path in paths if "\n" not in path]
+    result: dict[str, Optional[int]] = {path: None for path in paths}
+    if not requestable:
+        return result
+
+    output = subprocess.run(  # noqa:S603
+        ["git", "cat-file", "--batch-check=%(objecttype) %(objectsize)"],  # noqa:S607
+        input="".join(f"{ref}:{path}\n" for path in requestable),
+        capture_output=True,
+        text=True,
+        check=True,
+        env=os.environ.copy(),
+    ).stdout.splitlines()
+
+    for path, line in zip(requestable, output, strict=True):
+        parts = line.split(" ")
+        if len(parts) == 2 and parts[0] == "blob":
+            result[path] = int(parts[1])
+    return result
+
+
+def rev_parse(ref: str) -> str:
+    return run_git_command(["rev-parse", "--verify", f"{ref}^{{commit}}"])
+
+
+def is_ancestor(ancestor: str, descendant: str) -> bool:
+    return git_command_succeeds(["merge-base", "--is-ancestor", ancestor, descendant])
+
+
+def iter_git_command(command: list[str]) -> Iterator[str]:
+    process = subprocess.Popen(  # noqa:S603
+        ["git"] + command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        encoding="utf-8",
+        errors="replace",
+        env=os.environ.copy(),
+    )
+    assert process.stdout is not None
+    assert process.stderr is not None
+
+    try:
+        yield from process.stdout
+    finally:
+        process.stdout.close()
+        stderr = process.stderr.read()
+        process.stderr.close()
+        return_code = process.wait()
+
+    if return_code != 0:
+        print(f"Ошибка при выполнении команды: git {command} : {stderr}")
+        raise subprocess.CalledProcessError(return_code, ["git"] + command, stderr=stderr)
+
+
+def git_command_succeeds(command: list[str]) -> bool:
+    """Runs a git command used as a predicate; a non-zero exit code is an answer, not an error."""
+    result = subprocess.run(  # noqa:S603
+        ["git"] + command,
+        capture_output=True,
+        env=os.environ.copy(),
+    )
+    return result.returncode == 0
+
+
 def run_git_command(command: list[str]) -> str:
     try:
         result = subprocess.run(  # noqa:S603
@@ -0,0 +1,482 @@
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Optional
+
+from . import git
+
+OBJ_COMMIT = 1
+OBJ_TREE = 2
+OBJ_BLOB = 3
+OBJ_TAG = 4
+OBJ_OFS_DELTA = 6
+OBJ_REF_DELTA = 7
+
+_TYPE_NAMES = {b"commit": OBJ_COMMIT, b"tree": OBJ_TREE, b"blob": OBJ_BLOB, b"tag": OBJ_TAG}
+
+_IDX_MAGIC = b"\377tOc"
+_SHA_SIZE = 20
+_TREE_MODE = b"40000"
+_SUBMODULE_MODE = b"160000"
+
+
+class UnsupportedRepositoryError(Exception):
+    pass
+
+
+class PackIndex:
+    """A memory-mapped version 2 pack index with its pack file."""
+
+    def __init__(self, idx_path: str):
+        self.pack_path = idx_path[: -len(".idx")] + ".pack"
+
+        with open(idx_path, "rb") as f:
+            self.__idx = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(self.pack_path, "rb") as f:
+            self.pack = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.__idx[:4] != _IDX_MAGIC or struct.unpack(">I", self.__idx[4:8])[0] != 2:
+            raise UnsupportedRepositoryError(f"unsupported pack index version: {idx_path}")
+        if self.pack[:4] != b"PACK":
+            raise UnsupportedRepositoryError(f"not a pack file: {self.pack_path}")
+
+        self.__fanout = struct.unpack(">256I", self.__idx[8 : 8 + 256 * 4])
+        self.count = self.__fanout[255]
+        self.__sha_table = 8 + 256 * 4
+        self.__offset_table = self.__sha_table + self.count * (_SHA_SIZE + 4)
+        self.__large_offset_table = self.__offset_table + self.count * 4
+
+    def find(self, oid: bytes) -> Optional[int]:
+        """Returns the pack offset of oid using the fanout table and a binary search over the sorted names."""
+        first = oid[0]
+        lo = self.__fanout[first - 1] if first else 0
+        hi = self.__fanout[first]
+        idx = self.__idx
+        table = self.__sha_table
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = table + mid * _SHA_SIZE
+            current = idx[start : start + _SHA_SIZE]
+            if current < oid:
+                lo = mid + 1
+            elif current > oid:
+                hi = mid
+            else:
+                return self.__offset(mid)
+        return None
+
+    def __offset(self, position: int) -> int:
+        start = self.__offset_table + position * 4
+        offset = struct.unpack(">I", self.__idx[start : start + 4])[0]
+        if offset & 0x80000000:
+            start = self.__large_offset_table + (offset & 0x7FFFFFFF) * 8
+            offset = struct.unpack(">Q", self.__idx[start : start + 8])[0]
+        return offset
+
+    def close(self) -> None:
+        self.__idx.close()
+        self.pack.close()
+
+
+class ObjectStore:
+    """Reads commits, trees and blobs straight from a repository's object database.
+
+    Packs are memory-mapped and searched through their index fanout tables; delta
+    chains are resolved in-process with a small LRU of delta bases, so no git
+    subprocess is started. Repositories using SHA-256 or reftable refs are rejected
+    with UnsupportedRepositoryError.
+    """
+
+    def __init__(self, repo: Optional[str] = None, delta_base_cache_size: int = 256):
+        self.__git_dir, self.__common_dir = self.__find_git_dirs(repo or os.getcwd())
+        self.__object_dirs = self.__find_object_dirs()
+        self.__check_supported()
+
+        self.__lock = threading.RLock()
+        self.__packs: dict[str, PackIndex] = {}
+        self.__delta_bases: OrderedDict[tuple[str, int], tuple[int, bytes]] = OrderedDict()
+        self.__delta_base_cache_size = delta_base_cache_size
+        self.__trees: dict[bytes, dict[bytes, tuple[bytes, bytes]]] = {}
+        self.__load_packs()
+
+    def read_blobs(self, ref: str, paths: list[str]) -> dict[str, Optional[bytes]]:
+        """Reads `<ref>:<path>` for every path; missing paths and non-blobs map to None."""
+        with self.__lock:
+            root_tree = self.__commit_tree(self.resolve_ref(ref))
+            return {path: self.__read_path(root_tree, path) for path in paths}
+
+    def resolve_ref(self, ref: str) -> bytes:
+        """Resolves a full object name or a short ref name the way `git rev-parse` does."""
+        if len(ref) == 40 and all(c in "0123456789abcdef" for c in ref):
+            return bytes.fromhex(ref)
+
+        candidates = [ref] if ref == "HEAD" else []
+        candidates += [
+            f"refs/{ref}",
+            f"refs/tags/{ref}",
+            f"refs/heads/{ref}",
+            f"refs/remotes/{ref}",
+            f"refs/remotes/{ref}/HEAD",
+        ]
+        if ref.startswith("refs/"):
+            candidates.insert(0, ref)
+
+        for name in candidates:
+            oid = self.__read_ref(name)
+            if oid is not None:
+                return oid
+        raise KeyError(f"unknown ref: {ref}")
+
+    def read_object(self, oid: bytes) -> tuple[int, bytes]:
+        with self.__lock:
+            found = self.__find_in_packs(oid)
+            if found is None:
+                loose = self.__read_loose(oid)
+                if loose is not None:
+                    return loose
+                # objects may have been packed or fetched after the packs were mapped
+                self.__load_packs()
+                found = self.__find_in_packs(oid)
+            if found is None:
+                raise KeyError(f"object not found: {oid.hex()}")
+            pack, offset = found
+            return self.__read_packed(pack, offset)
+
+    def close(self) -> None:
+        with self.__lock:
+            for pack in self.__packs.values():
+                pack.close()
+            self.__packs.clear()
+            self.__delta_bases.clear()
+            self.__trees.clear()
+
+    def __read_path(self, root_tree: bytes, path: str) -> Optional[bytes]:
+        oid = root_tree
+        parts = path.encode("utf-8").split(b"/")
+        for i, part in enumerate(parts):
+            entry = self.__tree_entries(oid).get(part)
+            if entry is None:
+                return None
+            mode, oid = entry
+            if mode == _SUBMODULE_MODE:
+                return None
+            is_last = i == len(parts) - 1
+            if (mode == _TREE_MODE) == is_last:
+                return None
+
+        object_type, content = self.read_object(oid)
+        return content if object_type == OBJ_BLOB else None
+
+    def __commit_tree(self, oid: bytes) -> bytes:
+        object_type, content = self.read_object(oid)
+        while object_type == OBJ_TAG:
+            oid = bytes.fromhex(content.split(b"\n", 1)[0].split(b" ")[1].decode())
+            object_type, content = self.read_object(oid)
+        if object_type == OBJ_TREE:
+            return oid
+        if object_type != OBJ_COMMIT:
+            raise KeyError(f"not a commit: {oid.hex()}")
+        return bytes.fromhex(content[5:45].decode())
+
+    def __tree_entries(self, oid: bytes) -> dict[bytes, tuple[bytes, bytes]]:
+        entries = self.__trees.get(oid)
+        if entries is not None:
+            return entries
+
+        object_type, content = self.read_object(oid)
+        if object_type != OBJ_TREE:
+            raise KeyError(f"not a tree: {oid.hex()}")
+
+        entries = {}
+        pos = 0
+        while pos < len(content):
+            space = content.index(b" ", pos)
+            nul = content.index(b"\0", space)
+            entries[content[space + 1 : nul]] = (content[pos:space], content[nul + 1 : nul + 1 + _SHA_SIZE])
+            pos = nul + 1 + _SHA_SIZE
+
+        self.__trees[oid] = entries
+        return entries
+
+    def __find_in_packs(self, oid: bytes) -> Optional[tuple[PackIndex, int]]:
+        for pack in self.__packs.values():
+            offset = pack.find(oid)
+            if offset is not None:
+                return pack, offset
+        return None
+
+    def __read_packed(self, pack: PackIndex, offset: int) -> tuple[int, bytes]:
+        # Walk down to the first non-delta object (or a cached base), then apply deltas back up.
+        deltas: list[tuple[int, bytes]] = []
+        while True:
+            cached = self.__delta_bases.get((pack.pack_path, offset))
+            if cached is not None:
+                self.__delta_bases.move_to_end((pack.pack_path, offset))
+                object_type, content = cached
+                break
+
+            object_type, size, data_start = self.__entry_header(pack.pack, offset)
+            if object_type == OBJ_OFS_DELTA:
+                base_offset, data_start = self.__ofs_delta_base(pack.pack, offset, data_start)
+                deltas.append((offset, self.__inflate(pack.pack, data_start, size)))
+                offset = base_offset
+            elif object_type == OBJ_REF_DELTA:
+                base_oid = bytes(pack.pack[data_start : data_start + _SHA_SIZE])
+                delta = self.__inflate(pack.pack, data_start + _SHA_SIZE, size)
+                object_type, content = self.read_object(base_oid)
+                deltas.append((offset, delta))
+                offset = -1
+                break
+            else:
+                content = self.__inflate(pack.pack, data_start, size)
+                break
+
+        if deltas:
+            if offset >= 0:
+                self.__remember_base(pack.pack_path, offset, object_type, content)
+            for delta_offset, delta in reversed(deltas):
+                content = _apply_delta(content, delta)
+                self.__remember_base(pack.pack_path, delta_offset, object_type, content)
+
+        return object_type, content
+
+    def __remember_base(self, pack_path: str, offset: int, object_type: int, content: bytes) -> None:
+        self.__delta_bases[(pack_path, offset)] = (object_type, content)
+        self.__delta_bases.move_to_end((pack_path, offset))
+        while len(self.__delta_bases) > self.__delta_base_cache_size:
+            self.__delta_bases.popitem(last=False)
+
+    @staticmethod
+    def __entry_header(pack: mmap.mmap, offset: int) -> tuple[int, int, int]:
+        byte = pack[offset]
+        object_type = (byte >> 4) & 0x07
+        size = byte & 0x0F
+        shift = 4
+        offset += 1
+        while byte & 0x80:
+            byte = pack[offset]
+            size |= (byte & 0x7F) << shift
+            shift += 7
+            offset += 1
+        return object_type, size, offset
+
+    @staticmethod
+    def __ofs_delta_base(pack: mmap.mmap, entry_offset: int, pos: int) -> tuple[int, int]:
+        byte = pack[pos]
+        distance = byte & 0x7F
+        pos += 1
+        while byte & 0x80:
+            byte = pack[pos]
+            distance = ((distance + 1) << 7) | (byte & 0x7F)
+            pos += 1
+        return entry_offset - distance, pos
+
+    @staticmethod
+    def __inflate(pack: mmap.mmap, start: int, size: int) -> bytes:
+        decompressor = zlib.decompressobj()
+        view = memoryview(pack)
+        chunk = max(size + 64, 4096)
+        try:
+            result = decompressor.decompress(view[start : start + chunk])
+            start += chunk
+            while not decompressor.eof and start < len(pack):
+                result += decompressor.decompress(view[start : start + chunk])
+                start += chunk
+        finally:
+            view.release()
+        return result
+
+    def __read_loose(self, oid: bytes) -> Optional[tuple[int, bytes]]:
+        name = oid.hex()
+        for objects_dir in self.__object_dirs:
+            path = os.path.join(objects_dir, name[:2], name[2:])
+            try:
+                with open(path, "rb") as f:
+                    raw = zlib.decompress(f.read())
+            except FileNotFoundError:
+                continue
+            header, _, content = raw.partition(b"\0")
+            type_name = header.split(b" ", 1)[0]
+            return _TYPE_NAMES[type_name], content
+        return None
+
+    def __read_ref(self, name: str) -> Optional[bytes]:
+        for _ in range(10):  # symbolic ref depth limit
+            value = self.__read_loose_ref(name)
+            if value is None:
+                return self.__packed_refs().get(name)
+            if value.startswith("ref: "):
+                name = value[len("ref: ") :]
+                continue
+            return bytes.fromhex(value)
+        return None
+
+    def __read_loose_ref(self, name: str) -> Optional[str]:
+        base_dir = self.__git_dir if name == "HEAD" else self.__common_dir
+        try:
+            with open(os.path.join(base_dir, name), "r") as f:
+                return f.read().strip()
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            return None
+
+    def __packed_refs(self) -> dict[str, bytes]:
+        refs: dict[str, bytes] = {}
+        try:
+            with open(os.path.join(self.__common_dir, "packed-refs"), "r") as f:
+                for line in f:
+                    if line.startswith(("#", "^")):
+                        continue
+                    oid, _, name = line.strip().partition(" ")
+                    refs[name] = bytes.fromhex(oid)
+        except FileNotFoundError:
+            pass
+        return refs
+
+    def __load_packs(self) -> None:
+        for objects_dir in self.__object_dirs:
+            pack_dir = os.path.join(objects_dir, "pack")
+            if not os.path.isdir(pack_dir):
+                continue
+            for filename in sorted(os.listdir(pack_dir)):
+                path = os.path.join(pack_dir, filename)
+                if filename.endswith(".idx") and path not in self.__packs:
+                    self.__packs[path] = PackIndex(path)
+
+    def __find_object_dirs(self) -> list[str]:
+        objects_dir = os.path.join(self.__common_dir, "objects")
+        result = [objects_dir]
+        try:
+            with open(os.path.join(objects_dir, "info", "alternates"), "r") as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith("#"):
+                        result.append(os.path.join(objects_dir, line) if not os.path.isabs(line) else line)
+        except FileNotFoundError:
+            pass
+        return result
+
+    def __check_supported(self) -> None:
+        config_path = os.path.join(self.__common_dir, "config")
+        try:
+            with open(config_path, "r") as f:
+                config = f.read().lower()
+        except FileNotFoundError:
+            return
+        if "objectformat = sha256" in config or "refstorage = reftable" in config:
+            raise UnsupportedRepositoryError(f"unsupported repository format: {self.__common_dir}")
+
+    @staticmethod
+    def __find_git_dirs(repo: str) -> tuple[str, str]:
+        path = os.path.abspath(repo)
+        while True:
+            dot_git = os.path.join(path, ".git")
+            if os.path.isdir(dot_git):
+                git_dir = dot_git
+                break
+            if os.path.isfile(dot_git):
+                with open(dot_git, "r") as f:
+                    git_dir = os.path.join(path, f.read().strip()[len("gitdir: ") :])
+                break
+            if os.path.isfile(os.path.join(path, "HEAD")) and os.path.isdir(os.path.join(path, "objects")):
+                git_dir = path  # bare repository
+                break
+            parent = os.path.dirname(path)
+            if parent == path:
+                raise UnsupportedRepositoryError(f"not a git repository: {repo}")
+            path = parent
+
+        common_dir = git_dir
+        try:
+            with open(os.path.join(git_dir, "commondir"), "r") as f:
+                common_dir = os.path.normpath(os.path.join(git_dir, f.read().strip()))
+        except FileNotFoundError:
+            pass
+        return git_dir, common_dir
+
+
+def _apply_delta(base: bytes, delta: bytes) -> bytes:
+    base_size, pos = _read_delta_size(delta, 0)
+    if base_size != len(base):
+        raise ValueError("delta base size mismatch")
+    target_size, pos = _read_delta_size(delta, pos)
+
+    out = bytearray()
+    delta_size = len(delta)
+    while pos < delta_size:
+        opcode = delta[pos]
+        pos += 1
+        if opcode & 0x80:
+            copy_offset = copy_size = 0
+            if opcode & 0x01:
+                copy_offset = delta[pos]
+                pos += 1
+            if opcode & 0x02:
+                copy_offset |= delta[pos] << 8
+                pos += 1
+            if opcode & 0x04:
+                copy_offset |= delta[pos] << 16
+                pos += 1
+            if opcode & 0x08:
+                copy_offset |= delta[pos] << 24
+                pos += 1
+            if opcode & 0x10:
+                copy_size = delta[pos]
+                pos += 1
+            if opcode & 0x20:
+                copy_size |= delta[pos] << 8
+                pos += 1
+            if opcode & 0x40:
+                copy_size |= delta[pos] << 16
+                pos += 1
+            out += base[copy_offset : copy_offset + (copy_size or 0x10000)]
+        elif opcode:
+            out += delta[pos : pos + opcode]
+            pos += opcode
+        else:
+            raise ValueError("invalid delta opcode")
+
+    if len(out) != target_size:
+        raise ValueError("delta target size mismatch")
+    return bytes(out)
+
+
+def _read_delta_size(delta: bytes, pos: int) -> tuple[int, int]:
+    size = shift = 0
+    while True:
+        byte = delta[pos]
+        pos += 1
+        size |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return size, pos
+
+
+_stores: dict[str, ObjectStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_object_store(repo: Optional[str] = None) -> ObjectStore:
+    key = os.path.realpath(repo or os.getcwd())
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = ObjectStore(key)
+        return _stores[key]
+
+
+def read_blobs(ref: str, paths: list[str]) -> dict[str, Optional[str]]:
+    """In-process drop-in for `git.read_blobs`; falls back to `git cat-file` for unsupported repositories."""
+    try:
+        blobs = get_object_store().read_blobs(ref, paths)
+    except (UnsupportedRepositoryError, KeyError) as e:
+        logging.warning(f"in-process object reader unavailable ({e}), using git cat-file")
+        return git.read_blobs(ref, paths)
+
+    return {
+        path: content.decode("utf-8", errors="replace") if content is not None else None
+        for path, content in blobs.items()
+    }
@@ -0,0 +1,45 @@
+from reviewer.system_utils.cat_file import CatFileBatch
+from reviewer.system_utils.conftest import run_git
+from reviewer.system_utils.diff import get_git_diff_files
+
+
+def test_read_blobs(feature_repo):
+    cat_file = CatFileBatch()
+    try:
+        blobs = cat_file.read_blobs("feature", ["pkg/a.py", "d.py", "pkg/b.py", "pkg", "bad\nname"])
+        assert blobs == {
+            "pkg/a.py": b"a = 2\n",
+            "d.py": b"d = 1\n",
+            "pkg/b.py": None,
+            "pkg": None,
+            "bad\nname": None,
+        }
+
+        # the process stays alive between batches
+        assert cat_file.read_blobs("master", ["pkg/b.py"]) == {"pkg/b.py": b"b = 1\n"}
+    finally:
+        cat_file.close()
+
+
+def test_read_blob_prefixes(feature_repo):
+    cat_file = CatFileBatch()
+    try:
+        assert cat_file.read_blobs("feature", ["pkg/a.py", "pkg/b.py", "d.py"], limit=3) == {
+            "pkg/a.py": b"a =",
+            "pkg/b.py": None,
+            "d.py": b"d =",
+        }
+        # the skipped rest of each blob does not leak into the next batch
+        assert cat_file.read_blobs("feature", ["d.py"]) == {"d.py": b"d = 1\n"}
+    finally:
+        cat_file.close()
+
+
+def test_content_ref_does_not_need_checkout(feature_repo):
+    from_worktree = get_git_diff_files("master", "feature", single_diff=True)
+
+    run_git("checkout", "-q", "feature")
+    from_objects = get_git_diff_files("master", "feature", single_diff=True, content_ref="master")
+
+    assert from_objects == from_worktree
+    assert [d.original_content for d in from_objects] == ["", "a = 1\n", "b = 1\n"]
@@ -0,0 +1,96 @@
+import pytest
+
+from reviewer.system_utils.conftest import run_git
+from reviewer.system_utils.diff import fetch_review_refs, get_git_diff_files, get_git_diff_files_incremental
+
+
+@pytest.fixture
+def clone(feature_repo, tmp_path_factory, monkeypatch):
+    clone_dir = tmp_path_factory.mktemp("clone")
+    run_git("clone", "-q", "--single-branch", "--branch", "master", str(feature_repo), str(clone_dir))
+    monkeypatch.chdir(clone_dir)
+    return clone_dir
+
+
+def test_fetch_review_refs_does_not_checkout(clone):
+    head_before = run_git("rev-parse", "HEAD")
+
+    base_ref, target_ref = fetch_review_refs("feature")
+
+    assert (base_ref, target_ref) == ("origin/master", "origin/feature")
+    assert run_git("rev-parse", "HEAD") == head_before
+    assert run_git("status", "--porcelain") == ""
+
+    diffs = get_git_diff_files(base_ref, target_ref, single_diff=True, content_ref=base_ref)
+    assert [d.full_name for d in diffs] == ["d.py", "pkg/a.py", "pkg/b.py"]
+    assert diffs[1].original_content == "a = 1\n"
+
+
+def test_fetch_review_refs_unknown_branch(clone):
+    with pytest.raises(ValueError, match="does not exist"):
+        fetch_review_refs("no-such-branch")
+
+
+def test_fetch_review_refs_failed_fetch(clone):
+    run_git("remote", "set-url", "origin", str(clone / "no-such-remote"))
+
+    with pytest.raises(ValueError, match="could not fetch master"):
+        fetch_review_refs("master")
+
+    assert fetch_review_refs("master", allow_stale_refs=True) == ("origin/master", "origin/master")
+
+
+@pytest.mark.parametrize("single_diff", [False, True])
+@pytest.mark.parametrize("content_ref", [None, "master"])
+def test_parallel_loading_keeps_order(feature_repo, single_diff, content_ref):
+    serial = get_git_diff_files("master", "feature", single_diff, content_ref=content_ref, workers=1)
+    parallel = get_git_diff_files("master", "feature", single_diff, content_ref=content_ref, workers=4)
+
+    assert parallel == serial
+    assert [d.full_name for d in parallel] == ["d.py", "pkg/a.py", "pkg/b.py"]
+
+
+def test_incremental_diff_contains_only_changed_files(feature_repo):
+    reviewed_head = run_git("rev-parse", "feature")
+
+    run_git("checkout", "-q", "feature")
+    (feature_repo / "pkg" / "a.py").write_text("a = 2\nb = 3\n")
+    (feature_repo / "e.py").write_text("e = 1\n")
+    run_git("add", "-A")
+    run_git("commit", "-q", "-m", "more")
+    run_git("checkout", "-q", "master")
+
+    diffs = get_git_diff_files_incremental("master", reviewed_head, "feature", content_ref="master")
+
+    assert [d.full_name for d in diffs] == ["e.py", "pkg/a.py"]
+    # the whole diff against master, which matches the master content next to it
+    assert "+b = 3" in diffs[1].diff
+    assert "+a = 2" in diffs[1].diff
+    assert diffs[1].original_content == "a = 1\n"
+    assert diffs[0].original_content == ""
+
+
+def test_incremental_diff_skips_changes_merged_from_master(feature_repo):
+    (feature_repo / "c.py").write_text("c = 1\n\n\n\n\nx = 1\n")
+    run_git("commit", "-q", "-am", "longer c")
+    run_git("checkout", "-q", "feature")
+    run_git("merge", "-q", "master")
+    (feature_repo / "c.py").write_text("c = 1\n\n\n\n\nx = 2\n")
+    run_git("commit", "-q", "-am", "x")
+    reviewed_head = run_git("rev-parse", "feature")
+
+    run_git("checkout", "-q", "master")
+    (feature_repo / "c.py").write_text("c = 2\n\n\n\n\nx = 1\n")
+    run_git("commit", "-q", "-am", "c on master")
+    run_git("checkout", "-q", "feature")
+    run_git("merge", "-q", "--no-edit", "master")
+    (feature_repo / "e.py").write_text("e = 1\n")
+    run_git("add", "-A")
+    run_git("commit", "-q", "-m", "e")
+    run_git("checkout", "-q", "master")
+
+    diffs = get_git_diff_files_incremental("master", reviewed_head, "feature", content_ref="master")
+
+    assert [d.full_name for d in diffs] == ["c.py", "e.py"]
+    assert "+c = 2" not in diffs[0].diff
+    assert "+x = 2" in diffs[0].diff
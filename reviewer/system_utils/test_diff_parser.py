@@ -0,0 +1,89 @@
+from reviewer.system_utils.diff import get_git_diff_files
+from reviewer.system_utils.diff_parser import parse_unified_diff
+
+DIFF_OUTPUT = """diff --git a/app/main.py b/app/main.py
+index 1111111..2222222 100644
+--- a/app/main.py
++++ b/app/main.py
+@@ -1,2 +1,2 @@
+-print("old")
++print("new")
+ x = 1
+diff --git a/old name.py b/new name.py
+similarity index 90%
+rename from old name.py
+rename to new name.py
+index 3333333..4444444 100644
+--- a/old name.py\t
++++ b/new name.py\t
+@@ -1 +1 @@
+--- a comment that looks like a header
++++ another one
+diff --git a/removed.go b/removed.go
+deleted file mode 100644
+index 5555555..0000000
+--- a/removed.go
++++ /dev/null
+@@ -1 +0,0 @@
+-package removed
+diff --git a/added.go b/added.go
+new file mode 100644
+index 0000000..6666666
+--- /dev/null
++++ b/added.go
+@@ -0,0 +1 @@
++package added
+diff --git a/logo.png b/logo.png
+index 7777777..8888888 100644
+Binary files a/logo.png and b/logo.png differ
+diff --git "a/caf\\303\\251.txt" "b/caf\\303\\251.txt"
+old mode 100644
+new mode 100755
+"""
+
+
+def test_parse_unified_diff():
+    files = list(parse_unified_diff(DIFF_OUTPUT.splitlines(keepends=True)))
+
+    assert [f.path for f in files] == [
+        "app/main.py",
+        "new name.py",
+        "removed.go",
+        "added.go",
+        "logo.png",
+        "café.txt",
+    ]
+
+    modified, renamed, deleted, added, binary, mode_only = files
+
+    assert modified.old_path == "app/main.py"
+    assert modified.diff.startswith("diff --git a/app/main.py")
+    assert modified.diff.endswith(" x = 1")
+
+    assert renamed.is_rename
+    assert renamed.old_path == "old name.py"
+    assert renamed.diff.endswith("+++ another one")
+
+    assert deleted.is_deleted
+    assert deleted.old_path == "removed.go"
+    assert deleted.new_path is None
+
+    assert added.is_new
+    assert added.old_path is None
+
+    assert binary.is_binary
+    assert binary.old_path == "logo.png"
+
+    assert mode_only.old_path == "café.txt"
+    assert not any([mode_only.is_new, mode_only.is_deleted, mode_only.is_rename, mode_only.is_binary])
+
+
+def test_parse_unified_diff_empty():
+    assert list(parse_unified_diff([])) == []
+
+
+def test_single_diff_matches_per_file_diff(feature_repo):
+    per_file = get_git_diff_files("master", "feature", single_diff=False)
+    single = get_git_diff_files("master", "feature", single_diff=True)
+
+    assert single == per_file
@@ -0,0 +1,31 @@
+from reviewer.system_utils.diff import get_git_diff_files
+from reviewer.system_utils.diff_store import DiffContentStore
+
+
+def test_load_matches_eager_diff(feature_repo):
+    store = DiffContentStore("master", "feature", content_ref="master")
+    stubs = store.collect()
+
+    assert [f.full_name for f in stubs] == ["d.py", "pkg/a.py", "pkg/b.py"]
+    assert all(not f.diff and not f.original_content for f in stubs)
+
+    with store.loaded(stubs):
+        assert stubs == get_git_diff_files("master", "feature", single_diff=True, content_ref="master")
+
+    assert all(not f.diff and not f.original_content for f in stubs)
+    store.close()
+
+
+def test_release_spills_changed_content(feature_repo):
+    store = DiffContentStore("master", "feature", content_ref="master")
+    stubs = store.collect(keep=lambda f: f.full_name == "pkg/a.py")
+    assert [f.full_name for f in stubs] == ["pkg/a.py"]
+
+    with store.loaded(stubs):
+        assert stubs[0].original_content == "a = 1\n"
+        stubs[0].original_content = "a = ...\n"
+
+    with store.loaded(stubs):
+        assert stubs[0].original_content == "a = ...\n"
+        assert "+a = 2" in stubs[0].diff
+    store.close()
@@ -0,0 +1,91 @@
+from reviewer.system_utils.conftest import run_git
+from reviewer.system_utils.diff import get_git_diff_files
+from reviewer.system_utils.file_classifier import FileClassifier, parse_numstat
+
+
+def test_parse_numstat():
+    output = "1\t2\tsrc/a.py\0-\t-\tlogo.png\x000\t0\t\0old.py\0new.py\0"
+
+    stats = parse_numstat(output)
+
+    assert [(s.path, s.old_path, s.added, s.deleted, s.is_binary) for s in stats] == [
+        ("src/a.py", "src/a.py", 1, 2, False),
+        ("logo.png", "logo.png", None, None, True),
+        ("new.py", "old.py", 0, 0, False),
+    ]
+
+
+def test_classify(git_repo):
+    (git_repo / "moved.go").write_text("package moved\n\nfunc Moved() {}\n" * 20)
+    (git_repo / "removed.go").write_text("package removed\n")
+    run_git("add", "-A")
+    run_git("commit", "-q", "-m", "init")
+
+    run_git("checkout", "-q", "-b", "feature")
+    (git_repo / "vendor").mkdir()
+    run_git("mv", "moved.go", "vendor/moved.go")
+    (git_repo / "removed.go").unlink()
+    (git_repo / "service.go").write_text("package service\n\nfunc Serve() {}\n")
+    (git_repo / "service.pb.go").write_text("// Code generated by protoc-gen-go. DO NOT EDIT.\npackage service\n")
+    (git_repo / "yarn.lock").write_text("lock\n")
+    (git_repo / "app.min.js").write_text("var a=1;\n")
+    (git_repo / "bundle.js").write_text("var a=1;" * 500 + "\n")
+    (git_repo / "logo.png").write_bytes(b"\x89PNG\r\n\x1a\n\0\0\0")
+    (git_repo / "long_line.js").write_text("x" * 1500 + "\n")
+    (git_repo / "huge.sql").write_text("select 1;\n" * 300)
+    (git_repo / "skipped_by_rule.yaml").write_text("a: 1\n")
+    run_git("add", "-A")
+    run_git("commit", "-q", "-m", "change")
+
+    skipped = FileClassifier(max_file_bytes=2048).classify("master", "feature", lambda path: path.endswith(".yaml"))
+
+    assert skipped == {
+        "vendor/moved.go": "vendored",
+        "moved.go": "vendored",
+        "service.pb.go": "generated",
+        "yarn.lock": "lockfile",
+        "app.min.js": "minified",
+        "bundle.js": "file is larger than 2048 bytes",
+        "long_line.js": "minified",
+        "logo.png": "binary",
+        "huge.sql": "file is larger than 2048 bytes",
+        "skipped_by_rule.yaml": "excluded by review rules",
+    }
+
+    for single_diff in (False, True):
+        diffs = get_git_diff_files("master", "feature", single_diff, content_ref="master", exclude=skipped)
+        assert [d.full_name for d in diffs] == ["removed.go", "service.go"]
+
+
+def test_generated_markers_only_in_header_comments(git_repo):
+    run_git("commit", "-q", "--allow-empty", "-m", "init")
+    run_git("checkout", "-q", "-b", "feature")
+    generated = {
+        "api_pb2.py": "# -*- coding: utf-8 -*-\n# Generated by the protocol buffer compiler.  DO NOT EDIT!\nimport a\n",
+        "schema.js": "/**\n * @generated\n */\nexport const a = 1;\n",
+        "stringer.go": "// +build linux\n\npackage a\n\n// Code generated by stringer. DO NOT EDIT.\n",
+    }
+    written = {
+        "generator.go": 'package gen\n\nconst header = "// Code generated by gen. DO NOT EDIT."\n',
+        "docstring.py": '"""Marks the output @generated, as Autogenerated by tools do."""\n',
+        "comment.py": "import a\n\n# This file was automatically generated once, now it is edited by hand\n",
+        "lowercase.go": "// code generated by hand. do not edit.\npackage a\n",
+    }
+    for name, content in {**generated, **written}.items():
+        (git_repo / name).write_text(content)
+    run_git("add", "-A")
+    run_git("commit", "-q", "-m", "change")
+
+    assert FileClassifier().classify("master", "feature") == dict.fromkeys(generated, "generated")
+
+
+def test_sniff_cut_inside_multibyte_text(git_repo):
+    run_git("commit", "-q", "--allow-empty", "-m", "init")
+    run_git("checkout", "-q", "-b", "feature")
+    # two lines of short text, but more than HEADER_BYTES bytes of it
+    (git_repo / "bundle.js").write_text(f"var a='{'中' * 900}';\nvar b='{'中' * 900}';\n", encoding="utf-8")
+    (git_repo / "notes.txt").write_text("заметка\n" * 400, encoding="utf-8")
+    run_git("add", "-A")
+    run_git("commit", "-q", "-m", "change")
+
+    assert FileClassifier().classify("master", "feature") == {"bundle.js": "minified"}
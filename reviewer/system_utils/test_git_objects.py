@@ -0,0 +1,60 @@
+import pytest
+
+from reviewer.system_utils.cat_file import CatFileBatch
+from reviewer.system_utils.conftest import run_git
+from reviewer.system_utils.git_objects import ObjectStore, UnsupportedRepositoryError, _apply_delta
+
+
+@pytest.fixture
+def history_repo(git_repo):
+    """A repository whose files change slightly over many commits, repacked so that most blobs are deltas."""
+    (git_repo / "pkg").mkdir()
+    for revision in range(8):
+        for i in range(5):
+            lines = [f"line {n} of file {i}" for n in range(300)]
+            lines[revision * 10] = f"changed in revision {revision}"
+            (git_repo / "pkg" / f"file_{i}.txt").write_text("\n".join(lines) + "\n")
+        run_git("add", "-A")
+        run_git("commit", "-q", "-m", f"revision {revision}")
+        run_git("tag", f"v{revision}")
+    run_git("tag", "-a", "annotated", "-m", "annotated tag", "v3")
+
+    run_git("repack", "-a", "-d", "-f", "-q", "--window=50", "--depth=50")
+    run_git("pack-refs", "--all")
+
+    # a loose object on top of the packs
+    (git_repo / "loose.txt").write_text("loose\n")
+    run_git("add", "-A")
+    run_git("commit", "-q", "-m", "loose")
+    return git_repo
+
+
+def test_read_blobs_matches_cat_file(history_repo):
+    assert "chain length" in run_git("verify-pack", "-v", *map(str, history_repo.glob(".git/objects/pack/*.idx")))
+
+    paths = [f"pkg/file_{i}.txt" for i in range(5)] + ["loose.txt", "pkg", "missing.txt", "pkg/file_0.txt/x"]
+    store = ObjectStore(delta_base_cache_size=4)
+    cat_file = CatFileBatch()
+    try:
+        for ref in ["master", "HEAD", "v0", "v5", "annotated", "refs/tags/v7", run_git("rev-parse", "v2")]:
+            assert store.read_blobs(ref, paths) == cat_file.read_blobs(ref, paths), ref
+    finally:
+        store.close()
+        cat_file.close()
+
+
+def test_unknown_ref(history_repo):
+    with pytest.raises(KeyError):
+        ObjectStore().read_blobs("no-such-branch", ["loose.txt"])
+
+
+def test_not_a_repository(tmp_path):
+    with pytest.raises(UnsupportedRepositoryError):
+        ObjectStore(str(tmp_path))
+
+
+def test_apply_delta():
+    base = b"0123456789"
+    # base size 10, target size 7: copy 4 bytes from offset 2, insert "xyz"
+    delta = bytes([10, 7, 0x80 | 0x01 | 0x10, 2, 4, 3]) + b"xyz"
+    assert _apply_delta(base, delta) == b"2345xyz"
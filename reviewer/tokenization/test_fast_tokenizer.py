@@ -0,0 +1,82 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import Whitespace
+
+from reviewer.tokenization.token_counter import TOKENIZER_FILE, TokenCounter, find_tokenizer_file
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _save_tokenizer(directory: str) -> str:
+    tokenizer = Tokenizer(WordLevel({"[UNK]": 0, "hello": 1, "world": 2}, unk_token="[UNK]"))  # noqa:S106
+    tokenizer.pre_tokenizer = Whitespace()
+    path = os.path.join(directory, TOKENIZER_FILE)
+    tokenizer.save(path)
+    return path
+
+
+class TestFindTokenizerFile(unittest.TestCase):
+    def test_local_directory_and_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertIsNone(find_tokenizer_file(directory))
+            path = _save_tokenizer(directory)
+            self.assertEqual(path, find_tokenizer_file(directory))
+            self.assertEqual(path, find_tokenizer_file(path))
+
+    def test_model_id_is_looked_up_in_the_cache_only(self):
+        with patch("huggingface_hub.try_to_load_from_cache", return_value="/cache/tokenizer.json") as lookup:
+            self.assertEqual("/cache/tokenizer.json", find_tokenizer_file("org/model"))
+        lookup.assert_called_once_with(repo_id="org/model", filename=TOKENIZER_FILE)
+
+        with patch("huggingface_hub.try_to_load_from_cache", return_value=None):
+            self.assertIsNone(find_tokenizer_file("org/model"))
+
+
+class TestFastTokenizer(unittest.TestCase):
+    def test_counts_with_tokenizers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            _save_tokenizer(directory)
+            counter = TokenCounter(directory)
+
+            self.assertEqual(3, counter.count_tokens("hello world again"))
+            self.assertEqual([1, 2], counter.get_token_ids("hello world"))
+            self.assertEqual(["hello", "world"], counter.get_tokens_as_strings("hello world"))
+            self.assertEqual(["hello", "[UNK]"], counter.get_tokens_as_strings("hello there", add_special_tokens=True))
+            self.assertEqual(directory, counter.tokenizer.name_or_path)
+
+    def test_batch_counts_match_single_counts(self):
+        with tempfile.TemporaryDirectory() as directory:
+            _save_tokenizer(directory)
+            counter = TokenCounter(directory)
+            texts = ["hello world again", "", "hello", None]
+
+            self.assertEqual([3, 0, 1, 0], counter.count_tokens_batch(texts))  # type: ignore
+            self.assertEqual([counter.count_tokens(text) for text in texts], counter.count_tokens_batch(texts))  # type: ignore
+
+    def test_lazy_counter_loads_on_first_use(self):
+        with tempfile.TemporaryDirectory() as directory:
+            counter = TokenCounter(os.path.join(directory, TOKENIZER_FILE), lazy=True)
+            _save_tokenizer(directory)
+            self.assertEqual(2, counter.count_tokens("hello world"))
+
+    def test_transformers_is_not_imported(self):
+        with tempfile.TemporaryDirectory() as directory:
+            _save_tokenizer(directory)
+            script = (
+                "import sys\n"
+                "from reviewer.tokenization.token_counter import TokenCounter\n"
+                f"assert TokenCounter({directory!r}).count_tokens('hello') == 1\n"
+                "assert 'transformers' not in sys.modules\n"
+            )
+            subprocess.run([sys.executable, "-c", script], cwd=ROOT, check=True)  # noqa:S603
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,46 +1,74 @@
-from transformers.models.auto.tokenization_auto import AutoTokenizer
-from transformers.tokenization_utils import PreTrainedTokenizer
-from transformers.tokenization_utils_fast import PreTrainedTokenizerFast
+import logging
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Optional
+
+if TYPE_CHECKING:
+    from transformers.tokenization_utils import PreTrainedTokenizer
+    from transformers.tokenization_utils_fast import PreTrainedTokenizerFast
+
+TOKENIZER_FILE = "tokenizer.json"
 
 
 class TokenCounter:
     """A class to count tokens in a string using Hugging Face tokenizers.
     This class is intended for production use to get accurate token counts
     relevant to specific pre-trained language models.
+
+    A `tokenizer.json` from a local directory or the Hugging Face cache is loaded
+    with the standalone `tokenizers` library, which takes a fraction of a second.
+    Only tokenizers without one are loaded through `transformers`, whose import
+    alone takes seconds and which may ask the hub for the model files.
     """
 
-    def __init__(self, model_name_or_path: str):
+    def __init__(self, model_name_or_path: str, lazy: bool = False, fast: bool = True):
         """Initializes the TokenCounter with a tokenizer from Hugging Face Hub.
 
         Args:
             model_name_or_path: The identifier of the pre-trained model on Hugging Face Hub
-                                (e.g., "bert-base-uncased", "gpt2", "mistralai/Mistral-7B-v0.1")
-                                or a path to a local directory containing tokenizer files.
+                                (e.g., "bert-base-uncased", "gpt2", "mistralai/Mistral-7B-v0.1"),
+                                a path to a local directory containing tokenizer files
+                                or a path to a `tokenizer.json`.
+            lazy: Load the tokenizer on first use instead of here.
+            fast: Try the standalone `tokenizers` library before `transformers`.
 
         Raises:
             ValueError: If the tokenizer cannot be loaded (e.g., model not found, network issues).
-            ImportError: If the 'transformers' library is not installed.
+            ImportError: If the tokenizer needs the 'transformers' library and it is not installed.
 
         """
+        self.__model_name_or_path = model_name_or_path
+        self.__fast = fast
+        self.__tokenizer: Optional[Any] = None
+        self.__lock = threading.Lock()
+        if not lazy:
+            self.load()
+
+    @property
+    def tokenizer(self) -> "_FastTokenizer | PreTrainedTokenizer | PreTrainedTokenizerFast":
+        if self.__tokenizer is None:
+            self.load()
+        return self.__tokenizer
+
+    def load(self) -> None:
+        with self.__lock:
+            if self.__tokenizer is not None:
+                return
+            tokenizer = self.__load_fast() if self.__fast else None
+            self.__tokenizer = tokenizer or _load_transformers_tokenizer(self.__model_name_or_path)
+
+    def __load_fast(self) -> Optional["_FastTokenizer"]:
+        path = find_tokenizer_file(self.__model_name_or_path)
+        if not path:
+            logging.info(f"no {TOKENIZER_FILE} for {self.__model_name_or_path}, loading it with transformers")
+            return None
         try:
-            # The `transformers` library needs to be installed.
-            # e.g., pip install transformers tokenizers
-            self.tokenizer: PreTrainedTokenizer | PreTrainedTokenizerFast = AutoTokenizer.from_pretrained(
-                model_name_or_path
-            )
-        except ImportError as e:
-            raise ImportError(
-                "The 'transformers' library is required to use Hugging Face tokenizers. "
-                "Please install it using 'pip install transformers tokenizers'."
-            ) from e
-        except OSError as e:  # Handles model not found, network issues, etc.
-            raise ValueError(
-                f"Could not load tokenizer for '{model_name_or_path}'. "
-                f"Ensure the model identifier is correct, you have an internet connection, "
-                f"and if it's a private/gated model, you are logged in via `huggingface-cli login`. "
-            ) from e
-        except Exception as e:  # Catch any other unexpected errors during loading
-            raise ValueError(f"An unexpected error occurred while loading tokenizer for '{model_name_or_path}'") from e
+            from tokenizers import Tokenizer
+
+            return _FastTokenizer(Tokenizer.from_file(path), self.__model_name_or_path)
+        except Exception as e:
+            logging.warning(f"could not load {path} with tokenizers, loading it with transformers: {e}")
+            return None
 
     def count_tokens(self, text: str, add_special_tokens: bool = True) -> int:
         """Counts the number of tokens in the given text using the loaded Hugging Face tokenizer.
@@ -69,6 +97,31 @@ class TokenCounter:
         token_ids = self.tokenizer.encode(text, add_special_tokens=add_special_tokens)
         return len(token_ids)
 
+    def count_tokens_batch(self, texts: list[str], add_special_tokens: bool = True) -> list[int]:
+        """Counts the tokens of many texts at once, as count_tokens does for each of them.
+
+        A fast tokenizer encodes the batch in parallel in Rust, and only the length
+        of each encoding crosses into Python, not a list of token ids per text.
+
+        Args:
+            texts: The input strings to tokenize.
+            add_special_tokens: Whether to include special tokens in the counts, as in count_tokens.
+
+        Returns:
+            The number of tokens of each text, in the order of texts.
+
+        """
+        strings = [text for text in texts if isinstance(text, str)]
+        backend = getattr(self.tokenizer, "backend_tokenizer", None)
+        if backend is None:
+            # slow transformers tokenizers have no batch encoder of their own
+            counts = iter([self.count_tokens(text, add_special_tokens) for text in strings])
+        else:
+            # encode_batch_fast (tokenizers >= 0.20) does not compute character offsets
+            encode_batch = getattr(backend, "encode_batch_fast", backend.encode_batch)
+            counts = iter([len(encoding) for encoding in encode_batch(strings, add_special_tokens=add_special_tokens)])
+        return [next(counts) if isinstance(text, str) else 0 for text in texts]
+
     def get_tokens_as_strings(self, text: str, add_special_tokens: bool = False) -> list[str]:
         """Tokenizes the text and returns a list of token strings.
 
@@ -141,3 +194,64 @@ class TokenCounter:
 
         token_ids = self.tokenizer.encode(text, add_special_tokens=add_special_tokens)
         return token_ids
+
+
+class _FastTokenizer:
+    """The part of the transformers tokenizer interface used above, on top of a `tokenizers.Tokenizer`."""
+
+    def __init__(self, tokenizer: Any, name_or_path: str):
+        self.__tokenizer = tokenizer
+        self.name_or_path = name_or_path
+
+    @property
+    def backend_tokenizer(self) -> Any:
+        return self.__tokenizer
+
+    def encode(self, text: str, add_special_tokens: bool = True) -> list[int]:
+        return self.__tokenizer.encode(text, add_special_tokens=add_special_tokens).ids
+
+    def tokenize(self, text: str) -> list[str]:
+        return self.__tokenizer.encode(text, add_special_tokens=False).tokens
+
+    def convert_ids_to_tokens(self, ids: list[int]) -> list[str]:
+        return [self.__tokenizer.id_to_token(i) for i in ids]
+
+
+def find_tokenizer_file(model_name_or_path: str) -> Optional[str]:
+    """The `tokenizer.json` of a local path or of a model in the Hugging Face cache; never goes to the network."""
+    if os.path.isfile(model_name_or_path):
+        return model_name_or_path
+    if os.path.isdir(model_name_or_path):
+        path = os.path.join(model_name_or_path, TOKENIZER_FILE)
+        return path if os.path.isfile(path) else None
+
+    try:
+        from huggingface_hub import try_to_load_from_cache
+
+        # a path, None, or a marker that the file is known not to exist
+        cached: Any = try_to_load_from_cache(repo_id=model_name_or_path, filename=TOKENIZER_FILE)
+    except (ImportError, ValueError):  # not installed, or not a valid model id
+        return None
+    return cached if isinstance(cached, str) else None
+
+
+def _load_transformers_tokenizer(model_name_or_path: str) -> "PreTrainedTokenizer | PreTrainedTokenizerFast":
+    try:
+        # The `transformers` library needs to be installed.
+        # e.g., pip install transformers tokenizers
+        from transformers.models.auto.tokenization_auto import AutoTokenizer
+
+        return AutoTokenizer.from_pretrained(model_name_or_path)
+    except ImportError as e:
+        raise ImportError(
+            "The 'transformers' library is required to use Hugging Face tokenizers. "
+            "Please install it using 'pip install transformers tokenizers'."
+        ) from e
+    except OSError as e:  # Handles model not found, network issues, etc.
+        raise ValueError(
+            f"Could not load tokenizer for '{model_name_or_path}'. "
+            f"Ensure the model identifier is correct, you have an internet connection, "
+            f"and if it's a private/gated model, you are logged in via `huggingface-cli login`. "
+        ) from e
+    except Exception as e:  # Catch any other unexpected errors during loading
+        raise ValueError(f"An unexpected error occurred while loading tokenizer for '{model_name_or_path}'") from e